@@ -25,6 +25,10 @@ class Settings(BaseSettings):
     backup_interval_hours: int = 24
     ephemeral_cache_ttl: int = 604800
     vector_search_top_k: int = 10
+    vector_max_open_shards: int = 16
+    embedding_model: str = "all-MiniLM-L6-v2"
+    embedding_warmup: bool = True
+    llm_max_concurrency: int = 4
     
     log_level: str = "INFO"
     log_file: str = "./logs/app.log"
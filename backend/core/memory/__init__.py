@@ -3,7 +3,7 @@
 """
 
 from .hierarchical_summarizer import HierarchicalSummarizer, Summary, SummaryLevel
-from .knowledge_manager import KnowledgeManager, Knowledge, KnowledgeType
+from .knowledge_manager import KnowledgeManager, Knowledge, KnowledgeType, KnowledgeCategory
 
 __all__ = [
     "HierarchicalSummarizer",
@@ -11,5 +11,6 @@ __all__ = [
     "SummaryLevel",
     "KnowledgeManager",
     "Knowledge",
-    "KnowledgeType"
+    "KnowledgeType",
+    "KnowledgeCategory"
 ]
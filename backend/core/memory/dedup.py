@@ -0,0 +1,165 @@
+"""
+近似重复检测
+MinHash 签名 + LSH 分桶，插入与查询均为亚线性复杂度
+"""
+
+import hashlib
+import itertools
+from functools import lru_cache
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .retrieval import tokenize
+
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+@lru_cache(maxsize=1 << 17)
+def _token_hash(token: str) -> int:
+    """稳定的32位词项哈希"""
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+class MinHashLSH:
+    """
+    MinHash LSH 索引
+
+    文本切分为词项集合（与检索一致的中文二元组），
+    签名按 bands × rows 分段入桶；同一桶内的文档为候选，
+    再以签名估计的 Jaccard 相似度过滤。
+    """
+
+    def __init__(self, threshold: float = 0.6, num_perm: int = 128, bands: int = 32, seed: int = 1):
+        """
+        Args:
+            threshold: 判定为近似重复的 Jaccard 相似度阈值
+            num_perm: 哈希置换数（签名长度）
+            bands: 分段数（num_perm 需能被整除）
+            seed: 随机种子（保证跨进程签名一致）
+        """
+        if num_perm % bands != 0:
+            raise ValueError("num_perm 必须能被 bands 整除")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        # 分段签名折叠为64位桶键的随机系数
+        self._band_mix = rng.randint(1, 1 << 62, size=self.rows, dtype=np.uint64) | np.uint64(1)
+
+        self._buckets: List[Dict[int, Set[Hashable]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[Hashable, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self._signatures
+
+    def signature(self, text: str) -> np.ndarray:
+        """计算 MinHash 签名"""
+        tokens = set(tokenize(text))
+        if not tokens:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+
+        hashes = np.fromiter((_token_hash(t) for t in tokens), dtype=np.uint64, count=len(tokens))
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[int]:
+        # uint64 乘加自然溢出即为取模，作为桶键哈希足够
+        return (signature.reshape(self.bands, self.rows) * self._band_mix).sum(axis=1).tolist()
+
+    def add(self, doc_id: Hashable, text: str, signature: Optional[np.ndarray] = None):
+        """加入索引（已存在则覆盖；已算好签名时可直接传入）"""
+        if doc_id in self._signatures:
+            self.remove(doc_id)
+
+        if signature is None:
+            signature = self.signature(text)
+        self._signatures[doc_id] = signature
+        for band, key in zip(self._buckets, self._band_keys(signature)):
+            band.setdefault(key, set()).add(doc_id)
+
+    def remove(self, doc_id: Hashable):
+        """移出索引"""
+        signature = self._signatures.pop(doc_id, None)
+        if signature is None:
+            return
+
+        for band, key in zip(self._buckets, self._band_keys(signature)):
+            bucket = band.get(key)
+            if bucket is None:
+                continue
+            bucket.discard(doc_id)
+            if not bucket:
+                del band[key]
+
+    def _candidates(self, signature: np.ndarray, limit: Optional[int] = None) -> Set[Hashable]:
+        candidates: Set[Hashable] = set()
+        for band, key in zip(self._buckets, self._band_keys(signature)):
+            bucket = band.get(key)
+            if bucket:
+                if limit is not None and len(candidates) + len(bucket) > limit:
+                    candidates.update(itertools.islice(bucket, limit - len(candidates)))
+                    break
+                candidates.update(bucket)
+        return candidates
+
+    def _rank(
+        self,
+        signature: np.ndarray,
+        candidates: Set[Hashable],
+        threshold: float
+    ) -> List[Tuple[Hashable, float]]:
+        if not candidates:
+            return []
+        doc_ids = list(candidates)
+        matrix = np.stack([self._signatures[doc_id] for doc_id in doc_ids])
+        similarities = (matrix == signature).mean(axis=1)
+        order = np.argsort(-similarities, kind="stable")
+        return [
+            (doc_ids[i], float(similarities[i]))
+            for i in order if similarities[i] >= threshold
+        ]
+
+    def query(
+        self,
+        text: str,
+        threshold: Optional[float] = None,
+        max_candidates: Optional[int] = None,
+        signature: Optional[np.ndarray] = None
+    ) -> List[Tuple[Hashable, float]]:
+        """
+        查询近似重复文档
+
+        Args:
+            text: 待检测文本
+            threshold: 相似度阈值（默认使用构造参数）
+            max_candidates: 最多比较的候选数（默认不限）。大量相互近似的文档
+                （如模板生成的条目）落入同一桶时，逐条检测的总开销随文档数平方增长；
+                限制后只在先取到的候选中找最相似者
+            signature: 已算好的签名（可选）
+
+        Returns:
+            List[Tuple[Hashable, float]]: (文档ID, 估计相似度)，按相似度降序
+        """
+        if signature is None:
+            signature = self.signature(text)
+        threshold = self.threshold if threshold is None else threshold
+        return self._rank(signature, self._candidates(signature, max_candidates), threshold)
+
+    def query_id(self, doc_id: Hashable, threshold: Optional[float] = None) -> List[Tuple[Hashable, float]]:
+        """查询与已索引文档近似重复的其它文档"""
+        signature = self._signatures[doc_id]
+        threshold = self.threshold if threshold is None else threshold
+        candidates = self._candidates(signature)
+        candidates.discard(doc_id)
+        return self._rank(signature, candidates, threshold)
@@ -0,0 +1,115 @@
+"""
+实体别名表
+把同一实体的不同称呼（"林师兄"、"风儿"）归一为规范名（"林风"）
+
+别名存入字典树：实体串先按整串查找；
+未命中时取串首最长的已知别名，剩余部分若是称谓（"林风道长"、"苏瑶师妹"）也归一，
+仍不命中则保持原样（视为新实体）。
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+
+# 实体串首尾需去掉的引号、书名号与空白
+_STRIP_CHARS = " \t\r\n　\"'“”‘’「」『』《》"
+
+# 可跟在人名后的称谓
+_TITLE_SUFFIXES = frozenset({
+    "兄", "姐", "哥", "弟", "妹",
+    "师兄", "师姐", "师弟", "师妹", "师父", "师傅", "师尊", "师叔", "师伯",
+    "大哥", "大姐", "大人", "公子", "姑娘", "小姐", "少爷", "前辈", "道长", "道友",
+    "长老", "掌门", "宗主", "殿下", "陛下", "先生", "夫人",
+})
+
+# 字典树节点中保存规范名的键（不会与单个字符冲突）
+_END = ""
+
+
+def normalize_entity(name: str) -> str:
+    """去掉首尾空白与引号"""
+    return name.strip(_STRIP_CHARS)
+
+
+class AliasTable:
+    """别名 → 规范名的映射（规范名本身也是自己的别名）"""
+
+    def __init__(self, mapping: Optional[Dict[str, Iterable[str]]] = None):
+        """
+        Args:
+            mapping: 规范名 → 别名列表
+        """
+        self._root: Dict[str, dict] = {}
+        self._canonical: Dict[str, str] = {}
+        for canonical, aliases in (mapping or {}).items():
+            self.add(canonical, aliases)
+
+    def __len__(self) -> int:
+        return len(self._canonical)
+
+    def __contains__(self, name: str) -> bool:
+        return normalize_entity(name) in self._canonical
+
+    def add(self, canonical: str, aliases: Iterable[str] = ()) -> List[Tuple[str, str]]:
+        """
+        登记实体及其别名
+
+        Returns:
+            List[Tuple[str, str]]: 新增或变更的 (别名, 规范名)
+        """
+        canonical = normalize_entity(canonical)
+        changed = []
+        for alias in (canonical, *aliases):
+            alias = normalize_entity(alias)
+            if not alias:
+                continue
+            previous = self._canonical.get(alias)
+            if previous == canonical:
+                continue
+            if previous is not None:
+                logger.warning(f"Alias {alias} reassigned: {previous} -> {canonical}")
+            self._canonical[alias] = canonical
+            node = self._root
+            for char in alias:
+                node = node.setdefault(char, {})
+            node[_END] = canonical
+            changed.append((alias, canonical))
+        return changed
+
+    def items(self) -> List[Tuple[str, str]]:
+        """全部 (别名, 规范名)"""
+        return list(self._canonical.items())
+
+    def aliases_of(self, canonical: str) -> List[str]:
+        """实体的全部别名（不含规范名本身）"""
+        canonical = normalize_entity(canonical)
+        return [alias for alias, name in self._canonical.items() if name == canonical and alias != canonical]
+
+    def longest_prefix(self, text: str, start: int = 0) -> Optional[Tuple[str, int]]:
+        """
+        text[start:] 开头最长的已知别名
+
+        Returns:
+            (规范名, 别名结束位置)；没有匹配时返回 None
+        """
+        node = self._root
+        match = None
+        for i in range(start, len(text)):
+            node = node.get(text[i])
+            if node is None:
+                break
+            if _END in node:
+                match = (node[_END], i + 1)
+        return match
+
+    def canonicalize(self, name: str) -> str:
+        """实体串 → 规范名（未知实体返回去除引号后的原串）"""
+        name = normalize_entity(name)
+        canonical = self._canonical.get(name)
+        if canonical is not None:
+            return canonical
+        match = self.longest_prefix(name)
+        if match and name[match[1]:] in _TITLE_SUFFIXES:
+            return match[0]
+        return name
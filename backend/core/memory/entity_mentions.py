@@ -0,0 +1,196 @@
+"""
+实体提及索引
+以知识图谱中的实体名与别名构建 Aho-Corasick 自动机，
+单遍扫描文本（与文本长度成线性关系，与实体数无关）找出出现的已知实体及位置。
+
+失败链接只能按 BFS 整体计算（新名称可能成为已有名称的后缀，改变已有节点的链接），
+因此名称分两级存放：
+- 主自动机：绝大部分名称，链接计算一次后长期复用；
+- 增量自动机：此后新增的名称，扫描前如有变化只重算这一小部分。
+增量部分的名称数超过主字典树节点数的平方根（至少 _MIN_RECENT）时并入主自动机，
+主自动机在下一次扫描前重算一次。设主字典树有 N 个节点，新增与扫描交替进行时
+每个新名称的均摊开销为 O(√N)，而不是每次 O(N)；连续多次新增（add_many）只重算一次。
+已登记名称改指其它实体时原地更新输出，不触发重算。扫描期间有增量部分时需扫描两遍。
+"""
+import heapq
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .entity_aliases import normalize_entity
+
+
+@dataclass(frozen=True)
+class Mention:
+    """一次实体提及（偏移相对于扫描的文本）"""
+    entity: str  # 规范名
+    alias: str  # 文本中出现的称呼
+    start: int
+    end: int
+
+
+class _Automaton:
+    """Aho-Corasick 自动机（失败链接在插入后、下一次扫描前按需重算）"""
+
+    def __init__(self):
+        # 字典树：节点 i 的子节点、失败链接、输出（规范名, 名称长度）、输出链接
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Optional[Tuple[str, int]]] = [None]
+        self._output_link: List[int] = [0]
+        self._dirty = False
+
+    @property
+    def size(self) -> int:
+        """字典树节点数"""
+        return len(self._goto)
+
+    def insert(self, name: str, entity: str):
+        """插入名称（已存在则只更新输出的规范名）"""
+        node = 0
+        for char in name:
+            child = self._goto[node].get(char)
+            if child is None:
+                child = len(self._goto)
+                self._goto[node][char] = child
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._output_link.append(0)
+                self._dirty = True
+            node = child
+        if self._output[node] is None:
+            self._dirty = True  # 输出链接依赖于哪些节点有输出
+        self._output[node] = (entity, len(name))
+
+    def _build_links(self):
+        """按 BFS 计算失败链接与输出链接（与字典树大小成线性关系）"""
+        queue = list(self._goto[0].values())
+        for child in queue:
+            self._fail[child] = 0
+            self._output_link[child] = 0
+        for node in queue:
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[child] = fail
+                self._output_link[child] = fail if self._output[fail] else self._output_link[fail]
+                queue.append(child)
+        self._dirty = False
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        if self._dirty:
+            self._build_links()
+        goto, fail, output, output_link = self._goto, self._fail, self._output, self._output_link
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            node = state if output[state] else output_link[state]
+            while node:
+                entity, length = output[node]
+                yield end - length, end, entity
+                node = output_link[node]
+
+
+class MentionIndex:
+    """实体名/别名 → 规范名的多模式匹配器"""
+
+    # 增量自动机名称数的下限（小规模时不必频繁合并）
+    _MIN_RECENT = 64
+
+    def __init__(self, min_length: int = 2):
+        """
+        Args:
+            min_length: 参与匹配的最短名称（单字称呼误匹配过多，默认忽略）
+        """
+        self.min_length = min_length
+        self._main = _Automaton()
+        self._recent = _Automaton()
+        self._recent_names: Dict[str, str] = {}
+        self._names: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, name: str) -> bool:
+        return normalize_entity(name) in self._names
+
+    def add(self, entity: str, names: Iterable[str] = ()) -> int:
+        """
+        登记实体及其别名（规范名本身也参与匹配）
+
+        Returns:
+            int: 新增或变更的名称数
+        """
+        return self.add_many((entity, name) for name in (entity, *names))
+
+    def add_many(self, pairs: Iterable[Tuple[str, str]]) -> int:
+        """
+        批量登记 (规范名, 名称)
+
+        Returns:
+            int: 新增或变更的名称数
+        """
+        changed = 0
+        for entity, name in pairs:
+            entity, name = normalize_entity(entity), normalize_entity(name)
+            if len(name) < self.min_length or self._names.get(name) == entity:
+                continue
+            if name in self._names and name not in self._recent_names:
+                self._main.insert(name, entity)  # 已在主自动机中：原地改输出，无需重算
+            else:
+                self._recent.insert(name, entity)
+                self._recent_names[name] = entity
+            self._names[name] = entity
+            changed += 1
+
+        if len(self._recent_names) > max(self._MIN_RECENT, math.isqrt(self._main.size)):
+            self._merge_recent()
+        return changed
+
+    def _merge_recent(self):
+        """增量部分并入主自动机（主自动机在下一次扫描前整体重算链接）"""
+        for name, entity in self._recent_names.items():
+            self._main.insert(name, entity)
+        self._recent = _Automaton()
+        self._recent_names = {}
+
+    def iter_matches(self, text: str) -> Iterable[Tuple[int, int, str]]:
+        """
+        所有匹配（含相互重叠的）
+
+        Yields:
+            (起始偏移, 结束偏移, 规范名)，按结束偏移升序
+        """
+        if not self._recent_names:
+            return self._main.iter_matches(text)
+        return heapq.merge(
+            self._main.iter_matches(text),
+            self._recent.iter_matches(text),
+            key=lambda match: match[1]
+        )
+
+    def find(self, text: str) -> List[Mention]:
+        """
+        文本中的实体提及
+
+        重叠的匹配取最左、最长者（"林风儿"同时命中"林风"与"风儿"时只计"林风"），
+        结果按位置排序。
+        """
+        matches = sorted(self.iter_matches(text), key=lambda m: (m[0], m[0] - m[1]))
+        mentions = []
+        covered = 0
+        for start, end, entity in matches:
+            if start >= covered:
+                mentions.append(Mention(entity, text[start:end], start, end))
+                covered = end
+        return mentions
+
+    def counts(self, text: str) -> Dict[str, int]:
+        """各实体的提及次数（按次数降序）"""
+        return dict(Counter(mention.entity for mention in self.find(text)).most_common())
@@ -0,0 +1,223 @@
+"""
+即时信息两级缓存
+L1：进程内 LRU（内存速度）
+L2：Redis（跨进程/跨 Worker 共享，带过期时间）
+"""
+
+import hashlib
+import inspect
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+
+from config.settings import settings
+
+
+def content_hash(content: str) -> str:
+    """
+    稳定的内容哈希（跨进程、跨重启一致）
+
+    Python 内置 hash() 对字符串做了随机化，不能用作缓存键。
+    """
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+async def _resolve(result):
+    """兼容同步与异步 Redis 客户端"""
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+class EphemeralCache:
+    """
+    两级即时信息缓存
+
+    写入同时落到本地 LRU 与 Redis；读取优先命中本地，
+    未命中的键通过一次 pipeline 批量回源 Redis 并回填本地。
+    Redis 不可用时自动降级为纯本地缓存，并在冷却期后重试。
+    """
+
+    def __init__(
+        self,
+        redis_client=None,
+        ttl: Optional[int] = None,
+        max_local_items: int = 10000,
+        retry_interval: float = 30.0
+    ):
+        """
+        初始化缓存
+
+        Args:
+            redis_client: Redis 客户端（同步或 redis.asyncio 均可，None 表示仅本地）
+            ttl: 过期时间（秒），默认取 settings.ephemeral_cache_ttl
+            max_local_items: 本地 LRU 容量
+            retry_interval: Redis 故障后的重试冷却时间（秒）
+        """
+        self.redis = redis_client
+        self.ttl = ttl if ttl is not None else settings.ephemeral_cache_ttl
+        self.max_local_items = max_local_items
+        self.retry_interval = retry_interval
+
+        # key -> (value, 过期时刻 monotonic)
+        self._local: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._redis_retry_at = 0.0
+
+    # ------------------------------------------------------------------
+    # 本地 LRU
+    # ------------------------------------------------------------------
+
+    def _local_get(self, key: str) -> Optional[str]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    def _local_set(self, key: str, value: str, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        self._local[key] = (value, time.monotonic() + ttl)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_local_items:
+            self._local.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # Redis
+    # ------------------------------------------------------------------
+
+    @property
+    def redis_available(self) -> bool:
+        return self.redis is not None and time.monotonic() >= self._redis_retry_at
+
+    def _mark_redis_down(self, error: Exception):
+        self._redis_retry_at = time.monotonic() + self.retry_interval
+        logger.warning(f"Redis 不可用，降级为本地缓存 {self.retry_interval:.0f}s: {error}")
+
+    # ------------------------------------------------------------------
+    # 公共接口
+    # ------------------------------------------------------------------
+
+    async def set(self, key: str, value: str):
+        """写入单个键"""
+        await self.set_many({key: value})
+
+    async def get(self, key: str) -> Optional[str]:
+        """读取单个键"""
+        return (await self.get_many([key])).get(key)
+
+    async def set_many(self, items: Dict[str, str]):
+        """批量写入（Redis 端一次 pipeline）"""
+        if not items:
+            return
+
+        for key, value in items.items():
+            self._local_set(key, value)
+
+        if not self.redis_available:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.set(key, value, ex=self.ttl)
+            await _resolve(pipe.execute())
+        except Exception as e:
+            self._mark_redis_down(e)
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        批量读取
+
+        Args:
+            keys: 键列表
+
+        Returns:
+            Dict[str, Optional[str]]: 键到值的映射（未命中为 None）
+        """
+        results: Dict[str, Optional[str]] = {}
+        missing: List[str] = []
+        for key in keys:
+            value = self._local_get(key)
+            results[key] = value
+            if value is None:
+                missing.append(key)
+
+        if not missing or not self.redis_available:
+            return results
+
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key in missing:
+                pipe.get(key)
+                pipe.pttl(key)
+            replies = await _resolve(pipe.execute())
+        except Exception as e:
+            self._mark_redis_down(e)
+            return results
+
+        for i, key in enumerate(missing):
+            value, pttl = replies[2 * i], replies[2 * i + 1]
+            if value is None:
+                continue
+            if isinstance(value, bytes):
+                value = value.decode("utf-8")
+            results[key] = value
+            # 回填本地，过期时间与 Redis 剩余寿命一致
+            self._local_set(key, value, ttl=pttl / 1000 if pttl and pttl > 0 else None)
+
+        return results
+
+    async def incr_many(self, keys: Iterable[str]) -> Optional[List[int]]:
+        """
+        共享计数器各加一（只在 Redis 中，不经本地层、不设过期时间）
+
+        Returns:
+            Optional[List[int]]: 加一后的值；Redis 未配置或不可用时为 None
+        """
+        keys = list(keys)
+        if not keys or not self.redis_available:
+            return None
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key in keys:
+                pipe.incr(key)
+            return [int(value) for value in await _resolve(pipe.execute())]
+        except Exception as e:
+            self._mark_redis_down(e)
+            return None
+
+    async def counters(self, keys: Iterable[str]) -> Optional[List[int]]:
+        """
+        读取共享计数器（一次 pipeline）
+
+        Returns:
+            Optional[List[int]]: 计数值（不存在的键为 0）；Redis 未配置或不可用时为 None
+        """
+        keys = list(keys)
+        if not keys or not self.redis_available:
+            return None
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key in keys:
+                pipe.get(key)
+            return [int(value or 0) for value in await _resolve(pipe.execute())]
+        except Exception as e:
+            self._mark_redis_down(e)
+            return None
+
+    async def delete(self, keys: Iterable[str]):
+        """批量删除"""
+        keys = list(keys)
+        for key in keys:
+            self._local.pop(key, None)
+
+        if not keys or not self.redis_available:
+            return
+        try:
+            await _resolve(self.redis.delete(*keys))
+        except Exception as e:
+            self._mark_redis_down(e)
@@ -0,0 +1,388 @@
+"""
+知识图谱内存邻接索引
+实体与关系类型映射为整数ID，边以 CSR（压缩稀疏行）数组存放，
+出边、入边各一份；多跳邻域与最短路径按层向量化扩展。
+
+每条边带有效章节区间 [valid_from, valid_to]（闭区间，valid_to 为空表示至今有效），
+遍历时可指定章节，只沿当时有效的边扩展。
+
+写入先追加到待合并区（查询时一并扫描），累积到阈值后重建 CSR，
+重建时顺带去重（同一关系同一起始章节保留最后写入的一条）；删除与改区间触发重建。
+已结束的时间段再次写入且未给出结束章节时沿用原结束章节；未给出结束章节而该关系
+仍有未结束的时间段时并入该时间段，不新开一段（均与库表 upsert 一致）。
+"""
+from array import array
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 开放区间的右端点
+OPEN_END = np.iinfo(np.int32).max
+
+DIRECTIONS = ("out", "in", "both")
+
+
+class _CSR(NamedTuple):
+    indptr: np.ndarray
+    tails: np.ndarray
+    relations: np.ndarray
+    valid_from: np.ndarray
+    valid_to: np.ndarray
+
+
+class _EdgeFilter(NamedTuple):
+    relation_mask: Optional[np.ndarray]
+    at: Optional[int]
+
+    def keep(self, relations: np.ndarray, valid_from: np.ndarray, valid_to: np.ndarray) -> Optional[np.ndarray]:
+        mask = None
+        if self.relation_mask is not None:
+            mask = self.relation_mask[relations]
+        if self.at is not None:
+            alive = (valid_from <= self.at) & (self.at <= valid_to)
+            mask = alive if mask is None else mask & alive
+        return mask
+
+
+class AdjacencyIndex:
+    """有向多关系图的 CSR 邻接索引（边带章节有效区间）"""
+
+    def __init__(self, rebuild_threshold: int = 1024):
+        """
+        Args:
+            rebuild_threshold: 待合并边数超过该值（且超过已合并边数的 1/8）时重建 CSR
+        """
+        self.rebuild_threshold = rebuild_threshold
+
+        self._node_id: Dict[str, int] = {}
+        self._nodes: List[str] = []
+        self._relation_id: Dict[str, int] = {}
+        self._relations: List[str] = []
+
+        # 全部边，紧凑的 int32 数组
+        self._src = array("i")
+        self._rel = array("i")
+        self._dst = array("i")
+        self._from = array("i")
+        self._to = array("i")
+
+        # 已结束的时间段：(src, rel, dst, valid_from) → valid_to
+        self._closed: Dict[Tuple[int, int, int, int], int] = {}
+        # 未结束的时间段：(src, rel, dst) → valid_from
+        self._open: Dict[Tuple[int, int, int], int] = {}
+
+        self._out: Optional[_CSR] = None
+        self._in: Optional[_CSR] = None
+        self._merged = 0  # 已并入 CSR 的边数（各数组的前缀）
+
+    def __len__(self) -> int:
+        self._maybe_rebuild(force=True)
+        return len(self._src)
+
+    @property
+    def node_count(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, entity: str) -> bool:
+        return entity in self._node_id
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def _intern(self, name: str, ids: Dict[str, int], names: List[str]) -> int:
+        index = ids.get(name)
+        if index is None:
+            index = ids[name] = len(names)
+            names.append(name)
+        return index
+
+    def add(
+        self,
+        source: str,
+        target: str,
+        relation: str,
+        valid_from: Optional[int] = None,
+        valid_to: Optional[int] = None
+    ):
+        """
+        加入一条边（重复边在重建时去重）
+
+        未给出结束章节时：该关系有未结束的时间段则并入该段，
+        否则沿用同一起始章节已结束时间段的结束章节。
+        """
+        triple = (
+            self._intern(source, self._node_id, self._nodes),
+            self._intern(relation, self._relation_id, self._relations),
+            self._intern(target, self._node_id, self._nodes)
+        )
+        key = (*triple, valid_from or 0)
+        if valid_to is None:
+            if triple in self._open:
+                key = (*triple, self._open[triple])
+            valid_to = self._closed.get(key, OPEN_END)
+        elif valid_to != OPEN_END:
+            self._closed[key] = valid_to
+            if self._open.get(triple) == key[3]:
+                del self._open[triple]
+        if valid_to == OPEN_END:
+            self._open.setdefault(triple, key[3])
+        self._src.append(key[0])
+        self._rel.append(key[1])
+        self._dst.append(key[2])
+        self._from.append(key[3])
+        self._to.append(valid_to)
+
+    def add_many(self, edges: Iterable[Sequence]):
+        """批量加入 (source, target, relation[, valid_from[, valid_to]])"""
+        for edge in edges:
+            self.add(*edge)
+        self._maybe_rebuild()
+
+    def _match(self, source: str, target: str, relation: str) -> Optional[np.ndarray]:
+        ids = (self._node_id.get(source), self._relation_id.get(relation), self._node_id.get(target))
+        if None in ids:
+            return None
+        src, rel, dst, _, _ = self._arrays()
+        return (src == ids[0]) & (rel == ids[1]) & (dst == ids[2])
+
+    def remove(self, source: str, target: str, relation: str, valid_from: Optional[int] = None) -> bool:
+        """删除一条关系（默认删除其全部时间段）"""
+        matched = self._match(source, target, relation)
+        if matched is None:
+            return False
+        arrays = self._arrays()
+        if valid_from is not None:
+            matched &= arrays[3] == valid_from
+        if not matched.any():
+            return False
+        for edge in zip(*(a[matched].tolist() for a in arrays[:4])):
+            self._closed.pop(edge, None)
+            if self._open.get(edge[:3]) == edge[3]:
+                del self._open[edge[:3]]
+        self._reset_edges(*(a[~matched] for a in arrays))
+        return True
+
+    def close_interval(self, source: str, target: str, relation: str, valid_to: int) -> int:
+        """
+        结束关系的当前时间段（如人物在某章死亡、盟友反目）
+
+        Returns:
+            int: 被结束的时间段数
+        """
+        matched = self._match(source, target, relation)
+        if matched is None:
+            return 0
+        src, rel, dst, valid_from, to = self._arrays()
+        matched &= (to == OPEN_END) & (valid_from <= valid_to)
+        if not matched.any():
+            return 0
+        to = to.copy()
+        to[matched] = valid_to
+        for edge in zip(*(a[matched].tolist() for a in (src, rel, dst, valid_from))):
+            self._closed[edge] = valid_to
+            self._open.pop(edge[:3], None)
+        self._reset_edges(src, rel, dst, valid_from, to)
+        return int(matched.sum())
+
+    # ------------------------------------------------------------------
+    # CSR 构建
+    # ------------------------------------------------------------------
+
+    def _arrays(self) -> Tuple[np.ndarray, ...]:
+        return tuple(
+            np.frombuffer(a, dtype=np.int32) if len(a) else np.zeros(0, dtype=np.int32)
+            for a in (self._src, self._rel, self._dst, self._from, self._to)
+        )
+
+    def _reset_edges(self, src, rel, dst, valid_from, valid_to):
+        """以去重、排序后的边重建全部结构"""
+        # 按 (src, rel, dst, valid_from, 写入顺序) 排序，每组保留最后写入的一条
+        order = np.lexsort((np.arange(len(src)), valid_from, dst, rel, src))
+        src, rel, dst, valid_from, valid_to = (a[order] for a in (src, rel, dst, valid_from, valid_to))
+        last = np.ones(len(src), dtype=bool)
+        if len(src) > 1:
+            last[:-1] = (
+                (src[1:] != src[:-1]) | (rel[1:] != rel[:-1]) |
+                (dst[1:] != dst[:-1]) | (valid_from[1:] != valid_from[:-1])
+            )
+        src, rel, dst, valid_from, valid_to = (
+            np.ascontiguousarray(a[last], dtype=np.int32) for a in (src, rel, dst, valid_from, valid_to)
+        )
+
+        self._src, self._rel, self._dst, self._from, self._to = (
+            array("i", a.tobytes()) for a in (src, rel, dst, valid_from, valid_to)
+        )
+        self._out = self._build_csr(src, dst, rel, valid_from, valid_to)
+        order = np.argsort(dst, kind="stable")
+        self._in = self._build_csr(dst[order], src[order], rel[order], valid_from[order], valid_to[order])
+        self._merged = len(src)
+
+    def _build_csr(self, heads, tails, rels, valid_from, valid_to) -> _CSR:
+        """heads 已排序"""
+        indptr = np.zeros(len(self._nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(heads, minlength=len(self._nodes)), out=indptr[1:])
+        return _CSR(indptr, tails, rels, valid_from, valid_to)
+
+    def _maybe_rebuild(self, force: bool = False):
+        pending = len(self._src) - self._merged
+        if self._out is None or (pending and (force or pending > max(self.rebuild_threshold, self._merged // 8))):
+            self._reset_edges(*self._arrays())
+
+    # ------------------------------------------------------------------
+    # 遍历
+    # ------------------------------------------------------------------
+
+    def _edge_filter(self, relations: Optional[Iterable[str]], at: Optional[int]) -> _EdgeFilter:
+        relation_mask = None
+        if relations is not None:
+            relation_mask = np.zeros(len(self._relations), dtype=bool)
+            for relation in relations:
+                code = self._relation_id.get(relation)
+                if code is not None:
+                    relation_mask[code] = True
+        return _EdgeFilter(relation_mask, at)
+
+    def _expand(self, frontier: np.ndarray, direction: str, edge_filter: _EdgeFilter) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        扩展一层
+
+        Returns:
+            (parents, neighbors): 一一对应的边端点
+        """
+        parents, neighbors = [], []
+        src, rel, dst, valid_from, valid_to = (a[self._merged:] for a in self._arrays())
+
+        for csr, heads, tails, name in ((self._out, src, dst, "out"), (self._in, dst, src, "in")):
+            if direction not in (name, "both"):
+                continue
+            known = frontier[frontier < len(csr.indptr) - 1]
+            starts = csr.indptr[known]
+            lengths = csr.indptr[known + 1] - starts
+            total = int(lengths.sum())
+            if total:
+                # 各节点的邻接区间拼接为一个下标数组
+                offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+                edge_parents, edge_tails = np.repeat(known, lengths), csr.tails[offsets]
+                keep = edge_filter.keep(csr.relations[offsets], csr.valid_from[offsets], csr.valid_to[offsets])
+                if keep is not None:
+                    edge_parents, edge_tails = edge_parents[keep], edge_tails[keep]
+                parents.append(edge_parents)
+                neighbors.append(edge_tails)
+
+            if len(heads):
+                keep = np.isin(heads, frontier)
+                extra = edge_filter.keep(rel, valid_from, valid_to)
+                if extra is not None:
+                    keep &= extra
+                parents.append(heads[keep])
+                neighbors.append(tails[keep])
+
+        if not parents:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        return np.concatenate(parents), np.concatenate(neighbors)
+
+    def neighbors(
+        self,
+        entity: str,
+        hops: int = 1,
+        relations: Optional[Iterable[str]] = None,
+        direction: str = "both",
+        at: Optional[int] = None
+    ) -> Dict[str, int]:
+        """
+        k 跳邻域
+
+        Args:
+            entity: 起点实体
+            hops: 最大跳数
+            relations: 只沿这些关系类型扩展（默认全部）
+            direction: "out" 出边 / "in" 入边 / "both" 不区分方向
+            at: 只沿该章节有效的边扩展（默认不限）
+
+        Returns:
+            Dict[str, int]: 邻域实体 → 跳数（不含起点），按跳数升序
+        """
+        if direction not in DIRECTIONS:
+            raise ValueError(f"未知的方向: {direction}")
+        start = self._node_id.get(entity)
+        if start is None:
+            return {}
+        self._maybe_rebuild()
+
+        edge_filter = self._edge_filter(relations, at)
+        visited = np.zeros(len(self._nodes), dtype=bool)
+        visited[start] = True
+        frontier = np.array([start], dtype=np.int32)
+        result: Dict[str, int] = {}
+
+        for hop in range(1, hops + 1):
+            _, reached = self._expand(frontier, direction, edge_filter)
+            reached = np.unique(reached)
+            frontier = reached[~visited[reached]]
+            if not len(frontier):
+                break
+            visited[frontier] = True
+            for node in frontier.tolist():
+                result[self._nodes[node]] = hop
+        return result
+
+    def _step(self, frontier: np.ndarray, direction: str, edge_filter: _EdgeFilter, parent: np.ndarray) -> np.ndarray:
+        """扩展一层并记录父节点，返回新到达的节点"""
+        parents, reached = self._expand(frontier, direction, edge_filter)
+        fresh = parent[reached] < 0
+        reached, first = np.unique(reached[fresh], return_index=True)
+        parent[reached] = parents[fresh][first]
+        return reached.astype(np.int32)
+
+    def shortest_path(
+        self,
+        source: str,
+        target: str,
+        relations: Optional[Iterable[str]] = None,
+        direction: str = "both",
+        max_hops: Optional[int] = None,
+        at: Optional[int] = None
+    ) -> Optional[List[str]]:
+        """
+        最短路径（按跳数，双向广度优先，每次扩展较小的一侧）
+
+        Returns:
+            Optional[List[str]]: 从 source 到 target 的实体序列；不可达时为 None
+        """
+        if direction not in DIRECTIONS:
+            raise ValueError(f"未知的方向: {direction}")
+        start, goal = self._node_id.get(source), self._node_id.get(target)
+        if start is None or goal is None:
+            return None
+        if start == goal:
+            return [source]
+        self._maybe_rebuild()
+
+        edge_filter = self._edge_filter(relations, at)
+        backward = {"out": "in", "in": "out", "both": "both"}[direction]
+        forward_parent = np.full(len(self._nodes), -1, dtype=np.int64)
+        backward_parent = np.full(len(self._nodes), -1, dtype=np.int64)
+        forward_parent[start], backward_parent[goal] = start, goal
+        forward = np.array([start], dtype=np.int32)
+        reverse = np.array([goal], dtype=np.int32)
+        hops = 0
+
+        while len(forward) and len(reverse) and (max_hops is None or hops < max_hops):
+            hops += 1
+            if len(forward) <= len(reverse):
+                forward = self._step(forward, direction, edge_filter, forward_parent)
+                meet = forward[backward_parent[forward] >= 0]
+            else:
+                reverse = self._step(reverse, backward, edge_filter, backward_parent)
+                meet = reverse[forward_parent[reverse] >= 0]
+            if len(meet):
+                middle = int(meet[0])
+                path = [middle]
+                while path[-1] != start:
+                    path.append(int(forward_parent[path[-1]]))
+                path.reverse()
+                while path[-1] != goal:
+                    path.append(int(backward_parent[path[-1]]))
+                return [self._nodes[node] for node in path]
+        return None
@@ -4,11 +4,18 @@
 即时信息：临时缓存（场景/细节）
 """
 
-from typing import List, Optional, Dict
+import json
+import os
+from datetime import datetime
+from typing import Any, List, Optional, Dict
 from enum import Enum
 from dataclasses import dataclass
 from loguru import logger
 
+from .dedup import MinHashLSH
+from .ephemeral_cache import EphemeralCache, content_hash
+from .retrieval import BM25Index, RetrievalCache, normalize_query, reciprocal_rank_fusion
+
 
 class KnowledgeType(Enum):
     """知识类型"""
@@ -37,12 +44,36 @@ class Knowledge:
     tags: Optional[List[str]] = None
     created_at: Optional[str] = None
     updated_at: Optional[str] = None
+    cache_key: Optional[str] = None  # 即时信息的缓存键
+    duplicate_of: Optional[int] = None  # 近似重复的已有知识ID（插入时检测）
+    
+    def to_json(self) -> str:
+        """序列化为JSON（用于缓存）"""
+        return json.dumps({
+            "id": self.id,
+            "content": self.content,
+            "knowledge_type": self.knowledge_type.value,
+            "category": self.category.value,
+            "locked": self.locked,
+            "tags": self.tags or [],
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "cache_key": self.cache_key
+        }, ensure_ascii=False)
+    
+    @classmethod
+    def from_json(cls, data: str) -> "Knowledge":
+        """从JSON反序列化"""
+        fields = json.loads(data)
+        fields["knowledge_type"] = KnowledgeType(fields["knowledge_type"])
+        fields["category"] = KnowledgeCategory(fields["category"])
+        return cls(**fields)
 
 
 class KnowledgeManager:
     """知识管理系统"""
     
-    def __init__(self, vector_store, db, cache):
+    def __init__(self, vector_store, db, cache, project_id: str = "default"):
         """
         初始化知识管理器
         
@@ -50,10 +81,308 @@ class KnowledgeManager:
             vector_store: 向量存储
             db: 数据库连接
             cache: Redis缓存
+            project_id: 项目ID（检索缓存键的一部分）
         """
         self.vector_store = vector_store
         self.db = db
         self.cache = cache
+        self.project_id = project_id
+        
+        # 即时信息：本地 LRU + Redis 两级缓存
+        self.ephemeral = EphemeralCache(cache)
+        
+        # 核心知识的内存索引（数据库为持久化来源）
+        self._items: Dict[int, Knowledge] = {}
+        self._hash_to_id: Dict[str, int] = {}
+        self._bm25 = BM25Index()
+        self._lsh = MinHashLSH()
+        self._next_id = 1  # 仅无数据库时使用（有数据库时ID由数据库分配）
+        
+        # 检索结果缓存：按分类版本号失效。配置了 Redis 时版本号为各 worker 共享的计数器，
+        # 检索前比对，其它 worker 写入过的分类先从数据库重载；未配置时只覆盖本进程内的写入
+        self._category_versions: Dict[KnowledgeCategory, int] = {c: 0 for c in KnowledgeCategory}
+        self._versions_synced = False
+        self._loaded_fingerprint: Dict[str, tuple] = {}
+        self._retrieval_cache = RetrievalCache()
+        
+        self._init_table()
+        self._load_core_knowledge()
+    
+    def _init_table(self):
+        """初始化知识表"""
+        if hasattr(self.db, "execute"):
+            try:
+                self.db.execute("""
+                CREATE TABLE IF NOT EXISTS knowledge_items (
+                    id INTEGER PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    knowledge_type TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    locked INTEGER DEFAULT 0,
+                    tags TEXT,
+                    created_at TEXT,
+                    updated_at TEXT
+                )
+                """)
+            except Exception as e:
+                logger.warning(f"Knowledge table init warning: {e}")
+    
+    _SELECT_SQL = (
+        "SELECT id, content, knowledge_type, category, locked, tags, created_at, updated_at "
+        "FROM knowledge_items"
+    )
+    # 各分类的 (条数, 最大ID, 最近更新时间)：判断加载之后是否有其它进程写入
+    _FINGERPRINT_SQL = (
+        "SELECT category, COUNT(*), MAX(id), MAX(updated_at) FROM knowledge_items GROUP BY category"
+    )
+    
+    def _load_core_knowledge(self):
+        """从数据库加载核心知识并重建检索索引"""
+        if not hasattr(self.db, "fetchall"):
+            return
+        
+        try:
+            rows = self.db.fetchall(self._SELECT_SQL, ())
+        except Exception as e:
+            logger.warning(f"加载核心知识失败: {e}")
+            return
+        
+        for row in rows or []:
+            self._index(self._from_row(row))
+        self._loaded_fingerprint = self._fingerprint(self._items.values())
+        
+        if self._items:
+            logger.info(f"已加载 {len(self._items)} 条核心知识")
+    
+    @staticmethod
+    def _fingerprint(items) -> Dict[str, tuple]:
+        """按已加载条目计算的分类指纹（与 _FINGERPRINT_SQL 的结果一致）"""
+        fingerprint: Dict[str, list] = {}
+        for knowledge in items:
+            entry = fingerprint.setdefault(knowledge.category.value, [0, knowledge.id, knowledge.updated_at])
+            entry[0] += 1
+            entry[1] = max(entry[1], knowledge.id)
+            entry[2] = max(entry[2] or "", knowledge.updated_at or "") or None
+        return {category: tuple(entry) for category, entry in fingerprint.items()}
+    
+    @staticmethod
+    def _from_row(row: tuple) -> Knowledge:
+        return Knowledge(
+            id=row[0],
+            content=row[1],
+            knowledge_type=KnowledgeType(row[2]),
+            category=KnowledgeCategory(row[3]),
+            locked=bool(row[4]),
+            tags=json.loads(row[5]) if row[5] else [],
+            created_at=row[6],
+            updated_at=row[7]
+        )
+    
+    def _reload_categories(self, categories: List[KnowledgeCategory]):
+        """从数据库重载指定分类（其它 worker 写入后与数据库对齐）"""
+        values = [c.value for c in categories]
+        rows = self.db.fetchall(
+            f"{self._SELECT_SQL} WHERE category IN ({', '.join('?' * len(values))})", tuple(values)
+        )
+        for knowledge_id in [i for i, k in self._items.items() if k.category in categories]:
+            self._unindex(knowledge_id)
+        for row in rows or []:
+            self._index(self._from_row(row))
+        logger.info(f"已重载分类 {values}: {len(rows or [])} 条")
+    
+    def _index(self, knowledge: Knowledge, signature=None):
+        """加入内存索引（signature: 已算好的 MinHash 签名）"""
+        self._items[knowledge.id] = knowledge
+        self._hash_to_id[content_hash(knowledge.content)] = knowledge.id
+        self._bm25.add(knowledge.id, knowledge.content, group=knowledge.category)
+        self._lsh.add(knowledge.id, knowledge.content, signature)
+    
+    def _unindex(self, knowledge_id: int):
+        """移出内存索引"""
+        knowledge = self._items.pop(knowledge_id, None)
+        if knowledge is not None:
+            self._forget_hash(knowledge)
+        self._bm25.remove(knowledge_id)
+        self._lsh.remove(knowledge_id)
+    
+    def _forget_hash(self, knowledge: Knowledge):
+        """移除内容哈希映射（仅当映射指向该条目）"""
+        digest = content_hash(knowledge.content)
+        if self._hash_to_id.get(digest) == knowledge.id:
+            del self._hash_to_id[digest]
+    
+    def _version_keys(self, categories: List[KnowledgeCategory]) -> List[str]:
+        return [f"knowledge_version:{self.project_id}:{c.value}" for c in categories]
+    
+    async def _bump_version(self, *categories: KnowledgeCategory):
+        """分类内容变化，使相关检索缓存失效（本进程及共享计数器）"""
+        categories = list(dict.fromkeys(categories))
+        shared = await self.ephemeral.incr_many(self._version_keys(categories))
+        for i, category in enumerate(categories):
+            if shared is None:
+                self._category_versions[category] += 1
+            elif shared[i] == self._category_versions[category] + 1:
+                self._category_versions[category] = shared[i]
+            else:
+                # 期间有其它 worker 写入：保留旧版本号，下次检索前重载该分类
+                self._retrieval_cache.clear()
+    
+    async def _sync_versions(self):
+        """
+        与共享版本号对齐（未配置 Redis 或不可用时跳过）
+        
+        其它 worker 写入过的分类从数据库重载后再检索，并清空本进程的检索缓存
+        （版本号来源切换时可能回退，清空避免旧条目被误判为有效）。
+        首次对齐时本地版本号尚无意义：先读共享版本号，再比对启动加载时与当前数据库的
+        分类指纹，重载加载之后有写入的分类（此后的写入必然在读取之后递增共享版本号）。
+        """
+        categories = list(KnowledgeCategory)
+        shared = await self.ephemeral.counters(self._version_keys(categories))
+        if shared is None:
+            return
+        if not self._versions_synced:
+            if not hasattr(self.db, "fetchall"):
+                self._category_versions.update(zip(categories, shared))
+                self._versions_synced = True
+                return
+            try:
+                current = {row[0]: tuple(row[1:]) for row in self.db.fetchall(self._FINGERPRINT_SQL, ())}
+            except Exception as e:
+                logger.warning(f"读取知识库指纹失败: {e}")
+                return
+            changed = [
+                c for c in categories
+                if current.get(c.value) != self._loaded_fingerprint.get(c.value)
+            ]
+            self._versions_synced = True
+        else:
+            changed = [c for c, version in zip(categories, shared) if version != self._category_versions[c]]
+        if not changed:
+            self._category_versions.update(zip(categories, shared))
+            return
+        try:
+            self._reload_categories(changed)
+        except Exception as e:
+            logger.warning(f"重载知识分类失败，继续使用本进程索引: {e}")
+            return
+        self._category_versions.update(zip(categories, shared))
+        self._retrieval_cache.clear()
+    
+    def _versions(self, categories: Optional[List[KnowledgeCategory]]) -> tuple:
+        if categories:
+            return tuple(self._category_versions[c] for c in categories)
+        return tuple(self._category_versions.values())
+    
+    @staticmethod
+    def _vector_id(knowledge_id: int) -> str:
+        return f"knowledge_{knowledge_id}"
+    
+    @staticmethod
+    def _vector_metadata(knowledge: Knowledge) -> Dict:
+        return {
+            "knowledge_id": knowledge.id,
+            "category": knowledge.category.value,
+            "locked": knowledge.locked
+        }
+    
+    _INSERT_SQL = (
+        "INSERT INTO knowledge_items "
+        "(content, knowledge_type, category, locked, tags, created_at, updated_at) VALUES "
+    )
+    _INSERT_VALUES = "(?, ?, ?, ?, ?, ?, ?)"
+    # 单条 INSERT 语句的最多行数（每行 7 个参数，远低于 SQLite 的参数上限）
+    _INSERT_CHUNK = 500
+    
+    @staticmethod
+    def _row(knowledge: Knowledge) -> tuple:
+        return (
+            knowledge.content, knowledge.knowledge_type.value,
+            knowledge.category.value, int(knowledge.locked),
+            json.dumps(knowledge.tags or [], ensure_ascii=False),
+            knowledge.created_at, knowledge.updated_at
+        )
+    
+    def _db_execute(self, query: str, params: tuple):
+        """执行写操作（数据库不可用时跳过；写入失败时记录并抛出）"""
+        if not hasattr(self.db, "execute"):
+            return None
+        try:
+            return self.db.execute(query, params)
+        except Exception as e:
+            logger.error(f"知识库写入失败: {e}")
+            raise
+    
+    def _db_insert(self, items: List[Knowledge]):
+        """
+        写入数据库并回填数据库分配的ID（失败时抛出异常，失败批次及之后的条目 id 保持为空）
+        
+        ID 由数据库分配，多个进程共用同一数据库时不会冲突。每批一条多行 INSERT：
+        SQLite 在单条语句内持有写锁，本批各行的 rowid 连续，由游标的 lastrowid 反推。
+        无数据库时按进程内计数编号（仅内存）。
+        """
+        if not hasattr(self.db, "execute"):
+            for knowledge in items:
+                knowledge.id = self._next_id
+                self._next_id += 1
+            return
+        
+        for start in range(0, len(items), self._INSERT_CHUNK):
+            batch = items[start:start + self._INSERT_CHUNK]
+            cursor = self._db_execute(
+                self._INSERT_SQL + ", ".join([self._INSERT_VALUES] * len(batch)),
+                tuple(value for knowledge in batch for value in self._row(knowledge))
+            )
+            last_id = getattr(cursor, "lastrowid", None)
+            if last_id is None:
+                raise RuntimeError("数据库未返回新行ID（execute 需返回带 lastrowid 的游标）")
+            for knowledge_id, knowledge in enumerate(batch, last_id - len(batch) + 1):
+                knowledge.id = knowledge_id
+    
+    async def _vector_add(self, knowledge: Knowledge):
+        """写入向量库"""
+        try:
+            await self.vector_store.add_texts(
+                [knowledge.content],
+                [self._vector_metadata(knowledge)],
+                [self._vector_id(knowledge.id)]
+            )
+        except Exception as e:
+            logger.warning(f"向量库写入失败，仅使用关键词检索: {e}")
+    
+    async def _vector_delete(self, knowledge_id: int):
+        """从向量库删除"""
+        try:
+            await self.vector_store.delete([self._vector_id(knowledge_id)])
+        except Exception as e:
+            logger.warning(f"向量库删除失败: {e}")
+    
+    async def _vector_search(
+        self,
+        query: str,
+        top_k: int,
+        categories: Optional[List[KnowledgeCategory]]
+    ) -> List[int]:
+        """向量语义检索，返回按相似度排序的知识ID"""
+        if self.vector_store is None:
+            return []
+        
+        where = None
+        if categories:
+            values = [c.value for c in categories]
+            where = {"category": values[0]} if len(values) == 1 else {"category": {"$in": values}}
+        
+        try:
+            results = await self.vector_store.search(query, top_k=top_k, filter=where)
+        except Exception as e:
+            logger.warning(f"向量检索失败，仅使用关键词检索: {e}")
+            return []
+        
+        ids = []
+        for result in results:
+            knowledge_id = (result.get("metadata") or {}).get("knowledge_id")
+            if knowledge_id in self._items:
+                ids.append(knowledge_id)
+        return ids
         
     async def add_knowledge(
         self,
@@ -61,7 +390,8 @@ class KnowledgeManager:
         knowledge_type: KnowledgeType,
         category: KnowledgeCategory,
         locked: bool = False,
-        tags: Optional[List[str]] = None
+        tags: Optional[List[str]] = None,
+        near_duplicate: str = "flag"
     ) -> Knowledge:
         """
         添加知识条目
@@ -72,31 +402,299 @@ class KnowledgeManager:
             category: 知识分类
             locked: 是否锁定
             tags: 标签列表
+            near_duplicate: 核心知识近似重复处理方式
+                "flag" 照常写入并在 duplicate_of 标记；
+                "merge" 不写入，标签合并到已有条目并返回该条目；
+                "off" 不检测
             
         Returns:
             Knowledge: 知识对象
         """
         logger.info(f"添加知识: {category.value} ({knowledge_type.value})")
         
+        now = datetime.now().isoformat()
         knowledge = Knowledge(
             content=content,
             knowledge_type=knowledge_type,
             category=category,
             locked=locked,
-            tags=tags or []
+            tags=tags or [],
+            created_at=now,
+            updated_at=now
         )
         
         if knowledge_type == KnowledgeType.CORE:
-            # 核心信息：存入数据库 + 向量库
+            if near_duplicate != "off":
+                duplicate = self._find_near_duplicate(content, category)
+                if duplicate is not None:
+                    if near_duplicate == "merge":
+                        logger.info(f"近似重复，合并到已有知识: ID {duplicate.id}")
+                        return await self._merge_into(duplicate, [knowledge])
+                    knowledge.duplicate_of = duplicate.id
+                    logger.warning(f"⚠️ 疑似重复知识: 与 ID {duplicate.id} 相似")
+            
+            # 核心信息：先写数据库（由数据库分配ID），成功后再进入内存索引与向量库
+            self._db_insert([knowledge])
+            self._index(knowledge)
+            await self._bump_version(category)
+            await self._vector_add(knowledge)
             logger.info(f"✅ 核心知识已存储")
             
         else:
             # 即时性信息：仅缓存（7天过期）
-            cache_key = f"ephemeral:{category.value}:{hash(content)}"
-            logger.info(f"✅ 即时信息已缓存: {cache_key}")
+            knowledge.cache_key = self.ephemeral_key(category, content)
+            await self.ephemeral.set(knowledge.cache_key, knowledge.to_json())
+            logger.info(f"✅ 即时信息已缓存: {knowledge.cache_key}")
         
         return knowledge
     
+    # 批量导入时每条近似重复检测最多比较的候选数（模板化条目相互近似时避免平方级开销）
+    _BULK_DUPLICATE_CANDIDATES = 64
+    
+    async def add_knowledge_bulk(
+        self,
+        entries: List[Dict[str, Any]],
+        batch_size: Optional[int] = None,
+        near_duplicate: str = "flag"
+    ) -> List[int]:
+        """
+        批量导入核心知识（设定百科等）
+        
+        按内容哈希去重（批内及与已有知识），近似重复按 near_duplicate 处理（同 add_knowledge，
+        批内条目之间同样检测），数据库按批写入（每批一条多行 INSERT，ID 由数据库分配），
+        写入成功的条目才加入内存索引，向量库按批次嵌入写入。
+        
+        Args:
+            entries: 知识条目列表，每项包含 content、category，
+                可选 locked、tags
+            batch_size: 每批嵌入条数（默认按CPU核数估算）
+            near_duplicate: 近似重复处理方式 "flag" / "merge" / "off"（见 add_knowledge）
+            
+        Returns:
+            List[int]: 与输入一一对应的知识ID（重复内容或合并时返回已有ID）
+            
+        Raises:
+            Exception: 数据库写入失败（此前已写入的批次照常进入内存索引与向量库，
+                与数据库保持一致；失败批次及之后的条目不写入）
+        """
+        logger.info(f"批量导入知识: {len(entries)} 条")
+        
+        now = datetime.now().isoformat()
+        results: List[Any] = []  # 已有知识的ID，或本批新建的条目（写入后换成ID）
+        created: List[Knowledge] = []
+        signatures: List[Any] = []  # 与 created 对应的 MinHash 签名（每条只计算一次）
+        batch_duplicates: Dict[int, Knowledge] = {}  # created 下标 -> 疑似重复的批内条目
+        merged: Dict[int, List[Knowledge]] = {}  # 已有条目ID -> 合并进来的条目
+        batch_hashes: Dict[str, Knowledge] = {}
+        batch_lsh = MinHashLSH(self._lsh.threshold, self._lsh.num_perm, self._lsh.bands)
+        
+        for entry in entries:
+            content = entry["content"]
+            digest = content_hash(content)
+            existing = self._hash_to_id.get(digest) or batch_hashes.get(digest)
+            if existing is not None:
+                results.append(existing)
+                continue
+            
+            category = KnowledgeCategory(entry.get("category", KnowledgeCategory.CUSTOM))
+            knowledge = Knowledge(
+                content=content,
+                knowledge_type=KnowledgeType.CORE,
+                category=category,
+                locked=bool(entry.get("locked", False)),
+                tags=list(entry.get("tags") or []),
+                created_at=now,
+                updated_at=now
+            )
+            
+            signature = None
+            if near_duplicate != "off":
+                limit = self._BULK_DUPLICATE_CANDIDATES
+                signature = self._lsh.signature(content)
+                duplicate = self._find_near_duplicate(content, category, limit, signature)
+                if duplicate is None:
+                    duplicate = next(
+                        (
+                            created[i]
+                            for i, _ in batch_lsh.query(content, max_candidates=limit, signature=signature)
+                            if created[i].category == category
+                        ),
+                        None
+                    )
+                if duplicate is not None:
+                    in_batch = duplicate.id is None
+                    if near_duplicate == "merge":
+                        if in_batch:
+                            # 批内条目尚未写入，直接合并
+                            duplicate.tags.extend(tag for tag in knowledge.tags if tag not in duplicate.tags)
+                            duplicate.locked = duplicate.locked or knowledge.locked
+                            results.append(duplicate)
+                        else:
+                            merged.setdefault(duplicate.id, []).append(knowledge)
+                            results.append(duplicate.id)
+                        continue
+                    if in_batch:
+                        batch_duplicates[len(created)] = duplicate
+                    else:
+                        knowledge.duplicate_of = duplicate.id
+                batch_lsh.add(len(created), content, signature)
+            
+            batch_hashes[digest] = knowledge
+            signatures.append(signature)
+            created.append(knowledge)
+            results.append(knowledge)
+        
+        error: Optional[Exception] = None
+        if created:
+            try:
+                self._db_insert(created)
+            except Exception as e:
+                logger.error(f"知识库批量写入失败: {e}")
+                error = e
+            
+            # 只有已写入的条目（失败批次之前的部分）进入内存索引与向量库
+            written = [knowledge for knowledge in created if knowledge.id is not None]
+            for i, duplicate in batch_duplicates.items():
+                created[i].duplicate_of = duplicate.id
+            for knowledge, signature in zip(written, signatures):
+                self._index(knowledge, signature)
+            await self._bump_version(*{knowledge.category for knowledge in written})
+            
+            # 向量库：按批次嵌入
+            batch_size = batch_size or self._default_embed_batch_size()
+            for start in range(0, len(written), batch_size):
+                batch = written[start:start + batch_size]
+                try:
+                    await self.vector_store.add_texts(
+                        [knowledge.content for knowledge in batch],
+                        [self._vector_metadata(knowledge) for knowledge in batch],
+                        [self._vector_id(knowledge.id) for knowledge in batch]
+                    )
+                except Exception as e:
+                    logger.warning(f"向量库批量写入失败，仅使用关键词检索: {e}")
+        
+        if error is not None:
+            raise error
+        
+        for keeper_id, duplicates in merged.items():
+            await self._merge_into(self._items[keeper_id], duplicates)
+        
+        flagged = sum(knowledge.duplicate_of is not None for knowledge in created)
+        logger.info(
+            f"✅ 批量导入完成: 新增 {len(created)} 条（疑似重复 {flagged} 条），"
+            f"重复或合并 {len(entries) - len(created)} 条"
+        )
+        return [item.id if isinstance(item, Knowledge) else item for item in results]
+    
+    def _find_near_duplicate(
+        self,
+        content: str,
+        category: KnowledgeCategory,
+        max_candidates: Optional[int] = None,
+        signature=None
+    ) -> Optional[Knowledge]:
+        """查找同分类下最相似的近似重复知识"""
+        for knowledge_id, _ in self._lsh.query(content, max_candidates=max_candidates, signature=signature):
+            knowledge = self._items.get(knowledge_id)
+            if knowledge is not None and knowledge.category == category:
+                return knowledge
+        return None
+    
+    async def _merge_into(self, keeper: Knowledge, duplicates: List[Knowledge]) -> Knowledge:
+        """将重复条目的标签与锁定状态合并到保留条目"""
+        tags = list(keeper.tags or [])
+        for duplicate in duplicates:
+            tags.extend(tag for tag in duplicate.tags or [] if tag not in tags)
+        locked = keeper.locked or any(duplicate.locked for duplicate in duplicates)
+        
+        if tags != (keeper.tags or []) or locked != keeper.locked:
+            return await self.update_knowledge(keeper.id, locked=locked, tags=tags)
+        return keeper
+    
+    async def deduplicate_knowledge(
+        self,
+        threshold: Optional[float] = None,
+        merge: bool = False
+    ) -> List[List[int]]:
+        """
+        离线去重：扫描全部核心知识，找出近似重复簇
+        
+        Args:
+            threshold: 相似度阈值（默认使用索引阈值）
+            merge: 是否合并（每簇保留锁定或最早的条目，其余删除）
+            
+        Returns:
+            List[List[int]]: 重复簇（每簇首个ID为保留条目）
+        """
+        logger.info(f"开始离线去重: {len(self._items)} 条知识")
+        
+        # 并查集聚簇（仅同分类）
+        parent: Dict[int, int] = {}
+        
+        def find(x: int) -> int:
+            while parent.get(x, x) != x:
+                parent[x] = parent.get(parent[x], parent[x])
+                x = parent[x]
+            return x
+        
+        for knowledge_id, knowledge in self._items.items():
+            for other_id, _ in self._lsh.query_id(knowledge_id, threshold):
+                other = self._items.get(other_id)
+                if other is None or other.category != knowledge.category:
+                    continue
+                root_a, root_b = find(knowledge_id), find(other_id)
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+        
+        groups: Dict[int, List[int]] = {}
+        for knowledge_id in parent:
+            groups.setdefault(find(knowledge_id), []).append(knowledge_id)
+        
+        clusters = []
+        for root, members in groups.items():
+            members = sorted(set(members) | {root})
+            if len(members) < 2:
+                continue
+            # 锁定条目优先保留，其次保留最早的
+            members.sort(key=lambda i: (not self._items[i].locked, i))
+            clusters.append(members)
+        
+        if merge:
+            for keeper_id, *duplicate_ids in clusters:
+                duplicates = [self._items[i] for i in duplicate_ids]
+                for duplicate_id in duplicate_ids:
+                    await self.delete_knowledge(duplicate_id)
+                await self._merge_into(self._items[keeper_id], duplicates)
+        
+        logger.info(f"✅ 离线去重完成: 发现 {len(clusters)} 个重复簇")
+        return clusters
+    
+    @staticmethod
+    def _default_embed_batch_size() -> int:
+        """嵌入批大小：每个CPU核约64条，上限1024"""
+        return min(1024, 64 * (os.cpu_count() or 1))
+    
+    @staticmethod
+    def ephemeral_key(category: KnowledgeCategory, content: str) -> str:
+        """即时信息缓存键（基于稳定内容哈希）"""
+        return f"ephemeral:{category.value}:{content_hash(content)}"
+    
+    async def get_ephemeral(self, cache_keys: List[str]) -> List[Optional[Knowledge]]:
+        """
+        批量读取即时信息
+        
+        Args:
+            cache_keys: 缓存键列表
+            
+        Returns:
+            List[Optional[Knowledge]]: 与键一一对应（已过期为 None）
+        """
+        values = await self.ephemeral.get_many(cache_keys)
+        return [
+            Knowledge.from_json(values[key]) if values.get(key) else None
+            for key in cache_keys
+        ]
+    
     async def retrieve_context(
         self,
         query: str,
@@ -106,6 +704,8 @@ class KnowledgeManager:
         """
         检索相关上下文（核心信息优先，锁定信息置顶）
         
+        关键词（BM25）与语义（向量）两路召回，经倒数排名融合后排序。
+        
         Args:
             query: 查询文本
             top_k: 返回Top-K结果
@@ -116,7 +716,44 @@ class KnowledgeManager:
         """
         logger.info(f"检索上下文: {query}")
         
-        all_results = []
+        if top_k <= 0:
+            return []
+        await self._sync_versions()
+        if not self._items:
+            return []
+        
+        # 分类顺序无关，统一排序后作为缓存键
+        if categories:
+            categories = sorted(set(categories), key=lambda c: c.value)
+        # 检索与缓存键使用同一归一化查询，保证命中缓存与实际检索结果一致
+        query = normalize_query(query)
+        cache_key = (
+            self.project_id,
+            query,
+            tuple(c.value for c in categories or ()),
+            top_k
+        )
+        versions = self._versions(categories)
+        cached = self._retrieval_cache.get(cache_key, versions)
+        if cached is not None:
+            logger.info(f"✅ 检索缓存命中，返回 {len(cached)} 条结果")
+            return cached
+        
+        # 每路多召回一些候选，融合后再截断
+        candidate_k = max(top_k * 3, 20)
+        
+        lexical_ids = [doc_id for doc_id, _ in self._bm25.search(query, candidate_k, groups=categories)]
+        semantic_ids = await self._vector_search(query, candidate_k, categories)
+        
+        fused = reciprocal_rank_fusion([lexical_ids, semantic_ids])
+        
+        # 锁定信息置顶（排序稳定，组内保持融合得分顺序）
+        ranked = sorted(
+            (self._items[doc_id] for doc_id, _ in fused if doc_id in self._items),
+            key=lambda knowledge: not knowledge.locked
+        )
+        all_results = [knowledge.content for knowledge in ranked[:top_k]]
+        self._retrieval_cache.put(cache_key, versions, all_results)
         
         logger.info(f"✅ 检索完成，返回 {len(all_results)} 条结果")
         return all_results
@@ -141,12 +778,59 @@ class KnowledgeManager:
             Knowledge: 更新后的知识对象
         """
         logger.info(f"更新知识: ID {knowledge_id}")
+        
+        knowledge = self._items.get(knowledge_id)
+        if knowledge is None:
+            raise ValueError(f"知识不存在: ID {knowledge_id}")
+        
+        content_changed = content is not None and content != knowledge.content
+        new_locked = knowledge.locked if locked is None else locked
+        new_tags = knowledge.tags if tags is None else tags
+        updated_at = datetime.now().isoformat()
+        
+        # 先写数据库，失败时内存状态不变
+        self._db_execute(
+            "UPDATE knowledge_items SET content = ?, locked = ?, tags = ?, updated_at = ? WHERE id = ?",
+            (
+                content if content_changed else knowledge.content, int(new_locked),
+                json.dumps(new_tags or [], ensure_ascii=False),
+                updated_at, knowledge_id
+            )
+        )
+        
+        if content_changed:
+            self._forget_hash(knowledge)
+            self._hash_to_id[content_hash(content)] = knowledge_id
+            knowledge.content = content
+        knowledge.locked = new_locked
+        knowledge.tags = new_tags
+        knowledge.updated_at = updated_at
+        await self._bump_version(knowledge.category)
+        
+        if content_changed:
+            self._bm25.add(knowledge_id, knowledge.content, group=knowledge.category)
+            self._lsh.add(knowledge_id, knowledge.content)
+        if content_changed or locked is not None:
+            await self._vector_delete(knowledge_id)
+            await self._vector_add(knowledge)
+        
         logger.success(f"✅ 知识 {knowledge_id} 更新完成")
-        return Knowledge()
+        return knowledge
     
     async def delete_knowledge(self, knowledge_id: int):
         """删除知识条目"""
         logger.info(f"删除知识: ID {knowledge_id}")
+        
+        knowledge = self._items.get(knowledge_id)
+        if knowledge is None:
+            logger.warning(f"知识不存在: ID {knowledge_id}")
+            return
+        
+        self._db_execute("DELETE FROM knowledge_items WHERE id = ?", (knowledge_id,))
+        self._unindex(knowledge_id)
+        await self._bump_version(knowledge.category)
+        await self._vector_delete(knowledge_id)
+        
         logger.success(f"✅ 知识 {knowledge_id} 已删除")
     
     async def get_by_category(
@@ -156,5 +840,10 @@ class KnowledgeManager:
     ) -> List[Knowledge]:
         """按分类获取知识"""
         logger.info(f"获取分类知识: {category.value}")
-        logger.info(f"✅ 找到相关知识")
-        return []
+        results = [
+            knowledge for knowledge in self._items.values()
+            if knowledge.category == category
+            and (knowledge_type is None or knowledge.knowledge_type == knowledge_type)
+        ]
+        logger.info(f"✅ 找到 {len(results)} 条相关知识")
+        return results
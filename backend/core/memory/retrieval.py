@@ -0,0 +1,257 @@
+"""
+混合检索组件
+BM25 倒排索引（中文字符二元组）+ 倒数排名融合 (RRF) + 检索结果缓存
+"""
+
+import math
+import re
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# 中日韩统一表意文字连续片段 / 拉丁字母与数字组成的词
+_CJK_RUN = re.compile(r"[㐀-䶿一-鿿豈-﫿]+")
+_WORD_RUN = re.compile(r"[0-9a-zA-Z]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    中文分词（字符二元组）
+
+    中文片段切分为重叠的二元组（单字片段保留单字），
+    英文与数字按词切分并转小写。
+
+    Args:
+        text: 待切分文本
+
+    Returns:
+        List[str]: 词项列表
+    """
+    tokens: List[str] = []
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(word.lower() for word in _WORD_RUN.findall(text))
+    return tokens
+
+
+class BM25Index:
+    """
+    增量式 BM25 倒排索引
+
+    文档映射到连续槽位，倒排链在首次检索时冻结为 NumPy 数组，
+    检索只对查询词项的倒排链做向量化打分，与文档总数无关。
+    文档可附带分组（如知识分类），检索时按分组过滤。
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._frozen: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._doc_terms: Dict[int, Counter] = {}
+
+        self._slot_of: Dict[Hashable, int] = {}
+        self._slot_ids: List[Optional[Hashable]] = []
+        self._free_slots: List[int] = []
+        self._doc_len = np.zeros(1024, dtype=np.float32)
+        self._slot_group = np.full(1024, -1, dtype=np.int32)
+        self._group_codes: Dict[Hashable, int] = {}
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self._slot_of
+
+    def _allocate_slot(self, doc_id: Hashable) -> int:
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._slot_ids[slot] = doc_id
+        else:
+            slot = len(self._slot_ids)
+            self._slot_ids.append(doc_id)
+            if slot >= len(self._doc_len):
+                capacity = len(self._doc_len) * 2
+                self._doc_len = np.resize(self._doc_len, capacity)
+                grown = np.full(capacity, -1, dtype=np.int32)
+                grown[:len(self._slot_group)] = self._slot_group
+                self._slot_group = grown
+        self._slot_of[doc_id] = slot
+        return slot
+
+    def add(self, doc_id: Hashable, text: str, group: Optional[Hashable] = None):
+        """添加文档（已存在则覆盖）"""
+        if doc_id in self._slot_of:
+            self.remove(doc_id)
+
+        slot = self._allocate_slot(doc_id)
+        terms = Counter(tokenize(text))
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[slot] = tf
+            self._frozen.pop(term, None)
+
+        length = sum(terms.values())
+        self._doc_terms[slot] = terms
+        self._doc_len[slot] = length
+        self._slot_group[slot] = self._group_codes.setdefault(group, len(self._group_codes))
+        self._total_len += length
+
+    def remove(self, doc_id: Hashable):
+        """删除文档"""
+        slot = self._slot_of.pop(doc_id, None)
+        if slot is None:
+            return
+
+        for term in self._doc_terms.pop(slot):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(slot, None)
+            self._frozen.pop(term, None)
+            if not posting:
+                del self._postings[term]
+
+        self._total_len -= int(self._doc_len[slot])
+        self._doc_len[slot] = 0
+        self._slot_group[slot] = -1
+        self._slot_ids[slot] = None
+        self._free_slots.append(slot)
+
+    def _posting_arrays(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        frozen = self._frozen.get(term)
+        if frozen is None:
+            posting = self._postings.get(term)
+            if not posting:
+                return None
+            frozen = (
+                np.fromiter(posting.keys(), dtype=np.int64, count=len(posting)),
+                np.fromiter(posting.values(), dtype=np.float32, count=len(posting))
+            )
+            self._frozen[term] = frozen
+        return frozen
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        groups: Optional[Iterable[Hashable]] = None
+    ) -> List[Tuple[Hashable, float]]:
+        """
+        BM25 检索
+
+        Args:
+            query: 查询文本
+            top_k: 返回Top-K结果
+            groups: 限定分组（可选）
+
+        Returns:
+            List[Tuple[Hashable, float]]: (文档ID, 得分)，按得分降序
+        """
+        n_docs = len(self._slot_of)
+        if n_docs == 0 or top_k <= 0:
+            return []
+
+        avgdl = self._total_len / n_docs or 1.0
+        k1, b = self.k1, self.b
+        norm = k1 * (1.0 - b)
+        scale = k1 * b / avgdl
+        scores = np.zeros(len(self._slot_ids), dtype=np.float32)
+
+        for term, qtf in Counter(tokenize(query)).items():
+            arrays = self._posting_arrays(term)
+            if arrays is None:
+                continue
+            slots, tf = arrays
+            df = len(slots)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)) * qtf
+            # 同一词项的倒排链内槽位唯一，可直接按索引累加
+            scores[slots] += idf * tf * (k1 + 1.0) / (tf + norm + scale * self._doc_len[slots])
+
+        candidates = np.flatnonzero(scores)
+        if groups is not None:
+            codes = [self._group_codes[g] for g in groups if g in self._group_codes]
+            candidates = candidates[np.isin(self._slot_group[candidates], codes)]
+        if len(candidates) == 0:
+            return []
+
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        return [(self._slot_ids[slot], float(scores[slot])) for slot in candidates]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Hashable]],
+    k: int = 60
+) -> List[Tuple[Hashable, float]]:
+    """
+    倒数排名融合 (Reciprocal Rank Fusion)
+
+    score(d) = Σ 1 / (k + rank_i(d))，rank 从 1 开始
+
+    Args:
+        rankings: 多路检索的结果ID列表（各自按相关度降序）
+        k: 平滑常数
+
+    Returns:
+        List[Tuple[Hashable, float]]: (文档ID, 融合得分)，按得分降序
+    """
+    fused: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def normalize_query(query: str) -> str:
+    """查询归一化：全角转半角、合并空白、小写"""
+    return " ".join(unicodedata.normalize("NFKC", query).split()).lower()
+
+
+class RetrievalCache:
+    """
+    带版本校验的检索结果缓存（LRU）
+
+    每条结果记录写入时相关分类的版本号快照，读取时与当前版本比对，
+    任一分类版本变化即视为失效，因此不会返回过期结果（前提是版本号覆盖了全部写入方，
+    KnowledgeManager 配置 Redis 时使用各 worker 共享的版本号）。
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Tuple[int, ...], List[str]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, versions: Tuple[int, ...]) -> Optional[List[str]]:
+        """读取缓存（版本不一致时丢弃并返回 None）"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != versions:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return list(entry[1])
+
+    def put(self, key: Hashable, versions: Tuple[int, ...], results: List[str]):
+        """写入缓存"""
+        self._entries[key] = (versions, list(results))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
@@ -9,9 +9,10 @@ Phase 4: 实时监控与反馈系统
 """
 
 from .models import (
-    PlotNode, NovelProject, PlotLoop,
+    PlotNode, NovelProject, PlotLoop, ProgressRollup,
     NodeType, NodeStatus, PacingTemplate
 )
+from .store import ProjectStore  # 仅依赖标准库 sqlite3
 # 其他模块需要外部依赖（LLM、数据库等），在使用时单独导入
 # from .guardian import OutlineGuardian
 # from .loop_tracker import LoopTracker
@@ -19,8 +20,9 @@ from .models import (
 
 __all__ = [
     # 数据模型（基础功能，无外部依赖）
-    "PlotNode", "NovelProject", "PlotLoop",
+    "PlotNode", "NovelProject", "PlotLoop", "ProgressRollup",
     "NodeType", "NodeStatus", "PacingTemplate",
+    "ProjectStore",
 
     # 核心组件（需要外部依赖，单独导入）
     # "OutlineGuardian", "LoopTracker", "PacingAnalyzer"
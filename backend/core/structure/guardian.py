@@ -168,14 +168,8 @@ class OutlineGuardian:
             return {"success": False, "error": str(e)}
 
     def _get_subsequent_nodes(self, project, node_id: str) -> list:
-        """获取后续节点（简化版，实际应该考虑树状结构）"""
-        nodes = project.outline_tree
-        start_idx = next((i for i, node in enumerate(nodes) if node.id == node_id), -1)
-
-        if start_idx == -1:
-            return []
-
-        return nodes[start_idx + 1:]
+        """获取后续节点（按大纲树的阅读顺序）"""
+        return project.nodes_after(node_id)
 
     def _generate_content_summary(self, content: str) -> str:
         """生成内容总结（简化版）"""
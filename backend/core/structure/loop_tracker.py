@@ -4,7 +4,7 @@
 """
 import json
 import re
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
 from loguru import logger
 from backend.core.structure.models import PlotLoop, NovelProject, PlotNode
 
@@ -214,40 +214,31 @@ class LoopTracker:
         Returns:
             伏笔报告
         """
-        open_loops = [loop for loop in project.open_loops if loop.status == "open"]
-        resolved_loops = project.resolved_loops
-
-        # 按重要性分组统计
-        open_by_importance = {
-            "critical": len([l for l in open_loops if l.importance == "critical"]),
-            "major": len([l for l in open_loops if l.importance == "major"]),
-            "minor": len([l for l in open_loops if l.importance == "minor"])
-        }
-
-        resolved_by_importance = {
-            "critical": len([l for l in resolved_loops if l.importance == "critical"]),
-            "major": len([l for l in resolved_loops if l.importance == "major"]),
-            "minor": len([l for l in resolved_loops if l.importance == "minor"])
-        }
+        # 按重要性分组统计（项目增量维护的计数）
+        stats = project.loop_stats()
+        open_by_importance = stats["open_by_importance"]
+        resolved_by_importance = stats["resolved_by_importance"]
+        total_open = sum(open_by_importance.values())
+        total_resolved = sum(resolved_by_importance.values())
 
         # 计算解决率
-        total_loops = len(open_loops) + len(resolved_loops)
-        resolution_rate = len(resolved_loops) / total_loops if total_loops > 0 else 0
+        total_loops = total_open + total_resolved
+        resolution_rate = total_resolved / total_loops if total_loops > 0 else 0
 
         # 生成健康度评估
         health_score = self._calculate_loops_health(open_by_importance, resolution_rate)
 
         report = {
             "summary": {
-                "total_open": len(open_loops),
-                "total_resolved": len(resolved_loops),
+                "total_open": total_open,
+                "total_resolved": total_resolved,
                 "total_loops": total_loops,
                 "resolution_rate": round(resolution_rate, 2),
                 "health_score": health_score
             },
             "open_by_importance": open_by_importance,
             "resolved_by_importance": resolved_by_importance,
-            "critical_issues": self._identify_critical_issues(open_loops),
+            "critical_issues": self._identify_critical_issues(open_by_importance),
             "recommendations": self._generate_recommendations(open_by_importance, health_score)
         }
 
@@ -267,13 +258,13 @@ class LoopTracker:
         health_score = base_score - critical_penalty - major_penalty
         return max(0.0, min(1.0, health_score))
 
-    def _identify_critical_issues(self, open_loops: List[PlotLoop]) -> List[str]:
+    def _identify_critical_issues(self, open_by_importance: Dict[str, int]) -> List[str]:
         """识别关键问题"""
         issues = []
 
-        critical_loops = [loop for loop in open_loops if loop.importance == "critical"]
-        if len(critical_loops) > 2:
-            issues.append(f"存在 {len(critical_loops)} 个未解决的关键伏笔")
+        critical_count = open_by_importance["critical"]
+        if critical_count > 2:
+            issues.append(f"存在 {critical_count} 个未解决的关键伏笔")
 
         # 检查是否有长期未解决的伏笔
         # 这里可以根据创建时间判断
@@ -1,10 +1,15 @@
 """
 小说项目核心数据结构
 用于Phase 4: 结构化创作引擎 (Gardener Mode)
+
+PlotNode / PlotLoop 面向数万节点的大纲做了紧凑化：使用 __slots__（无实例 __dict__），
+ID 驻留（sys.intern），空列表共用同一个空元组（首次读取时才换成独立列表），
+时间以微秒整数存放（读取时转换为 datetime）。公开属性与校验与原数据类一致。
 """
-from dataclasses import dataclass, field
-from typing import List, Dict, Optional, Literal
-from datetime import datetime
+import sys
+from dataclasses import dataclass, field, replace
+from typing import Any, Iterable, List, Dict, Optional, Literal
+from datetime import datetime, timedelta
 from enum import Enum
 
 class NodeType(Enum):
@@ -26,55 +31,229 @@ class PacingTemplate(Enum):
     SAVE_THE_CAT = "save_the_cat"  # 救猫咪
     CUSTOM = "custom"              # 自定义
 
-@dataclass
-class PlotNode:
-    """大纲节点 (可以是卷、章、或具体场景)"""
-    id: str
-    title: str
-    description: str  # 预设的大纲内容
-    type: NodeType
+# 本地时间（不含时区）的微秒计时起点
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+# 所有空列表字段共用的空元组
+_EMPTY = ()
 
-    # 状态追踪
-    status: NodeStatus = NodeStatus.DRAFT
-    actual_content_summary: str = ""  # AI生成的正文实际总结
-    deviation_score: float = 0.0      # 偏离度 (0-1)
 
-    # 关联信息
-    characters: List[str] = field(default_factory=list)
-    open_loops: List[str] = field(default_factory=list)  # 本节埋下的伏笔
-    closed_loops: List[str] = field(default_factory=list)  # 本节回收的伏笔
+def _to_timestamp(value: datetime) -> int:
+    """datetime → 微秒整数（带时区的时间先转换为本地时间）"""
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return (value - _EPOCH) // _MICROSECOND
 
-    # 元数据
-    created_at: datetime = field(default_factory=datetime.now)
-    updated_at: datetime = field(default_factory=datetime.now)
-    word_count: int = 0  # 实际字数
-    estimated_word_count: int = 0  # 预估字数
 
+def _now() -> int:
+    return _to_timestamp(datetime.now())
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return None if value is None else sys.intern(value)
+
+
+class _ListField:
+    """列表属性：空列表存为共享空元组，读取时换成独立列表（原地修改语义不变）"""
+
+    def __set_name__(self, owner, name):
+        self.slot = f"_{name}"
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if value is _EMPTY:
+            value = []
+            setattr(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj, value: Iterable[str]):
+        if not value:
+            setattr(obj, self.slot, _EMPTY)
+            return
+        if not isinstance(value, list):
+            value = list(value)
+        value[:] = map(_intern, value)
+        setattr(obj, self.slot, value)
+
+
+class _TimeField:
+    """时间属性：存为微秒整数"""
+
+    def __set_name__(self, owner, name):
+        self.slot = f"_{name}"
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        return None if value is None else _EPOCH + value * _MICROSECOND
+
+    def __set__(self, obj, value: Optional[datetime]):
+        setattr(obj, self.slot, None if value is None else _to_timestamp(value))
+
+
+class _CompactRecord:
+    """按 _fields 提供比较、repr 与字典转换（对应数据类的 eq / repr / asdict）"""
+    __slots__ = ()
+    _fields: tuple = ()
+    __hash__ = None
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self._fields)
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{self.__class__.__name__}({values})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            name: list(value) if isinstance(value, (list, tuple)) else value
+            for name in self._fields
+            for value in (getattr(self, name),)
+        }
+
+
+class PlotNode(_CompactRecord):
+    """大纲节点 (可以是卷、章、或具体场景)"""
+    __slots__ = (
+        "id", "title", "description", "type",
+        "status", "actual_content_summary", "deviation_score",
+        "_characters", "_open_loops", "_closed_loops",
+        "_created_at", "_updated_at", "word_count", "estimated_word_count",
+        "parent_id", "_children_ids"
+    )
+    _fields = (
+        "id", "title", "description", "type",
+        "status", "actual_content_summary", "deviation_score",
+        "characters", "open_loops", "closed_loops",
+        "created_at", "updated_at", "word_count", "estimated_word_count",
+        "parent_id", "children_ids"
+    )
+
+    # 关联信息
+    characters = _ListField()
+    open_loops = _ListField()  # 本节埋下的伏笔
+    closed_loops = _ListField()  # 本节回收的伏笔
+    # 元数据
+    created_at = _TimeField()
+    updated_at = _TimeField()
     # 树状结构关系
-    parent_id: Optional[str] = None
-    children_ids: List[str] = field(default_factory=list)
+    children_ids = _ListField()
 
-    def __post_init__(self):
+    def __init__(
+        self,
+        id: str,
+        title: str,
+        description: str,  # 预设的大纲内容
+        type: NodeType,
+        status: NodeStatus = NodeStatus.DRAFT,  # 状态追踪
+        actual_content_summary: str = "",  # AI生成的正文实际总结
+        deviation_score: float = 0.0,  # 偏离度 (0-1)
+        characters: Iterable[str] = _EMPTY,
+        open_loops: Iterable[str] = _EMPTY,
+        closed_loops: Iterable[str] = _EMPTY,
+        created_at: Optional[datetime] = None,
+        updated_at: Optional[datetime] = None,
+        word_count: int = 0,  # 实际字数
+        estimated_word_count: int = 0,  # 预估字数
+        parent_id: Optional[str] = None,
+        children_ids: Iterable[str] = _EMPTY
+    ):
         """数据验证"""
-        if not self.id:
+        if not id:
             raise ValueError("节点ID不能为空")
-        if not self.title:
+        if not title:
             raise ValueError("节点标题不能为空")
-        if self.deviation_score < 0 or self.deviation_score > 1:
+        if deviation_score < 0 or deviation_score > 1:
             raise ValueError("偏离度必须在0-1之间")
+        self.id = sys.intern(id)
+        self.title = title
+        self.description = description
+        self.type = type
+        self.status = status
+        self.actual_content_summary = actual_content_summary
+        self.deviation_score = deviation_score
+        self.characters = characters
+        self.open_loops = open_loops
+        self.closed_loops = closed_loops
+        self._created_at = _now() if created_at is None else _to_timestamp(created_at)
+        # 新建节点的两个时间共用同一个整数对象
+        self._updated_at = self._created_at if updated_at is None else _to_timestamp(updated_at)
+        self.word_count = word_count
+        self.estimated_word_count = estimated_word_count
+        self.parent_id = _intern(parent_id)
+        self.children_ids = children_ids
 
-@dataclass
-class PlotLoop:
+
+class PlotLoop(_CompactRecord):
     """伏笔/悬念对象"""
-    id: str
-    description: str  # 伏笔描述
-    created_in_node: str  # 在哪个节点中创建
-    resolved_in_node: Optional[str] = None  # 在哪个节点中解决
-    status: Literal["open", "resolved", "abandoned"] = "open"
-    importance: Literal["minor", "major", "critical"] = "minor"
+    __slots__ = (
+        "id", "description", "created_in_node", "resolved_in_node",
+        "status", "importance", "_created_at", "_resolved_at"
+    )
+    _fields = (
+        "id", "description", "created_in_node", "resolved_in_node",
+        "status", "importance", "created_at", "resolved_at"
+    )
 
-    created_at: datetime = field(default_factory=datetime.now)
-    resolved_at: Optional[datetime] = None
+    created_at = _TimeField()
+    resolved_at = _TimeField()
+
+    def __init__(
+        self,
+        id: str,
+        description: str,  # 伏笔描述
+        created_in_node: str,  # 在哪个节点中创建
+        resolved_in_node: Optional[str] = None,  # 在哪个节点中解决
+        status: Literal["open", "resolved", "abandoned"] = "open",
+        importance: Literal["minor", "major", "critical"] = "minor",
+        created_at: Optional[datetime] = None,
+        resolved_at: Optional[datetime] = None
+    ):
+        self.id = sys.intern(id)
+        self.description = description
+        self.created_in_node = sys.intern(created_in_node)
+        self.resolved_in_node = _intern(resolved_in_node)
+        self.status = sys.intern(status)
+        self.importance = sys.intern(importance)
+        self._created_at = _now() if created_at is None else _to_timestamp(created_at)
+        self.resolved_at = resolved_at
+
+LOOP_IMPORTANCE_LEVELS = ("critical", "major", "minor")
+
+
+@dataclass
+class ProgressRollup:
+    """节点聚合统计（项目整体或单卷）"""
+    node_count: int = 0
+    finished_count: int = 0
+    word_count: int = 0
+    estimated_word_count: int = 0
+
+    def apply(self, node: PlotNode, sign: int = 1):
+        """计入（sign=1）或移除（sign=-1）一个节点"""
+        self.node_count += sign
+        self.finished_count += sign * (node.status == NodeStatus.FINISHED)
+        self.word_count += sign * node.word_count
+        self.estimated_word_count += sign * node.estimated_word_count
+
+    @property
+    def completion(self) -> float:
+        return self.finished_count / self.node_count if self.node_count else 0.0
+
+@dataclass
+class ProjectChanges:
+    """上次保存以来的变更（供增量持久化）"""
+    nodes: List[PlotNode]
+    removed_node_ids: List[str]
+    loops: List[PlotLoop]
+
+    def __bool__(self) -> bool:
+        return bool(self.nodes or self.removed_node_ids or self.loops)
 
 @dataclass
 class PacingCheckpoint:
@@ -86,10 +265,25 @@ class PacingCheckpoint:
 
 @dataclass
 class NovelProject:
-    """小说项目"""
+    """
+    小说项目
+
+    outline_tree 存放全部节点，树结构由节点的 parent_id / children_ids 表示，
+    列表始终按先序（即阅读顺序）排列。项目维护 ID → 节点、父子邻接、
+    先序位置与字数前缀和索引：按 ID 查找为 O(1)，取某节点之后的 k 个节点为 O(k)。
+    结构变更请使用 add_node / move_node / remove_node 以保持索引一致
+    （直接增删 outline_tree 元素时，下次查询会按节点数变化重建索引）。
+
+    完成节点数、字数、各重要性的伏笔数与分卷统计均为增量维护的计数，读取为 O(1)；
+    节点与伏笔的状态变更请使用 set_node_status / update_word_count /
+    add_loop / resolve_loop 等状态转换方法，计数随之更新。
+
+    上述方法同时记录变更的节点与伏笔（含因兄弟顺序变化而受影响的节点），
+    存储层据此只写入变更部分；直接修改节点属性后请调用 mark_node_dirty / mark_loop_dirty。
+    """
     id: str
     title: str
-    outline_tree: List[PlotNode]  # 树状结构
+    outline_tree: List[PlotNode]  # 树状结构（先序排列）
 
     # 全局节奏配置
     target_word_count: int = 200000
@@ -118,23 +312,501 @@ class NovelProject:
             raise ValueError("目标字数必须大于0")
         if self.completion_percentage < 0 or self.completion_percentage > 1:
             raise ValueError("完成百分比必须在0-1之间")
+        self._nodes: Dict[str, PlotNode] = {}
+        self._removed_nodes = set()
+        self._unloaded_volumes: Dict[str, ProgressRollup] = {}
+        self._rebuild_index()
+        self._recount_loops()
+
+    # ------------------------------------------------------------------
+    # 大纲树索引
+    # ------------------------------------------------------------------
+
+    def _rebuild_index(self):
+        """
+        由节点关系重建索引，并把 outline_tree 重排为先序
+
+        父节点以 parent_id 为准（为空时取声明其为子节点的节点），
+        子节点顺序以 children_ids 为准，未列出的子节点按原列表顺序补在后面；
+        重建后两者互相一致。
+        """
+        nodes: Dict[str, PlotNode] = {}
+        for node in self.outline_tree:
+            if node.id in nodes:
+                raise ValueError(f"节点ID重复: {node.id}")
+            nodes[node.id] = node
+
+        listed_parent = {}
+        for node in self.outline_tree:
+            for child_id in node._children_ids:
+                listed_parent.setdefault(child_id, node.id)
+        parents = {}
+        for node in self.outline_tree:
+            parent_id = node.parent_id if node.parent_id in nodes else listed_parent.get(node.id)
+            parents[node.id] = parent_id if parent_id != node.id else None
+
+        roots = []
+        children: Dict[str, List[str]] = {node_id: [] for node_id in nodes}
+        placed = set()
+        for node in self.outline_tree:
+            for child_id in node._children_ids:
+                if parents.get(child_id) == node.id and child_id not in placed:
+                    children[node.id].append(child_id)
+                    placed.add(child_id)
+        for node in self.outline_tree:
+            parent_id = parents[node.id]
+            if parent_id is None:
+                roots.append(node.id)
+            elif node.id not in placed:
+                children[parent_id].append(node.id)
+
+        order = []
+        stack = list(reversed(roots))
+        while stack:
+            node_id = stack.pop()
+            order.append(nodes[node_id])
+            stack.extend(reversed(children[node_id]))
+        if len(order) != len(nodes):
+            raise ValueError("大纲树存在环")
+
+        for node_id, node in nodes.items():
+            node.parent_id = parents[node_id]
+            node.children_ids = children[node_id]
+        self.outline_tree[:] = order
+        # 绕过索引的结构变更无法细分，全部节点视为已变更
+        self._removed_nodes.update(set(self._nodes) - set(nodes))
+        self._removed_nodes.difference_update(nodes)
+        self._dirty_nodes = set(nodes)
+        self._nodes = nodes
+        self._roots = roots
+        self._position: Dict[str, int] = {}
+        self._word_prefix = [0]  # _word_prefix[i] = 先序前 i 个节点的字数和（按需补齐）
+        self._reindex(0)
+        self._recount_nodes()
+
+    def _reindex(self, start: int):
+        """更新 start 起的先序位置，并使该位置后的字数前缀和失效"""
+        for i in range(start, len(self.outline_tree)):
+            self._position[self.outline_tree[i].id] = i
+        del self._word_prefix[start + 1:]
+
+    def _ensure_index(self):
+        if len(self._nodes) != len(self.outline_tree):
+            self._rebuild_index()
+
+    # ------------------------------------------------------------------
+    # 增量统计
+    # ------------------------------------------------------------------
+
+    def _volume_of(self, node: PlotNode) -> Optional[str]:
+        """节点所属的卷（自身为卷时即自身）"""
+        while node.type != NodeType.VOLUME:
+            if node.parent_id is None:
+                return None
+            node = self._nodes[node.parent_id]
+        return node.id
+
+    def _count_node(self, node: PlotNode, sign: int = 1):
+        self._totals.apply(node, sign)
+        volume_id = self._volume_of(node)
+        if volume_id is not None:
+            self._volumes.setdefault(volume_id, ProgressRollup()).apply(node, sign)
+            if sign < 0 and not self._volumes[volume_id].node_count:
+                del self._volumes[volume_id]
+
+    def _recount_nodes(self):
+        """全量重算节点统计（含未加载卷内容的统计）"""
+        self._totals = ProgressRollup()
+        self._volumes: Dict[str, ProgressRollup] = {}
+        for volume_id, rollup in self._unloaded_volumes.items():
+            self._volumes[volume_id] = replace(rollup)
+            for name in ("node_count", "finished_count", "word_count", "estimated_word_count"):
+                setattr(self._totals, name, getattr(self._totals, name) + getattr(rollup, name))
+        for node in self.outline_tree:
+            self._count_node(node)
+
+    def _set_unloaded_volumes(self, rollups: Dict[str, ProgressRollup]):
+        """
+        标记按卷部分加载时未加载内容的卷（由存储层调用）
+
+        这些卷的内容不在 outline_tree 中：其结构不可修改，
+        统计计入存储层给出的内容统计（不含卷节点本身）。
+        """
+        self._unloaded_volumes = dict(rollups)
+        self._recount_nodes()
+
+    def _check_loaded(self, node: PlotNode):
+        """结构变更前检查节点所属的卷已加载"""
+        if self._unloaded_volumes:
+            volume_id = self._volume_of(node)
+            if volume_id in self._unloaded_volumes:
+                raise ValueError(f"卷未加载，不能修改其结构: {volume_id}")
+
+    def _recount_loops(self):
+        """全量重算伏笔统计"""
+        self._loops: Dict[str, PlotLoop] = {}
+        self._open_by_importance = dict.fromkeys(LOOP_IMPORTANCE_LEVELS, 0)
+        self._resolved_by_importance = dict.fromkeys(LOOP_IMPORTANCE_LEVELS, 0)
+        self._abandoned_count = 0
+        for loop in (*self.open_loops, *self.resolved_loops):
+            self._loops[loop.id] = loop
+            self._count_loop(loop)
+        self._dirty_loops = set(self._loops)
+
+    def _count_loop(self, loop: PlotLoop, sign: int = 1):
+        if loop.status == "open":
+            self._open_by_importance[loop.importance] += sign
+        elif loop.status == "resolved":
+            self._resolved_by_importance[loop.importance] += sign
+        else:
+            self._abandoned_count += sign
+
+    def _ensure_loop_index(self):
+        if len(self._loops) != len(self.open_loops) + len(self.resolved_loops):
+            self._recount_loops()
+
+    @property
+    def finished_node_count(self) -> int:
+        """已完成节点数"""
+        self._ensure_index()
+        return self._totals.finished_count
+
+    @property
+    def outline_word_count(self) -> int:
+        """各节点实际字数之和"""
+        self._ensure_index()
+        return self._totals.word_count
+
+    @property
+    def estimated_word_count(self) -> int:
+        """各节点预估字数之和"""
+        self._ensure_index()
+        return self._totals.estimated_word_count
+
+    def volume_stats(self, volume_id: Optional[str] = None) -> Dict[str, ProgressRollup]:
+        """分卷统计（卷ID → 统计，含卷节点本身）；指定卷时只返回该卷"""
+        self._ensure_index()
+        if volume_id is not None:
+            return {volume_id: self._volumes.get(volume_id, ProgressRollup())}
+        return dict(self._volumes)
+
+    def loop_stats(self) -> Dict[str, Any]:
+        """伏笔统计：各重要性的未解决/已解决数量与废弃数"""
+        self._ensure_loop_index()
+        return {
+            "open_by_importance": dict(self._open_by_importance),
+            "resolved_by_importance": dict(self._resolved_by_importance),
+            "abandoned": self._abandoned_count
+        }
+
+    def set_node_status(self, node_id: str, status: NodeStatus):
+        """变更节点状态（同步完成数与完成百分比）"""
+        node = self.get_node_by_id(node_id)
+        if node is None:
+            raise KeyError(node_id)
+        if node.status == status:
+            return
+        self._count_node(node, -1)
+        node.status = status
+        node.updated_at = datetime.now()
+        self._count_node(node)
+        self._dirty_nodes.add(node_id)
+        self.update_completion_percentage()
+
+    def set_estimated_word_count(self, node_id: str, estimated_word_count: int):
+        """更新节点预估字数"""
+        node = self.get_node_by_id(node_id)
+        if node is None:
+            raise KeyError(node_id)
+        self._count_node(node, -1)
+        node.estimated_word_count = estimated_word_count
+        self._count_node(node)
+        self._dirty_nodes.add(node_id)
+
+    def get_loop(self, loop_id: str) -> Optional[PlotLoop]:
+        """根据ID获取伏笔"""
+        self._ensure_loop_index()
+        return self._loops.get(loop_id)
+
+    def add_loop(self, loop: PlotLoop):
+        """登记伏笔（未解决/已废弃的放入 open_loops，已解决的放入 resolved_loops）"""
+        self._ensure_loop_index()
+        if loop.id in self._loops:
+            raise ValueError(f"伏笔ID重复: {loop.id}")
+        (self.resolved_loops if loop.status == "resolved" else self.open_loops).append(loop)
+        self._loops[loop.id] = loop
+        self._count_loop(loop)
+        self._dirty_loops.add(loop.id)
+
+    def _open_loop(self, loop_id: str) -> PlotLoop:
+        loop = self.get_loop(loop_id)
+        if loop is None:
+            raise KeyError(loop_id)
+        if loop.status != "open":
+            raise ValueError(f"伏笔不是未解决状态: {loop_id} ({loop.status})")
+        return loop
+
+    def resolve_loop(self, loop_id: str, node_id: Optional[str] = None) -> PlotLoop:
+        """回收伏笔：移入 resolved_loops"""
+        loop = self._open_loop(loop_id)
+        self._count_loop(loop, -1)
+        loop.status = "resolved"
+        loop.resolved_in_node = node_id
+        loop.resolved_at = datetime.now()
+        self.open_loops.remove(loop)
+        self.resolved_loops.append(loop)
+        self._count_loop(loop)
+        self._dirty_loops.add(loop_id)
+        return loop
+
+    def abandon_loop(self, loop_id: str) -> PlotLoop:
+        """废弃伏笔（保留在 open_loops 中，不再计入未解决数）"""
+        loop = self._open_loop(loop_id)
+        self._count_loop(loop, -1)
+        loop.status = "abandoned"
+        self._count_loop(loop)
+        self._dirty_loops.add(loop_id)
+        return loop
+
+    def set_loop_importance(self, loop_id: str, importance: str):
+        """调整伏笔重要性"""
+        if importance not in LOOP_IMPORTANCE_LEVELS:
+            raise ValueError(f"未知的重要性: {importance}")
+        loop = self.get_loop(loop_id)
+        if loop is None:
+            raise KeyError(loop_id)
+        self._count_loop(loop, -1)
+        loop.importance = importance
+        self._count_loop(loop)
+        self._dirty_loops.add(loop_id)
+
+    # ------------------------------------------------------------------
+    # 变更记录
+    # ------------------------------------------------------------------
+
+    def mark_node_dirty(self, node_id: str):
+        """标记节点已修改（直接修改节点属性后调用）"""
+        if self.get_node_by_id(node_id) is None:
+            raise KeyError(node_id)
+        self._dirty_nodes.add(node_id)
+
+    def mark_loop_dirty(self, loop_id: str):
+        """标记伏笔已修改（直接修改伏笔属性后调用）"""
+        if self.get_loop(loop_id) is None:
+            raise KeyError(loop_id)
+        self._dirty_loops.add(loop_id)
+
+    def pending_changes(self) -> ProjectChanges:
+        """上次 clear_changes 以来的变更"""
+        self._ensure_index()
+        self._ensure_loop_index()
+        return ProjectChanges(
+            nodes=[self._nodes[node_id] for node_id in self._dirty_nodes],
+            removed_node_ids=list(self._removed_nodes),
+            loops=[self._loops[loop_id] for loop_id in self._dirty_loops]
+        )
+
+    def clear_changes(self):
+        """清空变更记录（保存成功后调用）"""
+        self._dirty_nodes.clear()
+        self._removed_nodes.clear()
+        self._dirty_loops.clear()
+
+    def sibling_index(self, node_id: str) -> int:
+        """节点在兄弟节点中的序号（O(兄弟数)；批量请用 sibling_indexes）"""
+        return self._siblings(self._nodes[node_id].parent_id).index(node_id)
+
+    def sibling_indexes(self, node_ids: Iterable[str]) -> Dict[str, int]:
+        """一批节点在兄弟节点中的序号（每个父节点的子节点列表只扫描一次）"""
+        by_parent: Dict[Optional[str], List[str]] = {}
+        for node_id in node_ids:
+            by_parent.setdefault(self._nodes[node_id].parent_id, []).append(node_id)
+        indexes = {}
+        for parent_id, members in by_parent.items():
+            siblings = self._siblings(parent_id)
+            if len(members) == 1:
+                indexes[members[0]] = siblings.index(members[0])
+            else:
+                wanted = set(members)
+                indexes.update((child_id, i) for i, child_id in enumerate(siblings) if child_id in wanted)
+        return indexes
+
+    def _siblings(self, parent_id: Optional[str]) -> List[str]:
+        return self._roots if parent_id is None else self._nodes[parent_id].children_ids
+
+    def _subtree_end(self, node_id: str) -> int:
+        """子树在先序中的结束位置（不含）"""
+        node = self._nodes[node_id]
+        while node._children_ids:
+            node = self._nodes[node._children_ids[-1]]
+        return self._position[node.id] + 1
+
+    def _subtree(self, node_id: str) -> List[PlotNode]:
+        """子树节点（先序）"""
+        return self.outline_tree[self._position[node_id]:self._subtree_end(node_id)]
 
     def get_node_by_id(self, node_id: str) -> Optional[PlotNode]:
         """根据ID获取节点"""
-        for node in self.outline_tree:
-            if node.id == node_id:
-                return node
-        return None
+        self._ensure_index()
+        return self._nodes.get(node_id)
+
+    def get_parent(self, node_id: str) -> Optional[PlotNode]:
+        """父节点（根节点返回 None）"""
+        node = self.get_node_by_id(node_id)
+        return self._nodes[node.parent_id] if node and node.parent_id else None
+
+    def get_children(self, node_id: str) -> List[PlotNode]:
+        """子节点（按顺序）"""
+        node = self.get_node_by_id(node_id)
+        return [self._nodes[child_id] for child_id in node._children_ids] if node else []
+
+    def position_of(self, node_id: str) -> Optional[int]:
+        """节点在先序（阅读顺序）中的位置"""
+        self._ensure_index()
+        return self._position.get(node_id)
+
+    def nodes_after(self, node_id: str, limit: Optional[int] = None) -> List[PlotNode]:
+        """阅读顺序中位于该节点之后的节点（最多 limit 个）"""
+        position = self.position_of(node_id)
+        if position is None:
+            return []
+        end = None if limit is None else position + 1 + limit
+        return self.outline_tree[position + 1:end]
+
+    def word_count_before(self, node_id: str) -> int:
+        """阅读顺序中位于该节点之前的节点字数和"""
+        position = self.position_of(node_id)
+        if position is None:
+            return 0
+        prefix = self._word_prefix
+        for i in range(len(prefix) - 1, position):
+            prefix.append(prefix[-1] + self.outline_tree[i].word_count)
+        return prefix[position]
+
+    def update_word_count(self, node_id: str, word_count: int):
+        """更新节点字数（保持前缀和与字数统计一致）"""
+        node = self.get_node_by_id(node_id)
+        if node is None:
+            raise KeyError(node_id)
+        self._count_node(node, -1)
+        self.total_word_count += word_count - node.word_count
+        node.word_count = word_count
+        self._count_node(node)
+        self._dirty_nodes.add(node_id)
+        node.updated_at = datetime.now()
+        del self._word_prefix[self._position[node_id] + 1:]
+
+    def add_node(self, node: PlotNode, parent_id: Optional[str] = None, index: Optional[int] = None):
+        """
+        插入节点
+
+        Args:
+            node: 新节点（不应带子节点）
+            parent_id: 父节点ID（为空时作为根节点）
+            index: 在兄弟节点中的位置（默认追加到末尾）
+        """
+        self._ensure_index()
+        if node.id in self._nodes:
+            raise ValueError(f"节点ID重复: {node.id}")
+        if parent_id is not None:
+            if parent_id not in self._nodes:
+                raise KeyError(parent_id)
+            self._check_loaded(self._nodes[parent_id])
+        node.parent_id = parent_id
+        node.children_ids = []
+        self._insert([node], parent_id, index)
+        self._nodes[node.id] = node
+        self._removed_nodes.discard(node.id)
+        self._count_node(node)
+
+    def _insert(self, subtree: List[PlotNode], parent_id: Optional[str], index: Optional[int]):
+        """把先序排列的子树插入到父节点的第 index 个子节点处"""
+        siblings = self._siblings(parent_id)
+        index = len(siblings) if index is None else max(0, min(index, len(siblings)))
+        if index < len(siblings):
+            position = self._position[siblings[index]]
+        elif parent_id is not None:
+            position = self._subtree_end(parent_id)
+        else:
+            position = len(self.outline_tree)
+        siblings.insert(index, subtree[0].id)
+        self.outline_tree[position:position] = subtree
+        self._reindex(position)
+        # 子树成员的所属卷可能变化，其后兄弟节点的序号后移
+        self._dirty_nodes.update(member.id for member in subtree)
+        self._dirty_nodes.update(siblings[index + 1:])
+
+    def _detach(self, node_id: str) -> List[PlotNode]:
+        """从树与先序列表中摘下子树（不更新 ID 索引）"""
+        node = self._nodes[node_id]
+        start, end = self._position[node_id], self._subtree_end(node_id)
+        siblings = self._siblings(node.parent_id)
+        index = siblings.index(node_id)
+        del siblings[index]
+        self._dirty_nodes.update(siblings[index:])
+        subtree = self.outline_tree[start:end]
+        del self.outline_tree[start:end]
+        for member in subtree:
+            del self._position[member.id]
+        self._reindex(start)
+        return subtree
+
+    def move_node(self, node_id: str, parent_id: Optional[str] = None, index: Optional[int] = None):
+        """
+        移动节点（连同子树）
+
+        Args:
+            parent_id: 新父节点ID（为空时移为根节点）
+            index: 在新兄弟节点中的位置（默认追加到末尾）
+        """
+        self._ensure_index()
+        if node_id not in self._nodes:
+            raise KeyError(node_id)
+        if node_id not in self._unloaded_volumes:  # 未加载的卷可整体移动（其内容的所属卷不变）
+            self._check_loaded(self._nodes[node_id])
+        if parent_id is not None:
+            if parent_id not in self._nodes:
+                raise KeyError(parent_id)
+            self._check_loaded(self._nodes[parent_id])
+            start = self._position[node_id]
+            if start <= self._position[parent_id] < self._subtree_end(node_id):
+                raise ValueError("不能把节点移动到自己的子树下")
+        for member in self._subtree(node_id):
+            self._count_node(member, -1)
+        subtree = self._detach(node_id)
+        subtree[0].parent_id = parent_id
+        self._insert(subtree, parent_id, index)
+        for member in subtree:
+            self._count_node(member)
+
+    def remove_node(self, node_id: str) -> List[PlotNode]:
+        """
+        删除节点（连同子树）
+
+        Returns:
+            List[PlotNode]: 被删除的节点（先序）
+        """
+        self._ensure_index()
+        if node_id not in self._nodes:
+            raise KeyError(node_id)
+        self._check_loaded(self._nodes[node_id])
+        for member in self._subtree(node_id):
+            self._count_node(member, -1)
+        subtree = self._detach(node_id)
+        for member in subtree:
+            del self._nodes[member.id]
+            self._dirty_nodes.discard(member.id)
+            self._removed_nodes.add(member.id)
+        if self.current_node_id in {member.id for member in subtree}:
+            self.current_node_id = None
+        return subtree
 
     def get_open_loops_count(self) -> int:
         """获取未解决的伏笔数量"""
-        return len([loop for loop in self.open_loops if loop.status == "open"])
+        self._ensure_loop_index()
+        return sum(self._open_by_importance.values())
 
     def update_completion_percentage(self):
         """更新完成百分比"""
-        if not self.outline_tree:
-            self.completion_percentage = 0.0
-            return
-
-        finished_nodes = sum(1 for node in self.outline_tree if node.status == NodeStatus.FINISHED)
-        self.completion_percentage = finished_nodes / len(self.outline_tree)
\ No newline at end of file
+        self._ensure_index()
+        self.completion_percentage = self._totals.completion
\ No newline at end of file
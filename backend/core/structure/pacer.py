@@ -4,7 +4,7 @@
 """
 import json
 import statistics
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 from loguru import logger
 from backend.core.structure.models import NovelProject, PlotNode, PacingTemplate, PacingCheckpoint
 
@@ -198,8 +198,7 @@ class PacingAnalyzer:
 
         # 计算整体统计
         total_nodes = len(project.outline_tree)
-        completed_nodes = sum(1 for node in project.outline_tree
-                            if node.status.name == "FINISHED")
+        completed_nodes = project.finished_node_count
 
         if total_nodes == 0:
             return {"error": "项目没有大纲节点"}
@@ -233,12 +232,10 @@ class PacingAnalyzer:
             return 0.0
 
         # 找到当前节点的位置
-        try:
-            current_index = next(i for i, node in enumerate(project.outline_tree)
-                               if node.id == current_node.id)
-            return (current_index + 1) / len(project.outline_tree)
-        except StopIteration:
+        current_index = project.position_of(current_node.id)
+        if current_index is None:
             return project.completion_percentage
+        return (current_index + 1) / len(project.outline_tree)
 
     def _find_nearest_checkpoint(self, checkpoints: List[PacingCheckpoint],
                                progress: float) -> Optional[PacingCheckpoint]:
@@ -0,0 +1,293 @@
+"""
+小说项目存储
+项目、大纲节点与伏笔各存一张 SQLite 表，每个节点/伏笔一行：
+枚举存为小整数，时间存为微秒时间戳（与模型内部表示一致，读写无损），
+列表存为紧凑 JSON（空列表存 NULL）。
+
+保存只写入 NovelProject 记录的变更节点与伏笔，一次事务提交；
+WAL + synchronous=NORMAL 下提交无需刷盘，编辑后的防抖保存在亚毫秒级。
+节点行记录父节点、兄弟序号与所属卷（不含自身；顶层卷与不属于任何卷的节点为空），
+可只加载指定卷的内容：部分加载的项目中，未加载卷的结构不可修改（增删移动会报错），
+统计由加载时对未加载行的聚合补齐，仍覆盖整个项目。
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Iterable, List, Optional, Sequence
+
+from backend.core.structure.models import (
+    _EPOCH, _MICROSECOND, _to_timestamp,
+    NodeStatus, NodeType, NovelProject, PacingTemplate, PlotLoop, PlotNode, ProgressRollup
+)
+
+# 枚举 ↔ 小整数（只可追加，不可重排）
+_NODE_TYPES = (NodeType.VOLUME, NodeType.CHAPTER, NodeType.SCENE)
+_NODE_STATUSES = (NodeStatus.DRAFT, NodeStatus.WRITING, NodeStatus.FINISHED)
+_PACING_TEMPLATES = (
+    PacingTemplate.HERO_JOURNEY, PacingTemplate.THREE_ACT, PacingTemplate.SAVE_THE_CAT, PacingTemplate.CUSTOM
+)
+_LOOP_STATUSES = ("open", "resolved", "abandoned")
+_LOOP_IMPORTANCE = ("minor", "major", "critical")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS novel_projects (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    target_word_count INTEGER NOT NULL,
+    pacing_template INTEGER NOT NULL,
+    current_node_id TEXT,
+    total_word_count INTEGER NOT NULL,
+    completion_percentage REAL NOT NULL,
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS plot_nodes (
+    project_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    parent_id TEXT,
+    sibling_index INTEGER NOT NULL,
+    volume_id TEXT,
+    type INTEGER NOT NULL,
+    status INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    actual_content_summary TEXT NOT NULL,
+    deviation_score REAL NOT NULL,
+    characters TEXT,
+    open_loops TEXT,
+    closed_loops TEXT,
+    word_count INTEGER NOT NULL,
+    estimated_word_count INTEGER NOT NULL,
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL,
+    PRIMARY KEY (project_id, id)
+);
+-- 覆盖索引：按卷加载与未加载卷的统计聚合都只读索引
+CREATE INDEX IF NOT EXISTS idx_plot_nodes_volume_stats
+    ON plot_nodes (project_id, volume_id, status, word_count, estimated_word_count);
+CREATE TABLE IF NOT EXISTS plot_loops (
+    project_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    description TEXT NOT NULL,
+    created_in_node TEXT NOT NULL,
+    resolved_in_node TEXT,
+    status INTEGER NOT NULL,
+    importance INTEGER NOT NULL,
+    created_at INTEGER NOT NULL,
+    resolved_at INTEGER,
+    PRIMARY KEY (project_id, id)
+);
+"""
+
+_PROJECT_COLUMNS = (
+    "id", "title", "target_word_count", "pacing_template", "current_node_id",
+    "total_word_count", "completion_percentage", "created_at", "updated_at"
+)
+_NODE_COLUMNS = (
+    "project_id", "id", "parent_id", "sibling_index", "volume_id", "type", "status", "title", "description",
+    "actual_content_summary", "deviation_score", "characters", "open_loops", "closed_loops",
+    "word_count", "estimated_word_count", "created_at", "updated_at"
+)
+_LOOP_COLUMNS = (
+    "project_id", "id", "description", "created_in_node", "resolved_in_node",
+    "status", "importance", "created_at", "resolved_at"
+)
+
+
+def _upsert_sql(table: str, columns: tuple, key: tuple) -> str:
+    """INSERT ... ON CONFLICT DO UPDATE（保留 rowid，即保留插入顺序）"""
+    updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column not in key)
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+        f"ON CONFLICT ({', '.join(key)}) DO UPDATE SET {updates}"
+    )
+
+
+_PROJECT_UPSERT = _upsert_sql("novel_projects", _PROJECT_COLUMNS, ("id",))
+_NODE_UPSERT = _upsert_sql("plot_nodes", _NODE_COLUMNS, ("project_id", "id"))
+_LOOP_UPSERT = _upsert_sql("plot_loops", _LOOP_COLUMNS, ("project_id", "id"))
+
+
+def _to_us(value: Optional[datetime]) -> Optional[int]:
+    return None if value is None else _to_timestamp(value)
+
+
+def _from_us(value: Optional[int]) -> Optional[datetime]:
+    return None if value is None else _EPOCH + value * _MICROSECOND
+
+
+def _pack_list(items: Sequence[str]) -> Optional[str]:
+    return json.dumps(items, ensure_ascii=False, separators=(",", ":")) if items else None
+
+
+def _unpack_list(text: Optional[str]) -> List[str]:
+    return json.loads(text) if text else []
+
+
+def _project_row(project: NovelProject) -> tuple:
+    return (
+        project.id, project.title, project.target_word_count,
+        _PACING_TEMPLATES.index(project.pacing_template), project.current_node_id,
+        project.total_word_count, project.completion_percentage,
+        _to_us(project.created_at), _to_us(project.updated_at)
+    )
+
+
+def _node_row(project: NovelProject, node: PlotNode, sibling_index: int) -> tuple:
+    parent = project.get_node_by_id(node.parent_id) if node.parent_id else None
+    return (
+        project.id, node.id, node.parent_id, sibling_index,
+        project._volume_of(parent) if parent else None,
+        _NODE_TYPES.index(node.type), _NODE_STATUSES.index(node.status),
+        node.title, node.description, node.actual_content_summary, node.deviation_score,
+        # 直接读取存储槽，避免把共享的空元组换成独立列表
+        _pack_list(node._characters), _pack_list(node._open_loops), _pack_list(node._closed_loops),
+        node.word_count, node.estimated_word_count, node._created_at, node._updated_at
+    )
+
+
+def _loop_row(project_id: str, loop: PlotLoop) -> tuple:
+    return (
+        project_id, loop.id, loop.description, loop.created_in_node, loop.resolved_in_node,
+        _LOOP_STATUSES.index(loop.status), _LOOP_IMPORTANCE.index(loop.importance),
+        loop._created_at, loop._resolved_at
+    )
+
+
+class ProjectStore:
+    """NovelProject 的 SQLite 存储"""
+
+    def __init__(self, path: str = ":memory:"):
+        """
+        Args:
+            path: 数据库文件路径（默认内存数据库）
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._conn.close()
+
+    def save(self, project: NovelProject) -> int:
+        """
+        增量保存项目（项目行 + 变更的节点与伏笔），成功后清空项目的变更记录
+
+        Returns:
+            int: 写入或删除的节点与伏笔行数
+        """
+        changes = project.pending_changes()
+        with self._lock, self._conn:
+            self._conn.execute(_PROJECT_UPSERT, _project_row(project))
+            if changes.removed_node_ids:
+                self._conn.executemany(
+                    "DELETE FROM plot_nodes WHERE project_id = ? AND id = ?",
+                    [(project.id, node_id) for node_id in changes.removed_node_ids]
+                )
+            if changes.nodes:
+                # 兄弟序号按父节点批量计算（在头部插入时整列兄弟节点都会变更）
+                indexes = project.sibling_indexes(node.id for node in changes.nodes)
+                self._conn.executemany(
+                    _NODE_UPSERT, [_node_row(project, node, indexes[node.id]) for node in changes.nodes]
+                )
+            if changes.loops:
+                self._conn.executemany(_LOOP_UPSERT, [_loop_row(project.id, loop) for loop in changes.loops])
+        project.clear_changes()
+        return len(changes.nodes) + len(changes.removed_node_ids) + len(changes.loops)
+
+    def load(self, project_id: str, volume_ids: Optional[Iterable[str]] = None) -> Optional[NovelProject]:
+        """
+        加载项目
+
+        Args:
+            project_id: 项目ID
+            volume_ids: 只加载这些卷的内容（顶层卷节点与不属于任何卷的节点总会加载；
+                其余卷的内容只加载统计，其结构不可修改）
+
+        Returns:
+            NovelProject: 项目（无变更记录）；不存在时返回 None
+        """
+        select = f"SELECT {', '.join(_NODE_COLUMNS[1:])} FROM plot_nodes WHERE project_id = ?"
+        query, params = select, [project_id]
+        if volume_ids is not None:
+            # 两段都走 (project_id, volume_id) 索引
+            volume_ids = list(dict.fromkeys(volume_ids))
+            query += " AND volume_id IS NULL"
+            if volume_ids:
+                query += f" UNION ALL {select} AND volume_id IN ({', '.join('?' * len(volume_ids))})"
+                params += [project_id, *volume_ids]
+        query += " ORDER BY sibling_index"
+
+        with self._lock:
+            meta = self._conn.execute(
+                f"SELECT {', '.join(_PROJECT_COLUMNS)} FROM novel_projects WHERE id = ?", (project_id,)
+            ).fetchone()
+            if meta is None:
+                return None
+            node_rows = self._conn.execute(query, params).fetchall()
+            unloaded_rows = []
+            if volume_ids is not None:
+                unloaded_rows = self._conn.execute(
+                    "SELECT volume_id, COUNT(*), SUM(status = ?), SUM(word_count), SUM(estimated_word_count) "
+                    "FROM plot_nodes WHERE project_id = ? AND volume_id IS NOT NULL "
+                    f"AND volume_id NOT IN ({', '.join('?' * len(volume_ids))}) GROUP BY volume_id",
+                    [_NODE_STATUSES.index(NodeStatus.FINISHED), project_id, *volume_ids]
+                ).fetchall()
+            loop_rows = self._conn.execute(
+                f"SELECT {', '.join(_LOOP_COLUMNS[1:])} FROM plot_loops WHERE project_id = ? ORDER BY rowid",
+                (project_id,)
+            ).fetchall()
+
+        nodes = []
+        children = {}
+        for (node_id, parent_id, _, _, node_type, status, title, description, summary, deviation,
+             characters, open_loops, closed_loops, word_count, estimated, created_at, updated_at) in node_rows:
+            nodes.append(PlotNode(
+                id=node_id, title=title, description=description, type=_NODE_TYPES[node_type],
+                status=_NODE_STATUSES[status], actual_content_summary=summary, deviation_score=deviation,
+                characters=_unpack_list(characters), open_loops=_unpack_list(open_loops),
+                closed_loops=_unpack_list(closed_loops),
+                created_at=_from_us(created_at), updated_at=_from_us(updated_at),
+                word_count=word_count, estimated_word_count=estimated, parent_id=parent_id
+            ))
+            children.setdefault(parent_id, []).append(node_id)
+        for node in nodes:
+            node.children_ids = children.get(node.id, [])
+
+        open_list, resolved_list = [], []
+        for (loop_id, description, created_in, resolved_in, status, importance, created_at, resolved_at) in loop_rows:
+            loop = PlotLoop(
+                id=loop_id, description=description, created_in_node=created_in, resolved_in_node=resolved_in,
+                status=_LOOP_STATUSES[status], importance=_LOOP_IMPORTANCE[importance],
+                created_at=_from_us(created_at), resolved_at=_from_us(resolved_at)
+            )
+            (resolved_list if loop.status == "resolved" else open_list).append(loop)
+
+        (_, title, target, template, current_node_id, total_words, completion, created_at, updated_at) = meta
+        project = NovelProject(
+            id=project_id, title=title, outline_tree=nodes, target_word_count=target,
+            pacing_template=_PACING_TEMPLATES[template], current_node_id=current_node_id,
+            total_word_count=total_words, completion_percentage=completion,
+            open_loops=open_list, resolved_loops=resolved_list,
+            created_at=_from_us(created_at), updated_at=_from_us(updated_at)
+        )
+        if unloaded_rows:
+            project._set_unloaded_volumes({
+                volume_id: ProgressRollup(count, finished, words, estimated)
+                for volume_id, count, finished, words, estimated in unloaded_rows
+            })
+        project.clear_changes()
+        return project
+
+    def delete(self, project_id: str):
+        """删除项目及其全部节点与伏笔"""
+        with self._lock, self._conn:
+            for table, column in (("plot_nodes", "project_id"), ("plot_loops", "project_id"), ("novel_projects", "id")):
+                self._conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (project_id,))
@@ -0,0 +1,20 @@
+"""
+向量索引后端
+
+- chroma: chromadb 持久化集合（默认）
+- numpy: 纯 NumPy 内存映射索引，启动快、无额外依赖，适合中小项目与测试
+"""
+
+
+def create_backend(name: str, collection_name: str, persist_directory: str, embedding_function=None, **options):
+    """按名称创建后端实例（延迟导入，避免加载不需要的依赖）"""
+    if name == "chroma":
+        from .chroma import ChromaBackend
+        return ChromaBackend(collection_name, persist_directory, embedding_function)
+    if name == "numpy":
+        from .numpy_memmap import NumpyBackend
+        return NumpyBackend(collection_name, persist_directory, **options)
+    raise ValueError(f"未知的向量后端: {name}")
+
+
+__all__ = ["create_backend"]
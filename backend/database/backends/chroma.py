@@ -0,0 +1,57 @@
+"""
+chromadb 后端
+"""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+class ChromaBackend:
+    """基于 chromadb PersistentClient 的向量索引"""
+
+    def __init__(self, collection_name: str, persist_directory: str, embedding_function=None):
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=persist_directory)
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name,
+            embedding_function=embedding_function
+        )
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def add(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict[str, Any]]):
+        self.collection.add(
+            ids=ids,
+            embeddings=np.asarray(embeddings, dtype=np.float32).tolist(),
+            documents=documents,
+            metadatas=metadatas
+        )
+
+    def upsert(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict[str, Any]]):
+        self.collection.upsert(
+            ids=ids,
+            embeddings=np.asarray(embeddings, dtype=np.float32).tolist(),
+            documents=documents,
+            metadatas=metadatas
+        )
+
+    def get(self, where: Dict) -> Dict:
+        return self.collection.get(where=where, include=["metadatas"])
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def query(self, embeddings: np.ndarray, n_results: int, where: Optional[Dict] = None) -> Dict:
+        return self.collection.query(
+            query_embeddings=np.asarray(embeddings, dtype=np.float32).tolist(),
+            n_results=n_results,
+            where=where
+        )
+
+    def delete(self, ids: List[str]):
+        self.collection.delete(ids=ids)
+
+    def close(self):
+        pass
@@ -0,0 +1,596 @@
+"""
+纯 NumPy 内存映射向量索引
+
+- 向量归一化后以 float16 存放在定长分段文件中（memmap，只追加）；
+  检索时按固定大小的行块解码到复用的 float32 缓冲区再做矩阵乘法，
+  不保留解码副本，内存占用只多出一个行块（_DECODE_BLOCK_BYTES）
+- 可选 int8 标量量化（每行一个缩放系数）或 float32 全精度存储；
+  量化存储可附带 float32 旁路文件，对粗排候选做全精度重排
+- 检索为向量化余弦相似度 + argpartition 取 Top-K
+- 元数据过滤通过倒排表生成布尔掩码，并缓存到下一次写入
+- 删除记墓碑，死行比例超过阈值时整体压缩为新一代文件；
+  upsert 即墓碑旧行 + 追加新行，仅改元数据时原地更新
+
+目录结构：
+    manifest.json           维度、精度、分段大小、当前代号
+    gen_<n>/seg_<i>.bin     向量分段
+    gen_<n>/seg_<i>.scale   int8 分段的每行缩放系数
+    gen_<n>/seg_<i>.f32     全精度旁路分段（启用重排时）
+    gen_<n>/records.jsonl   追加写入的操作日志（add/delete/update），启动时重放
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+import numpy as np
+from loguru import logger
+
+
+class NumpyBackend:
+    """内存映射分段向量索引（余弦距离）"""
+
+    # 检索时 float16/int8 分段逐块解码的缓冲区大小（块小到能留在缓存中，解码与乘法交替进行）
+    _DECODE_BLOCK_BYTES = 1 << 20
+
+    def __init__(
+        self,
+        collection_name: str,
+        persist_directory: str,
+        dtype: str = "float16",
+        rerank: bool = False,
+        rerank_factor: int = 4,
+        segment_rows: int = 16384,
+        compact_ratio: float = 0.3,
+        compact_min_rows: int = 1024
+    ):
+        """
+        Args:
+            collection_name: 集合名称（子目录）
+            persist_directory: 持久化根目录
+            dtype: 向量存储精度 float32 / float16 / int8（新建集合时生效）
+            rerank: 量化存储时保留 float32 旁路并对候选重排（新建集合时生效）
+            rerank_factor: 粗排候选数 = top_k × rerank_factor
+            segment_rows: 每个分段的行数
+            compact_ratio: 死行比例超过该值时自动压缩
+            compact_min_rows: 触发自动压缩的最少死行数
+        """
+        self.path = os.path.join(persist_directory, collection_name)
+        os.makedirs(self.path, exist_ok=True)
+        self._manifest_path = os.path.join(self.path, "manifest.json")
+
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float16, np.int8):
+            raise ValueError(f"不支持的存储精度: {dtype}")
+        self.rerank = rerank and self.dtype != np.float32
+        self.rerank_factor = rerank_factor
+        self.segment_rows = segment_rows
+        self.compact_ratio = compact_ratio
+        self.compact_min_rows = compact_min_rows
+        self.dim: Optional[int] = None
+        self.generation = 0
+
+        self._lock = threading.RLock()
+        self._load()
+
+    # ------------------------------------------------------------------
+    # 加载与持久化
+    # ------------------------------------------------------------------
+
+    def _reset_state(self):
+        self._segments: List[np.memmap] = []
+        self._scales: List[np.memmap] = []
+        self._full: List[np.memmap] = []
+        self._size = 0
+        self._alive = np.zeros(1024, dtype=bool)
+        self._ids: List[Optional[str]] = []
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict[str, Any]]] = []
+        self._row_of: Dict[str, int] = {}
+        self._inverted: Dict[str, Dict[Hashable, Set[int]]] = {}
+        self._mask_cache: Dict[Tuple[str, Hashable], np.ndarray] = {}
+        self._log = None
+
+    @property
+    def _gen_path(self) -> str:
+        return os.path.join(self.path, f"gen_{self.generation}")
+
+    def _segment_path(self, index: int, gen_path: Optional[str] = None, suffix: str = "bin") -> str:
+        return os.path.join(gen_path or self._gen_path, f"seg_{index}.{suffix}")
+
+    @property
+    def quantized(self) -> bool:
+        return self.dtype == np.int8
+
+    def _write_manifest(self):
+        tmp_path = self._manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "dim": self.dim,
+                "dtype": self.dtype.name,
+                "rerank": self.rerank,
+                "segment_rows": self.segment_rows,
+                "generation": self.generation
+            }, f)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _load(self):
+        self._reset_state()
+        if not os.path.exists(self._manifest_path):
+            return
+
+        with open(self._manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.dim = manifest["dim"]
+        self.dtype = np.dtype(manifest["dtype"])
+        self.rerank = manifest.get("rerank", False)
+        self.segment_rows = manifest["segment_rows"]
+        self.generation = manifest["generation"]
+
+        index = 0
+        while os.path.exists(self._segment_path(index)):
+            self._open_segment(index)
+            index += 1
+
+        log_path = os.path.join(self._gen_path, "records.jsonl")
+        if os.path.exists(log_path):
+            with open(log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if record["op"] == "add":
+                        self._register(record["row"], record["id"], record["document"], record["metadata"])
+                    elif record["op"] == "delete":
+                        self._unregister(record["id"])
+                    elif record["op"] == "update":
+                        self._set_metadata(record["id"], record["metadata"])
+
+        if self._size:
+            logger.info(f"NumpyBackend loaded: {self.path} ({len(self._row_of)} vectors)")
+
+    def _map(self, path: str, dtype: np.dtype, shape: Tuple[int, ...], create: bool) -> np.memmap:
+        if create:
+            with open(path, "wb") as f:
+                f.truncate(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _open_segment(self, index: int, create: bool = False, gen_path: Optional[str] = None):
+        """打开（或创建）第 index 个分段及其旁路文件，返回 (主矩阵, 缩放系数, 全精度)"""
+        rows = self.segment_rows
+        main = self._map(self._segment_path(index, gen_path), self.dtype, (rows, self.dim), create)
+        scale = (
+            self._map(self._segment_path(index, gen_path, "scale"), np.float32, (rows,), create)
+            if self.quantized else None
+        )
+        full = (
+            self._map(self._segment_path(index, gen_path, "f32"), np.float32, (rows, self.dim), create)
+            if self.rerank else None
+        )
+        if gen_path is None:
+            self._segments.append(main)
+            self._scales.append(scale)
+            self._full.append(full)
+        return main, scale, full
+
+    def _append_log(self, records: List[Dict[str, Any]]):
+        if self._log is None:
+            os.makedirs(self._gen_path, exist_ok=True)
+            self._log = open(os.path.join(self._gen_path, "records.jsonl"), "a", encoding="utf-8")
+        self._log.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+        self._log.flush()
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            for segment in self._segments + self._scales + self._full:
+                if segment is not None:
+                    segment.flush()
+
+    # ------------------------------------------------------------------
+    # 行级状态
+    # ------------------------------------------------------------------
+
+    def _register(self, row: int, doc_id: str, document: str, metadata: Optional[Dict[str, Any]]):
+        while row >= len(self._ids):
+            self._ids.append(None)
+            self._documents.append(None)
+            self._metadatas.append(None)
+        if row >= len(self._alive):
+            self._alive = np.concatenate([self._alive, np.zeros(max(row + 1, len(self._alive)), dtype=bool)])
+
+        self._ids[row] = doc_id
+        self._documents[row] = document
+        self._metadatas[row] = metadata
+        self._alive[row] = True
+        self._row_of[doc_id] = row
+        self._size = max(self._size, row + 1)
+        for key, value in (metadata or {}).items():
+            self._inverted.setdefault(key, {}).setdefault(value, set()).add(row)
+
+    def _unregister(self, doc_id: str) -> bool:
+        row = self._row_of.pop(doc_id, None)
+        if row is None:
+            return False
+        self._alive[row] = False
+        for key, value in (self._metadatas[row] or {}).items():
+            rows = self._inverted.get(key, {}).get(value)
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del self._inverted[key][value]
+        self._documents[row] = None
+        self._metadatas[row] = None
+        return True
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """按存储精度编码，int8 使用每行对称缩放"""
+        if not self.quantized:
+            return vectors.astype(self.dtype), None
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _write_segment(self, segments: Tuple, offset: int, vectors: np.ndarray):
+        main, scale, full = segments
+        encoded, scales = self._encode(vectors)
+        main[offset:offset + len(vectors)] = encoded
+        main.flush()
+        if scale is not None:
+            scale[offset:offset + len(vectors)] = scales
+            scale.flush()
+        if full is not None:
+            full[offset:offset + len(vectors)] = vectors
+            full.flush()
+
+    def _set_metadata(self, doc_id: str, metadata: Optional[Dict[str, Any]]) -> bool:
+        row = self._row_of.get(doc_id)
+        if row is None:
+            return False
+        for key, value in (self._metadatas[row] or {}).items():
+            rows = self._inverted.get(key, {}).get(value)
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del self._inverted[key][value]
+        self._metadatas[row] = metadata
+        for key, value in (metadata or {}).items():
+            self._inverted.setdefault(key, {}).setdefault(value, set()).add(row)
+        return True
+
+    def _write_vectors(self, start: int, vectors: np.ndarray):
+        """从 start 行开始写入，按需创建分段"""
+        offset = 0
+        while offset < len(vectors):
+            row = start + offset
+            seg_index, seg_offset = divmod(row, self.segment_rows)
+            while seg_index >= len(self._segments):
+                os.makedirs(self._gen_path, exist_ok=True)
+                self._open_segment(len(self._segments), create=True)
+            n = min(self.segment_rows - seg_offset, len(vectors) - offset)
+            segments = (self._segments[seg_index], self._scales[seg_index], self._full[seg_index])
+            self._write_segment(segments, seg_offset, vectors[offset:offset + n])
+            offset += n
+
+    def _score_segment(self, queries: np.ndarray, index: int, n: int, out: np.ndarray, buffer: Optional[np.ndarray]):
+        """分段前 n 行与查询的相似度写入 out（buffer: 复用的 float32 解码缓冲区，float32 存储时为 None）"""
+        segment = self._segments[index]
+        if buffer is None:
+            out[:] = queries @ segment[:n].T
+            return
+        for offset in range(0, n, len(buffer)):
+            m = min(len(buffer), n - offset)
+            block = buffer[:m]
+            np.copyto(block, segment[offset:offset + m])
+            out[:, offset:offset + m] = queries @ block.T
+            if self.quantized:
+                # 先乘矩阵再乘每行缩放，避免逐元素还原
+                out[:, offset:offset + m] *= self._scales[index][offset:offset + m]
+
+    def _decode(self, index: int, local_rows) -> np.ndarray:
+        """读取分段内若干行并解码为 float32（近似值）"""
+        block = np.asarray(self._segments[index][local_rows], dtype=np.float32)
+        if self.quantized:
+            block *= self._scales[index][local_rows][:, None]
+        return block
+
+    def _gather(self, rows: np.ndarray, full: bool = False) -> np.ndarray:
+        """按全局行号读取向量（float32；full=True 时读取全精度旁路）"""
+        result = np.empty((len(rows), self.dim), dtype=np.float32)
+        seg_index = rows // self.segment_rows
+        for index in np.unique(seg_index):
+            picked = seg_index == index
+            local_rows = rows[picked] % self.segment_rows
+            if full and self._full[index] is not None:
+                result[picked] = self._full[index][local_rows]
+            else:
+                result[picked] = self._decode(index, local_rows)
+        return result
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    # ------------------------------------------------------------------
+    # 元数据过滤
+    # ------------------------------------------------------------------
+
+    def _eq_mask(self, key: str, value: Hashable) -> np.ndarray:
+        cache_key = (key, value)
+        mask = self._mask_cache.get(cache_key)
+        if mask is None:
+            mask = np.zeros(self._size, dtype=bool)
+            rows = self._inverted.get(key, {}).get(value)
+            if rows:
+                mask[np.fromiter(rows, dtype=np.int64, count=len(rows))] = True
+            self._mask_cache[cache_key] = mask
+        return mask
+
+    def _range_mask(self, key: str, op: str, bound: Any) -> np.ndarray:
+        compare = {
+            "$gt": lambda v: v > bound,
+            "$gte": lambda v: v >= bound,
+            "$lt": lambda v: v < bound,
+            "$lte": lambda v: v <= bound,
+        }[op]
+        mask = np.zeros(self._size, dtype=bool)
+        for value, rows in self._inverted.get(key, {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and compare(value) and rows:
+                mask[np.fromiter(rows, dtype=np.int64, count=len(rows))] = True
+        return mask
+
+    def _field_mask(self, key: str, condition: Any) -> np.ndarray:
+        if not isinstance(condition, dict):
+            return self._eq_mask(key, condition)
+
+        mask = np.ones(self._size, dtype=bool)
+        for op, operand in condition.items():
+            if op == "$eq":
+                mask &= self._eq_mask(key, operand)
+            elif op == "$ne":
+                mask &= ~self._eq_mask(key, operand)
+            elif op in ("$in", "$nin"):
+                hit = np.zeros(self._size, dtype=bool)
+                for value in operand:
+                    hit |= self._eq_mask(key, value)
+                mask &= hit if op == "$in" else ~hit
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                mask &= self._range_mask(key, op, operand)
+            else:
+                raise ValueError(f"不支持的过滤操作符: {op}")
+        return mask
+
+    def _where_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        mask = np.ones(self._size, dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for sub in condition:
+                    mask &= self._where_mask(sub)
+            elif key == "$or":
+                hit = np.zeros(self._size, dtype=bool)
+                for sub in condition:
+                    hit |= self._where_mask(sub)
+                mask &= hit
+            else:
+                mask &= self._field_mask(key, condition)
+        return mask
+
+    # ------------------------------------------------------------------
+    # 公共接口（与 ChromaBackend 一致）
+    # ------------------------------------------------------------------
+
+    def count(self) -> int:
+        return len(self._row_of)
+
+    def add(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict[str, Any]]):
+        """追加向量（ID 已存在时报错）"""
+        if not ids:
+            return
+        vectors = self._normalize(embeddings)
+
+        with self._lock:
+            duplicates = [doc_id for doc_id in ids if doc_id in self._row_of]
+            if duplicates or len(set(ids)) != len(ids):
+                raise ValueError(f"ID 已存在: {duplicates[:5] or '批内重复'}")
+
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self._write_manifest()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"嵌入维度不一致: {vectors.shape[1]} != {self.dim}")
+
+            # 先落盘向量，再写日志
+            start = self._size
+            self._write_vectors(start, vectors)
+            records = []
+            for offset, (doc_id, document, metadata) in enumerate(zip(ids, documents, metadatas)):
+                row = start + offset
+                self._register(row, doc_id, document, metadata)
+                records.append({"op": "add", "row": row, "id": doc_id, "document": document, "metadata": metadata})
+            self._append_log(records)
+            self._mask_cache.clear()
+
+    def upsert(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict[str, Any]]):
+        """插入或覆盖（旧行记墓碑）"""
+        with self._lock:
+            existing = [doc_id for doc_id in ids if doc_id in self._row_of]
+            if existing:
+                for doc_id in existing:
+                    self._unregister(doc_id)
+                self._append_log([{"op": "delete", "id": doc_id} for doc_id in existing])
+            self.add(ids, embeddings, documents, metadatas)
+            self._maybe_compact()
+
+    def get(self, where: Dict) -> Dict:
+        """按元数据条件取出 ID 与元数据"""
+        with self._lock:
+            rows = np.flatnonzero(self._alive[:self._size] & self._where_mask(where))
+            return {
+                "ids": [self._ids[r] for r in rows],
+                "metadatas": [self._metadatas[r] for r in rows]
+            }
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """原地更新元数据（不重写向量）"""
+        with self._lock:
+            records = [
+                {"op": "update", "id": doc_id, "metadata": metadata}
+                for doc_id, metadata in zip(ids, metadatas)
+                if self._set_metadata(doc_id, metadata)
+            ]
+            if records:
+                self._append_log(records)
+                self._mask_cache.clear()
+
+    def query(self, embeddings: np.ndarray, n_results: int, where: Optional[Dict] = None) -> Dict:
+        """余弦相似度检索，返回 chromadb 风格的结果"""
+        queries = self._normalize(embeddings)
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        with self._lock:
+            size = self._size
+            candidates = self._alive[:size].copy()
+            if where:
+                candidates &= self._where_mask(where)
+            rows = np.flatnonzero(candidates)
+            k = min(n_results, len(rows))
+
+            if k == 0:
+                for key in results:
+                    results[key] = [[] for _ in range(len(queries))]
+                return results
+
+            if len(rows) * 4 < size:
+                # 过滤后候选较少：只读取候选行
+                scores = queries @ self._gather(rows).T
+            else:
+                scores = np.full((len(queries), size), -np.inf, dtype=np.float32)
+                buffer = None
+                if self.dtype != np.float32:
+                    block_rows = min(self.segment_rows, max(1, self._DECODE_BLOCK_BYTES // (4 * self.dim)))
+                    buffer = np.empty((block_rows, self.dim), dtype=np.float32)
+                for index in range(len(self._segments)):
+                    start = index * self.segment_rows
+                    end = min(start + self.segment_rows, size)
+                    if start >= end:
+                        break
+                    self._score_segment(queries, index, end - start, scores[:, start:end], buffer)
+                scores = scores[:, rows]
+
+            n_coarse = min(len(rows), k * self.rerank_factor) if self.rerank else k
+            for query, q_scores in zip(queries, scores):
+                top = np.argpartition(-q_scores, n_coarse - 1)[:n_coarse]
+                if self.rerank:
+                    # 全精度重排粗排候选
+                    top_scores = self._gather(rows[top], full=True) @ query
+                else:
+                    top_scores = q_scores[top]
+                order = np.argsort(-top_scores, kind="stable")[:k]
+                picked = rows[top[order]]
+                results["ids"].append([self._ids[r] for r in picked])
+                results["documents"].append([self._documents[r] for r in picked])
+                results["metadatas"].append([self._metadatas[r] for r in picked])
+                results["distances"].append((1.0 - top_scores[order]).tolist())
+
+        return results
+
+    def delete(self, ids: List[str]):
+        """删除（记墓碑，必要时自动压缩）"""
+        with self._lock:
+            removed = [doc_id for doc_id in ids if self._unregister(doc_id)]
+            if not removed:
+                return
+            self._append_log([{"op": "delete", "id": doc_id} for doc_id in removed])
+            self._mask_cache.clear()
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        dead = self._size - len(self._row_of)
+        if dead >= self.compact_min_rows and dead > self.compact_ratio * self._size:
+            self.compact()
+
+    def compact(self):
+        """压缩：将存活行重写为新一代分段与日志，原子切换后删除旧文件"""
+        with self._lock:
+            if self.dim is None:
+                return
+            rows = np.flatnonzero(self._alive[:self._size])
+            old_gen_path = self._gen_path
+            new_generation = self.generation + 1
+            new_gen_path = os.path.join(self.path, f"gen_{new_generation}")
+            shutil.rmtree(new_gen_path, ignore_errors=True)
+            os.makedirs(new_gen_path)
+
+            for index, start in enumerate(range(0, len(rows), self.segment_rows)):
+                chunk = rows[start:start + self.segment_rows]
+                segments = self._open_segment(index, create=True, gen_path=new_gen_path)
+                self._write_segment(segments, 0, self._gather(chunk, full=True))
+                del segments
+
+            with open(os.path.join(new_gen_path, "records.jsonl"), "w", encoding="utf-8") as f:
+                for new_row, row in enumerate(rows):
+                    f.write(json.dumps({
+                        "op": "add", "row": new_row, "id": self._ids[row],
+                        "document": self._documents[row], "metadata": self._metadatas[row]
+                    }, ensure_ascii=False) + "\n")
+
+            self.close()
+            self.generation = new_generation
+            self._write_manifest()
+            self._load()
+            shutil.rmtree(old_gen_path, ignore_errors=True)
+            logger.info(f"NumpyBackend compacted: {self.path} ({len(rows)} vectors, gen {self.generation})")
+
+
+def quantization_recall(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    configs: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, float]:
+    """
+    量化存储相对 float32 全精度基线的 Recall@k
+
+    Args:
+        vectors: 语料向量
+        queries: 查询向量
+        k: Top-K
+        configs: 待评估配置（NumpyBackend 参数），默认评估
+            float16、int8、int8+重排
+
+    Returns:
+        Dict[str, float]: 配置名 -> Recall@k
+    """
+    configs = configs or [
+        {"dtype": "float16"},
+        {"dtype": "int8"},
+        {"dtype": "int8", "rerank": True},
+    ]
+    ids = [str(i) for i in range(len(vectors))]
+    documents = [""] * len(vectors)
+    metadatas = [None] * len(vectors)
+
+    def top_ids(options: Dict[str, Any], directory: str) -> List[Set[str]]:
+        backend = NumpyBackend("recall", directory, **options)
+        try:
+            backend.add(ids, vectors, documents, metadatas)
+            return [set(hits) for hits in backend.query(queries, k)["ids"]]
+        finally:
+            backend.close()
+
+    report: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        baseline = top_ids({"dtype": "float32"}, os.path.join(directory, "baseline"))
+        for options in configs:
+            name = options["dtype"] + ("+rerank" if options.get("rerank") else "")
+            found = top_ids(options, os.path.join(directory, name))
+            hits = sum(len(truth & got) for truth, got in zip(baseline, found))
+            report[name] = hits / max(1, sum(len(truth) for truth in baseline))
+    return report
@@ -0,0 +1,144 @@
+"""
+中文语义切块
+按句末标点（。！？…及其后的引号）、对话边界与段落切分句子，
+再把相邻句子聚合为目标长度的块，块间保留若干句重叠。
+
+单遍流式处理：逐段落扫描句子，缓冲区只保留当前块的句子，
+不对整章做重复切片，长章节的耗时与文本长度成线性关系。
+"""
+import re
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Any, Deque, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+# 句末标点（可连用，如"？！"、"……"），后随可选的收尾引号/括号
+_SENTENCE_END = r"[。！？!?…]+[”’」』\"'）)]*"
+# 对话边界：收尾引号后紧跟新的开引号（连续对白）
+_DIALOGUE_END = r"[”」』](?=[“「『])"
+_SENTENCE_RE = re.compile(rf".*?(?:{_SENTENCE_END}|{_DIALOGUE_END}|$)", re.S)
+
+
+@dataclass
+class Chunk:
+    """切块结果（偏移均相对于整章文本）"""
+    text: str
+    index: int
+    char_start: int
+    char_end: int
+    paragraph_start: int
+    paragraph_end: int
+    chapter: Optional[Any] = None
+
+    def metadata(self) -> Dict[str, Any]:
+        """写入向量库的位置元数据（不含正文）"""
+        data = asdict(self)
+        del data["text"]
+        if self.chapter is None:
+            del data["chapter"]
+        data["chunk_index"] = data.pop("index")
+        return data
+
+
+# (文本, 起始偏移, 段落序号)
+_Sentence = Tuple[str, int, int]
+
+
+def iter_sentences(source: Union[str, Iterable[str]]) -> Iterator[_Sentence]:
+    """
+    流式切分句子
+
+    Args:
+        source: 整章文本，或按行产出文本的可迭代对象（如打开的文件）
+
+    Yields:
+        (句子, 起始偏移, 段落序号)；空白句子被跳过，段落序号只计非空段落
+    """
+    lines = source.splitlines(keepends=True) if isinstance(source, str) else source
+    offset = 0
+    paragraph = -1
+    for line in lines:
+        if line.strip():
+            paragraph += 1
+            for match in _SENTENCE_RE.finditer(line):
+                sentence = match.group()
+                if sentence.strip():
+                    yield sentence, offset + match.start(), paragraph
+        offset += len(line)
+
+
+class Chunker:
+    """把句子聚合为目标长度的块"""
+
+    def __init__(self, target_size: int = 400, overlap: int = 80, max_size: Optional[int] = None):
+        """
+        Args:
+            target_size: 目标块长度（字符；中文约等于 token 数）
+            overlap: 相邻块重叠的最大长度（按整句回退）
+            max_size: 单句超过该长度时强制截断（默认 2 × target_size）
+        """
+        if overlap >= target_size:
+            raise ValueError("overlap 必须小于 target_size")
+        self.target_size = target_size
+        self.overlap = overlap
+        self.max_size = max_size or target_size * 2
+
+    def _pieces(self, sentences: Iterable[_Sentence]) -> Iterator[_Sentence]:
+        """超长句按 max_size 截断"""
+        for text, start, paragraph in sentences:
+            if len(text) <= self.max_size:
+                yield text, start, paragraph
+                continue
+            for offset in range(0, len(text), self.target_size):
+                yield text[offset:offset + self.target_size], start + offset, paragraph
+
+    def split(self, source: Union[str, Iterable[str]], chapter: Optional[Any] = None) -> Iterator[Chunk]:
+        """
+        流式切块
+
+        Args:
+            source: 整章文本或按行产出文本的可迭代对象
+            chapter: 章节标识（写入每个块）
+
+        Yields:
+            Chunk: 按顺序产出的块
+        """
+        buffer: Deque[_Sentence] = deque()
+        size = 0
+        index = 0
+        fresh = False  # 缓冲区中是否有上一块未包含的句子
+
+        def emit() -> Chunk:
+            first, last = buffer[0], buffer[-1]
+            parts = []
+            previous = first[2]
+            for text, _, paragraph in buffer:
+                if paragraph != previous:
+                    parts.append("\n")
+                    previous = paragraph
+                parts.append(text.strip())
+            return Chunk(
+                text="".join(parts),
+                index=index,
+                char_start=first[1],
+                char_end=last[1] + len(last[0]),
+                paragraph_start=first[2],
+                paragraph_end=last[2],
+                chapter=chapter
+            )
+
+        for sentence in self._pieces(iter_sentences(source)):
+            if fresh and size + len(sentence[0]) > self.target_size:
+                yield emit()
+                index += 1
+                # 保留末尾若干整句作为重叠（至少丢弃一句，保证前进）
+                kept, kept_size = deque(), 0
+                while len(buffer) > 1 and kept_size + len(buffer[-1][0]) <= self.overlap:
+                    kept_size += len(buffer[-1][0])
+                    kept.appendleft(buffer.pop())
+                buffer, size, fresh = kept, kept_size, False
+            buffer.append(sentence)
+            size += len(sentence[0])
+            fresh = True
+
+        if fresh:
+            yield emit()
@@ -0,0 +1,251 @@
+"""
+持久化嵌入缓存
+以 (模型名, 文本哈希) 为键，向量存放在内存映射的 float16/float32 矩阵中，
+键按行号顺序追加到偏移索引文件，命中时完全跳过模型推理。
+
+目录结构（每个模型一个子目录）：
+    meta.json     维度与数据类型
+    vectors.bin   向量矩阵（按容量预分配，memmap）
+    keys.bin      16 字节文本哈希，第 i 条对应矩阵第 i 行
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+try:  # 多进程写入时加文件锁（POSIX）
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+DIGEST_SIZE = 16
+
+
+def text_digest(text: str) -> bytes:
+    """文本的稳定哈希（16字节）"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=DIGEST_SIZE).digest()
+
+
+class EmbeddingCache:
+    """单个模型的磁盘嵌入缓存"""
+
+    def __init__(self, directory: str, model_name: str, dtype: str = "float16", initial_capacity: int = 1024):
+        """
+        Args:
+            directory: 缓存根目录
+            model_name: 模型名（决定子目录）
+            dtype: 存储精度 float16 / float32
+            initial_capacity: 初始预分配行数
+        """
+        self.model_name = model_name
+        self.path = os.path.join(directory, re.sub(r"[^0-9A-Za-z._-]", "_", model_name))
+        os.makedirs(self.path, exist_ok=True)
+
+        self._meta_path = os.path.join(self.path, "meta.json")
+        self._vectors_path = os.path.join(self.path, "vectors.bin")
+        self._keys_path = os.path.join(self.path, "keys.bin")
+        self._lock_path = os.path.join(self.path, ".lock")
+
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self._load_meta()
+
+        self._initial_capacity = initial_capacity
+        self._rows: Dict[bytes, int] = {}
+        self._count = 0
+        self._matrix: Optional[np.memmap] = None
+        self._lock = threading.RLock()
+
+        self._refresh()
+        if self._count:
+            logger.info(f"Embedding cache loaded: {self.model_name} ({self._count} vectors)")
+
+    def __len__(self) -> int:
+        return self._count
+
+    # ------------------------------------------------------------------
+    # 文件读写
+    # ------------------------------------------------------------------
+
+    def _load_meta(self):
+        if self.dim is None and os.path.exists(self._meta_path):
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.dim = meta["dim"]
+            self.dtype = np.dtype(meta["dtype"])
+
+    def _capacity(self) -> int:
+        if self.dim is None or not os.path.exists(self._vectors_path):
+            return 0
+        return os.path.getsize(self._vectors_path) // (self.dim * self.dtype.itemsize)
+
+    def _map(self):
+        capacity = self._capacity()
+        self._matrix = (
+            np.memmap(self._vectors_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+            if capacity else None
+        )
+
+    def _refresh(self):
+        """读取其它进程追加的键"""
+        if not os.path.exists(self._keys_path):
+            return
+        size = os.path.getsize(self._keys_path)
+        known = self._count * DIGEST_SIZE
+        if size <= known:
+            return
+
+        self._load_meta()
+        with open(self._keys_path, "rb") as f:
+            f.seek(known)
+            tail = f.read(size - known)
+        for i in range(len(tail) // DIGEST_SIZE):
+            self._rows[tail[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE]] = self._count + i
+        self._count += len(tail) // DIGEST_SIZE
+
+        if self._matrix is None or len(self._matrix) < self._count:
+            self._map()
+
+    def _ensure_capacity(self, rows: int):
+        capacity = self._capacity()
+        if rows <= capacity:
+            if self._matrix is None or len(self._matrix) < capacity:
+                self._map()
+            return
+
+        new_capacity = max(self._initial_capacity, capacity)
+        while new_capacity < rows:
+            new_capacity *= 2
+        self._matrix = None
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * self.dtype.itemsize)
+        self._map()
+
+    # ------------------------------------------------------------------
+    # 公共接口
+    # ------------------------------------------------------------------
+
+    def lookup(self, digests: List[bytes]) -> np.ndarray:
+        """
+        批量查找行号
+
+        Returns:
+            np.ndarray: 每个哈希对应的行号（未命中为 -1）
+        """
+        with self._lock:
+            if any(digest not in self._rows for digest in digests):
+                self._refresh()
+            return np.fromiter(
+                (self._rows.get(digest, -1) for digest in digests),
+                dtype=np.int64,
+                count=len(digests)
+            )
+
+    def read(self, rows: np.ndarray) -> np.ndarray:
+        """按行号读取向量（float32）"""
+        with self._lock:
+            if len(rows) == 0 or self._matrix is None:
+                return np.zeros((len(rows), self.dim or 0), dtype=np.float32)
+            return np.asarray(self._matrix[rows], dtype=np.float32)
+
+    def put(self, digests: List[bytes], vectors: np.ndarray):
+        """批量写入（已存在的键跳过）"""
+        if len(digests) == 0:
+            return
+        vectors = np.asarray(vectors)
+
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if self.dim is None:
+                    self.dim = int(vectors.shape[1])
+                    with open(self._meta_path, "w", encoding="utf-8") as f:
+                        json.dump({"model": self.model_name, "dim": self.dim, "dtype": self.dtype.name}, f)
+                elif vectors.shape[1] != self.dim:
+                    raise ValueError(f"嵌入维度不一致: {vectors.shape[1]} != {self.dim}")
+
+                self._refresh()
+                fresh: Dict[bytes, int] = {}
+                for i, digest in enumerate(digests):
+                    if digest not in self._rows and digest not in fresh:
+                        fresh[digest] = i
+                if not fresh:
+                    return
+
+                start = self._count
+                self._ensure_capacity(start + len(fresh))
+                self._matrix[start:start + len(fresh)] = vectors[list(fresh.values())]
+                self._matrix.flush()
+
+                # 先落盘向量，再追加键，崩溃时不会出现指向空行的键
+                with open(self._keys_path, "ab") as f:
+                    f.write(b"".join(fresh.keys()))
+                for offset, digest in enumerate(fresh):
+                    self._rows[digest] = start + offset
+                self._count += len(fresh)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class CachedEmbedder:
+    """
+    带磁盘缓存的嵌入函数
+
+    批量嵌入时先按哈希查缓存，只有未命中的（去重后）文本才交给模型。
+    """
+
+    def __init__(self, embed_fn: Callable[[List[str]], np.ndarray], cache: EmbeddingCache):
+        self.embed_fn = embed_fn
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """批量嵌入，返回 float32 矩阵"""
+        if not texts:
+            return np.zeros((0, self.cache.dim or 0), dtype=np.float32)
+
+        digests = [text_digest(text) for text in texts]
+        rows = self.cache.lookup(digests)
+        missing = np.flatnonzero(rows < 0)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if len(missing):
+            unique: Dict[bytes, str] = {}
+            for i in missing:
+                unique.setdefault(digests[i], texts[i])
+            vectors = np.asarray(self.embed_fn(list(unique.values())), dtype=np.float32)
+            self.cache.put(list(unique.keys()), vectors)
+
+            fresh = dict(zip(unique.keys(), vectors))
+            result = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            hit = rows >= 0
+            if hit.any():
+                result[hit] = self.cache.read(rows[hit])
+            for i in missing:
+                result[i] = fresh[digests[i]]
+            return result
+
+        return self.cache.read(rows)
+
+
+_caches: Dict[tuple, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(directory: str, model_name: str, dtype: str = "float16") -> EmbeddingCache:
+    """获取进程内共享的缓存实例（同一目录与模型只打开一次）"""
+    key = (os.path.abspath(directory), model_name)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = EmbeddingCache(directory, model_name, dtype=dtype)
+    return cache
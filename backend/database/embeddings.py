@@ -0,0 +1,93 @@
+"""
+进程级嵌入模型注册表
+同名模型在进程内只加载一次，由所有集合共享；首次使用时才加载，
+也可在启动后于后台线程预热。
+"""
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+
+class SentenceTransformerEmbedder:
+    """
+    延迟加载的 sentence-transformers 嵌入函数
+
+    可直接作为 chromadb 的 embedding_function 使用。
+    """
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL, device: str = "cpu"):
+        self.model_name = model_name
+        self.device = device
+        self.load_seconds: Optional[float] = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self):
+        """加载模型（线程安全，仅加载一次）"""
+        if self._model is not None:
+            return self._model
+
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+
+                start = time.perf_counter()
+                self._model = SentenceTransformer(self.model_name, device=self.device)
+                self.load_seconds = time.perf_counter() - start
+                logger.info(f"Embedding model loaded: {self.model_name} ({self.load_seconds:.2f}s)")
+        return self._model
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """批量嵌入，返回 float32 矩阵"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        model = self.load()
+        return np.asarray(
+            model.encode(list(texts), batch_size=batch_size, convert_to_numpy=True),
+            dtype=np.float32
+        )
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return self.encode(input).tolist()
+
+
+_registry: Dict[str, SentenceTransformerEmbedder] = {}
+_registry_lock = threading.Lock()
+
+
+def get_embedder(model_name: str = DEFAULT_EMBEDDING_MODEL) -> SentenceTransformerEmbedder:
+    """获取共享的嵌入函数（不触发模型加载）"""
+    embedder = _registry.get(model_name)
+    if embedder is None:
+        with _registry_lock:
+            embedder = _registry.setdefault(model_name, SentenceTransformerEmbedder(model_name))
+    return embedder
+
+
+def warmup_embedder(model_name: str = DEFAULT_EMBEDDING_MODEL) -> threading.Thread:
+    """在后台线程预热模型，返回该线程"""
+    embedder = get_embedder(model_name)
+
+    def _warmup():
+        try:
+            embedder.load()
+        except Exception as e:
+            logger.warning(f"Embedding model warmup failed: {model_name}: {e}")
+
+    thread = threading.Thread(target=_warmup, name=f"embedding-warmup-{model_name}", daemon=True)
+    thread.start()
+    return thread
+
+
+def embedding_stats() -> Dict[str, Optional[float]]:
+    """各已注册模型的加载耗时（秒，未加载为 None）"""
+    return {name: embedder.load_seconds for name, embedder in _registry.items()}
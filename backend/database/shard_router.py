@@ -0,0 +1,283 @@
+"""
+按项目分片的向量存储
+每个项目（可选再按知识分类）使用独立的集合与持久化目录：
+查询只扫描本项目的向量，删除项目即删除目录。
+分片按需打开，超过上限时关闭最久未使用的空闲分片，内存只随活跃项目增长。
+
+目录结构：
+    <root>/embedding_cache/       所有分片共享的嵌入缓存
+    <root>/<project>/shards.json  项目已有的分片（集合名列表；<project> 见 _safe_name）
+    <root>/<project>/...          各分片的后端数据
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from config.settings import settings
+from database.vector_store import VectorStore
+
+DEFAULT_SHARD = "novel_knowledge"
+
+ShardKey = Tuple[str, str]
+
+
+_PLAIN_NAME = re.compile(r"[0-9A-Za-z_-]{1,64}")
+
+
+def _safe_name(name: str) -> str:
+    """
+    转为可用作目录/集合名的字符串（不同名称不会映射到同一结果）
+
+    仅含字母、数字、下划线与连字符的短名称原样使用；其余名称（中文、含分隔符或过长）
+    转为"可读前缀.摘要"。编码结果必含"."，而原样使用的名称不含，两类不会相撞。
+    """
+    if _PLAIN_NAME.fullmatch(name):
+        return name
+    prefix = re.sub(r"[^0-9A-Za-z_-]", "_", name)[:16] or "x"
+    digest = hashlib.blake2b(name.encode("utf-8"), digest_size=12).hexdigest()
+    return f"{prefix}.{digest}"
+
+
+class VectorStoreRouter:
+    """分片路由：(项目, 分类) → VectorStore"""
+
+    def __init__(
+        self,
+        persist_directory: Optional[str] = None,
+        max_open_shards: Optional[int] = None,
+        shard_by_category: bool = False,
+        max_workers: int = 4,
+        **store_options
+    ):
+        """
+        Args:
+            persist_directory: 分片根目录（默认 settings.vector_store_path）
+            max_open_shards: 同时打开的分片上限（默认 settings.vector_max_open_shards）
+            shard_by_category: 是否在项目内再按元数据 category 分片
+            max_workers: 所有分片共享的嵌入/索引线程数
+            **store_options: 透传给 VectorStore（backend、embedding_function 等）
+        """
+        self.persist_directory = persist_directory or settings.vector_store_path
+        self.max_open_shards = max_open_shards or settings.vector_max_open_shards
+        self.shard_by_category = shard_by_category
+        store_options.setdefault("embedding_cache_dir", os.path.join(self.persist_directory, "embedding_cache"))
+        self.store_options = store_options
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vector-shard")
+        self._open: "OrderedDict[ShardKey, VectorStore]" = OrderedDict()
+        self._in_flight: Dict[ShardKey, int] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 分片管理
+    # ------------------------------------------------------------------
+
+    def _project_path(self, project_id: str) -> str:
+        """项目目录（非法项目ID或解析后不在根目录内时抛出 ValueError）"""
+        if not project_id or project_id in (".", "..") or any(c in project_id for c in "/\\\0"):
+            raise ValueError(f"非法的项目ID: {project_id!r}")
+        path = os.path.join(self.persist_directory, _safe_name(project_id))
+        root = os.path.realpath(self.persist_directory)
+        real = os.path.realpath(path)
+        if os.path.dirname(real) != root:
+            raise ValueError(f"项目目录不在向量存储根目录内: {project_id!r}")
+        return path
+
+    def _manifest_path(self, project_id: str) -> str:
+        return os.path.join(self._project_path(project_id), "shards.json")
+
+    def shard_names(self, project_id: str) -> List[str]:
+        """项目已创建的分片名"""
+        path = self._manifest_path(project_id)
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _shard_name(self, category: Optional[str]) -> str:
+        if not self.shard_by_category or not category:
+            return DEFAULT_SHARD
+        return f"{DEFAULT_SHARD}_{_safe_name(category)}"
+
+    @property
+    def open_shards(self) -> List[ShardKey]:
+        """当前打开的分片（最久未使用在前）"""
+        return list(self._open)
+
+    def shard(self, project_id: str, name: str = DEFAULT_SHARD) -> VectorStore:
+        """获取分片（不存在则创建，未打开则打开）"""
+        with self._lock:
+            return self._get((project_id, name))
+
+    def _get(self, key: ShardKey) -> VectorStore:
+        store = self._open.get(key)
+        if store is not None:
+            self._open.move_to_end(key)
+            return store
+
+        project_id, name = key
+        path = self._project_path(project_id)
+        os.makedirs(path, exist_ok=True)
+        names = self.shard_names(project_id)
+        if name not in names:
+            with open(self._manifest_path(project_id), "w", encoding="utf-8") as f:
+                json.dump(names + [name], f)
+
+        store = VectorStore(
+            collection_name=name,
+            persist_directory=path,
+            executor=self._executor,
+            **self.store_options
+        )
+        self._open[key] = store
+        self._evict()
+        return store
+
+    def _evict(self):
+        """关闭超出上限的最久未使用分片（跳过有在途请求的分片与刚使用的分片）"""
+        for key in list(self._open)[:-1]:
+            if len(self._open) <= self.max_open_shards:
+                break
+            if self._in_flight.get(key):
+                continue
+            self._open.pop(key).close()
+            logger.debug(f"Closed idle vector shard: {key}")
+
+    @asynccontextmanager
+    async def _using(self, project_id: str, name: str):
+        """使用期间分片不会被关闭"""
+        key = (project_id, name)
+        with self._lock:
+            store = self._get(key)
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        try:
+            yield store
+        finally:
+            with self._lock:
+                self._in_flight[key] -= 1
+                if not self._in_flight[key]:
+                    del self._in_flight[key]
+                self._evict()
+
+    def project(self, project_id: str) -> "ProjectVectorStore":
+        """绑定到单个项目的向量存储视图（可直接交给 KnowledgeManager）"""
+        return ProjectVectorStore(self, project_id)
+
+    def drop_project(self, project_id: str):
+        """删除项目的全部向量数据"""
+        path = self._project_path(project_id)
+        with self._lock:
+            if any(key[0] == project_id for key in self._in_flight):
+                raise RuntimeError(f"项目仍有进行中的向量请求: {project_id}")
+            for key in [key for key in self._open if key[0] == project_id]:
+                self._open.pop(key).close()
+            shutil.rmtree(path, ignore_errors=True)
+        logger.info(f"Dropped vector shards of project: {project_id}")
+
+    def close(self):
+        """关闭所有分片与共享线程池"""
+        with self._lock:
+            while self._open:
+                self._open.popitem(last=False)[1].close()
+        self._executor.shutdown(wait=True)
+
+
+class ProjectVectorStore:
+    """
+    单个项目的向量存储
+
+    接口与 VectorStore 一致；按分类分片时，写入按元数据 category 路由，
+    检索只查询过滤条件涉及的分类分片，多分片结果按距离合并。
+    """
+
+    def __init__(self, router: VectorStoreRouter, project_id: str):
+        self.router = router
+        self.project_id = project_id
+
+    def _target_shards(self, filter: Optional[Dict]) -> List[str]:
+        if not self.router.shard_by_category:
+            return [DEFAULT_SHARD]
+        existing = self.router.shard_names(self.project_id)
+        condition = (filter or {}).get("category")
+        if isinstance(condition, str):
+            categories = [condition]
+        elif isinstance(condition, dict) and set(condition) <= {"$eq", "$in"}:
+            categories = [condition["$eq"]] if "$eq" in condition else list(condition["$in"])
+        else:
+            return existing
+        names = {self.router._shard_name(category) for category in categories}
+        return [name for name in existing if name in names]
+
+    def _group(self, metadatas: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+        groups: Dict[str, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            name = self.router._shard_name((metadata or {}).get("category"))
+            groups.setdefault(name, []).append(i)
+        return groups
+
+    async def _write(self, method: str, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str]):
+        for name, rows in self._group(metadatas).items():
+            async with self.router._using(self.project_id, name) as store:
+                await getattr(store, method)(
+                    [texts[i] for i in rows],
+                    [metadatas[i] for i in rows],
+                    [ids[i] for i in rows]
+                )
+
+    async def add_texts(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str]):
+        await self._write("add_texts", texts, metadatas, ids)
+
+    async def upsert_texts(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str]):
+        await self._write("upsert_texts", texts, metadatas, ids)
+
+    async def reindex_document(
+        self,
+        doc_id: str,
+        new_text: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, int]:
+        name = self.router._shard_name((metadata or {}).get("category"))
+        async with self.router._using(self.project_id, name) as store:
+            return await store.reindex_document(doc_id, new_text, metadata)
+
+    async def search_many(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        filter: Optional[Dict] = None,
+        dedup: bool = False
+    ) -> List[List[Dict]]:
+        per_shard = []
+        for name in self._target_shards(filter):
+            async with self.router._using(self.project_id, name) as store:
+                per_shard.append(await store.search_many(queries, top_k=top_k, filter=filter, dedup=dedup))
+        if len(per_shard) == 1:
+            return per_shard[0]
+        return [
+            sorted((hit for hits in shard_hits for hit in hits), key=lambda hit: hit["score"])[:top_k]
+            for shard_hits in zip(*per_shard)
+        ] if per_shard else [[] for _ in queries]
+
+    async def search(self, query: str, top_k: int = 5, filter: Optional[Dict] = None) -> List[Dict]:
+        return (await self.search_many([query], top_k=top_k, filter=filter))[0]
+
+    async def delete(self, ids: List[str]):
+        for name in self.router.shard_names(self.project_id):
+            async with self.router._using(self.project_id, name) as store:
+                await store.delete(ids)
+
+    async def count(self) -> int:
+        total = 0
+        for name in self.router.shard_names(self.project_id):
+            async with self.router._using(self.project_id, name) as store:
+                total += await store.count()
+        return total
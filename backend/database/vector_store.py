@@ -1,64 +1,345 @@
 """
 向量数据库适配器
 实现基于语义的文本检索
+
+嵌入与索引操作均为同步 CPU 密集调用，统一放到专用线程池执行，
+并通过信号量限制排队深度，避免阻塞事件循环。
+索引后端可插拔：chroma（默认）或 numpy（内存映射，见 database.backends）。
+
+集合建立时的嵌入模型名记录在持久化目录的 embedding_models.json 中；
+以其他模型打开已有集合会报错，更换 EMBEDDING_MODEL 后需删除向量数据并重新导入。
 """
-from typing import List, Dict, Any, Optional
-import chromadb
-from chromadb.utils import embedding_functions
+import asyncio
+import functools
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Any, Optional
+import numpy as np
 from loguru import logger
 
-class VectorStore:
-    def __init__(self, collection_name: str = "novel_knowledge", persist_directory: str = "./data/chroma"):
-        self.client = chromadb.PersistentClient(path=persist_directory)
-        
-        # 使用默认的 sentence-transformers 嵌入模型
-        self.embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name="all-MiniLM-L6-v2"
+from config.settings import settings
+from database.backends import create_backend
+from database.chunker import Chunker
+from database.embedding_cache import CachedEmbedder, get_embedding_cache
+from database.embeddings import DEFAULT_EMBEDDING_MODEL, get_embedder
+
+MODEL_MANIFEST = "embedding_models.json"
+
+
+def _check_embedding_model(persist_directory: str, collection_name: str, model_name: str, count: int):
+    """
+    校验集合与当前嵌入模型一致，首次使用时记录模型名
+
+    未记录模型的已有集合视为由 DEFAULT_EMBEDDING_MODEL 建立（此前唯一的默认模型）。
+    不同模型的向量维度可能相同，混用不会报错但相似度失去意义，因此不一致时直接拒绝。
+    """
+    path = os.path.join(persist_directory, MODEL_MANIFEST)
+    models: Dict[str, str] = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            models = json.load(f)
+
+    recorded = models.get(collection_name) or (DEFAULT_EMBEDDING_MODEL if count else None)
+    if recorded is not None and recorded != model_name:
+        raise ValueError(
+            f"集合 {collection_name} 由嵌入模型 {recorded} 建立，当前模型为 {model_name}；"
+            f"请删除该集合的向量数据后重新导入（重建索引）"
         )
-        
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            embedding_function=self.embedding_fn
+    if models.get(collection_name) != model_name:
+        models[collection_name] = model_name
+        os.makedirs(persist_directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(models, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+class VectorStore:
+    def __init__(
+        self,
+        collection_name: str = "novel_knowledge",
+        persist_directory: str = "./data/chroma",
+        max_workers: int = 2,
+        max_pending: int = 32,
+        embedding_model: Optional[str] = None,
+        embedding_function: Optional[Callable] = None,
+        use_embedding_cache: bool = True,
+        embedding_cache_dir: Optional[str] = None,
+        backend: str = "chroma",
+        backend_options: Optional[Dict[str, Any]] = None,
+        executor: Optional[ThreadPoolExecutor] = None,
+        chunker: Optional[Chunker] = None
+    ):
+        """
+        Args:
+            collection_name: 集合名称
+            persist_directory: 持久化目录
+            max_workers: 嵌入/索引线程数
+            max_pending: 最大在途请求数（超出时调用方等待，形成背压）
+            embedding_model: sentence-transformers 模型名（默认 settings.embedding_model）
+            embedding_function: 自定义嵌入函数（可选，覆盖 embedding_model）
+            use_embedding_cache: 是否启用磁盘嵌入缓存
+            embedding_cache_dir: 嵌入缓存目录（默认位于 persist_directory 下）
+            backend: 索引后端 "chroma" / "numpy"
+            backend_options: 后端专属参数（如 numpy 后端的 dtype、segment_rows）
+            executor: 共享线程池（可选，多个集合共用时传入；关闭时不随之关闭）
+            chunker: 文档切块器（reindex_document 使用，默认按中文句子切块）
+        """
+        # 进程内共享的嵌入模型，首次嵌入时才加载权重
+        self.embedding_fn = embedding_function or get_embedder(embedding_model or settings.embedding_model)
+
+        # 磁盘嵌入缓存按模型名分区；自定义嵌入函数需提供 model_name 才能安全缓存
+        self._embedder: Optional[CachedEmbedder] = None
+        model_name = getattr(self.embedding_fn, "model_name", None)
+        if use_embedding_cache and model_name:
+            cache_dir = embedding_cache_dir or os.path.join(persist_directory, "embedding_cache")
+            self._embedder = CachedEmbedder(self._embed_uncached, get_embedding_cache(cache_dir, model_name))
+
+        self.chunker = chunker or Chunker()
+        self.backend_name = backend
+        self.backend = create_backend(
+            backend,
+            collection_name,
+            persist_directory,
+            embedding_function=self.embedding_fn,
+            **(backend_options or {})
         )
-        logger.info(f"VectorStore initialized with collection: {collection_name}")
+        # 自定义嵌入函数未提供 model_name 时无法校验
+        if model_name:
+            try:
+                _check_embedding_model(persist_directory, collection_name, model_name, self.backend.count())
+            except Exception:
+                self.backend.close()
+                raise
+
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vector-store")
+        self._slots = asyncio.Semaphore(max_pending)
+        logger.info(f"VectorStore initialized with collection: {collection_name} ({backend})")
+
+    @property
+    def collection(self):
+        """底层 chromadb 集合（仅 chroma 后端）"""
+        return getattr(self.backend, "collection", None)
+
+    async def _run(self, fn, *args, **kwargs):
+        """在线程池中执行同步调用"""
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def _embed_uncached(self, texts: List[str]) -> np.ndarray:
+        if hasattr(self.embedding_fn, "encode"):
+            return self.embedding_fn.encode(texts)
+        return np.asarray(self.embedding_fn(texts), dtype=np.float32)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """批量嵌入（优先命中磁盘缓存）"""
+        if self._embedder is not None:
+            return self._embedder.encode(texts)
+        return self._embed_uncached(texts)
+
+    def _add_sync(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str]):
+        self.backend.add(ids, self._embed(texts), texts, metadatas)
+
+    def _upsert_sync(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str]):
+        self.backend.upsert(ids, self._embed(texts), texts, metadatas)
+
+    def _reindex_sync(self, doc_id: str, text: str, metadata: Dict[str, Any]) -> Dict[str, int]:
+        # 块 ID = 文档ID + 内容哈希 + 同内容出现序号，内容不变则 ID 不变
+        chunks = []
+        seen: Dict[str, int] = {}
+        for chunk in self.chunker.split(text):
+            chunk_hash = hashlib.blake2b(chunk.text.encode("utf-8"), digest_size=8).hexdigest()
+            occurrence = seen.get(chunk_hash, 0)
+            seen[chunk_hash] = occurrence + 1
+            chunks.append((
+                f"{doc_id}:{chunk_hash}:{occurrence}",
+                chunk.text,
+                {**metadata, **chunk.metadata(), "doc_id": doc_id, "chunk_hash": chunk_hash}
+            ))
+
+        existing = self.backend.get({"doc_id": doc_id})
+        old = dict(zip(existing["ids"], existing["metadatas"]))
+        new_ids = {chunk_id for chunk_id, _, _ in chunks}
+
+        removed = [chunk_id for chunk_id in old if chunk_id not in new_ids]
+        added = [c for c in chunks if c[0] not in old]
+        moved = [c for c in chunks if c[0] in old and old[c[0]] != c[2]]
+
+        if removed:
+            self.backend.delete(removed)
+        if added:
+            self.backend.upsert(
+                [c[0] for c in added],
+                self._embed([c[1] for c in added]),
+                [c[1] for c in added],
+                [c[2] for c in added]
+            )
+        if moved:
+            self.backend.update_metadata([c[0] for c in moved], [c[2] for c in moved])
+
+        return {
+            "added": len(added),
+            "removed": len(removed),
+            "updated": len(moved),
+            "unchanged": len(chunks) - len(added) - len(moved)
+        }
+
+    def _query_sync(self, queries: List[str], top_k: int, where: Optional[Dict]):
+        """一次批量嵌入 + 一次索引查询"""
+        return self.backend.query(self._embed(queries), top_k, where)
+
+    @staticmethod
+    def _format_results(results: Dict, index: int) -> List[Dict]:
+        """格式化第 index 个查询的结果"""
+        formatted_results = []
+        if results["documents"]:
+            for i, doc in enumerate(results["documents"][index]):
+                formatted_results.append({
+                    "id": results["ids"][index][i],
+                    "content": doc,
+                    "metadata": results["metadatas"][index][i],
+                    "score": results["distances"][index][i] if results["distances"] else 0
+                })
+        return formatted_results
 
     async def add_texts(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str]):
         """添加文本向量"""
         try:
-            self.collection.add(
-                documents=texts,
-                metadatas=metadatas,
-                ids=ids
-            )
+            await self._run(self._add_sync, texts, metadatas, ids)
             logger.info(f"Added {len(texts)} documents to vector store")
         except Exception as e:
             logger.error(f"Failed to add documents: {e}")
             raise
 
+    async def upsert_texts(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str]):
+        """添加或覆盖文本向量（按 ID 幂等）"""
+        try:
+            await self._run(self._upsert_sync, texts, metadatas, ids)
+            logger.info(f"Upserted {len(texts)} documents to vector store")
+        except Exception as e:
+            logger.error(f"Failed to upsert documents: {e}")
+            raise
+
+    async def reindex_document(
+        self,
+        doc_id: str,
+        new_text: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, int]:
+        """
+        增量重建单个文档（如编辑后的章节）的索引
+
+        文本按中文句子切块（带章节内字符与段落偏移）后按内容哈希与已索引块比对：
+        只嵌入新增块，删除消失的块，位置变化的块仅更新元数据。
+
+        Args:
+            doc_id: 文档ID（写入块元数据 doc_id）
+            new_text: 文档最新全文
+            metadata: 附加到每个块的元数据
+
+        Returns:
+            Dict[str, int]: added / removed / updated / unchanged 块数
+        """
+        try:
+            stats = await self._run(self._reindex_sync, doc_id, new_text, metadata or {})
+            logger.info(f"Reindexed {doc_id}: {stats}")
+            return stats
+        except Exception as e:
+            logger.error(f"Failed to reindex {doc_id}: {e}")
+            raise
+
     async def search(self, query: str, top_k: int = 5, filter: Optional[Dict] = None) -> List[Dict]:
         """语义搜索"""
         try:
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=top_k,
-                where=filter
-            )
-            
-            # 格式化返回结果
-            formatted_results = []
-            if results["documents"]:
-                for i, doc in enumerate(results["documents"][0]):
-                    formatted_results.append({
-                        "content": doc,
-                        "metadata": results["metadatas"][0][i],
-                        "score": results["distances"][0][i] if results["distances"] else 0
-                    })
-            
-            return formatted_results
+            results = await self._run(self._query_sync, [query], top_k, filter)
+            return self._format_results(results, 0)
         except Exception as e:
             logger.error(f"Vector search failed: {e}")
             return []
 
+    async def search_many(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        filter: Optional[Dict] = None,
+        dedup: bool = False
+    ) -> List[List[Dict]]:
+        """
+        批量语义搜索（如场景中出场的所有人物）
+
+        所有查询一次批量嵌入、一次索引查询，延迟与查询数基本无关。
+
+        Args:
+            queries: 查询文本列表
+            top_k: 每个查询返回Top-K结果
+            filter: 元数据过滤条件
+            dedup: 跨查询去重（同一文档只保留在距离最小的查询中）
+
+        Returns:
+            List[List[Dict]]: 与 queries 一一对应的结果列表
+        """
+        if not queries:
+            return []
+        try:
+            results = await self._run(self._query_sync, list(queries), top_k, filter)
+        except Exception as e:
+            logger.error(f"Vector batch search failed: {e}")
+            return [[] for _ in queries]
+
+        per_query = [self._format_results(results, i) for i in range(len(queries))]
+        if not dedup:
+            return per_query
+
+        best: Dict[str, tuple] = {}
+        for qi, hits in enumerate(per_query):
+            for hit in hits:
+                current = best.get(hit["id"])
+                if current is None or hit["score"] < current[1]:
+                    best[hit["id"]] = (qi, hit["score"])
+        return [
+            [hit for hit in hits if best[hit["id"]][0] == qi]
+            for qi, hits in enumerate(per_query)
+        ]
+
+    async def search_merged(
+        self,
+        queries: List[str],
+        top_k: int = 10,
+        filter: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        批量语义搜索并合并为单一Top-K（跨查询去重，按最小距离排序）
+
+        每条结果额外带 "queries" 字段，记录命中它的查询下标。
+        """
+        per_query = await self.search_many(queries, top_k=top_k, filter=filter)
+
+        merged: Dict[str, Dict] = {}
+        for qi, hits in enumerate(per_query):
+            for hit in hits:
+                entry = merged.get(hit["id"])
+                if entry is None:
+                    merged[hit["id"]] = entry = {**hit, "queries": []}
+                elif hit["score"] < entry["score"]:
+                    entry["score"] = hit["score"]
+                entry["queries"].append(qi)
+
+        return sorted(merged.values(), key=lambda hit: hit["score"])[:top_k]
+
     async def delete(self, ids: List[str]):
         """删除向量"""
-        self.collection.delete(ids=ids)
\ No newline at end of file
+        await self._run(self.backend.delete, ids)
+
+    async def count(self) -> int:
+        """向量条数"""
+        return await self._run(self.backend.count)
+
+    def close(self):
+        """关闭线程池（等待在途任务完成）并释放后端"""
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+        self.backend.close()
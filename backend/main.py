@@ -10,6 +10,7 @@ import uvicorn
 from loguru import logger
 
 from config.settings import settings
+from database.embeddings import embedding_stats, warmup_embedder
 
 # 应用生命周期管理
 @asynccontextmanager
@@ -20,6 +21,10 @@ async def lifespan(app: FastAPI):
     logger.info(f"Environment: {settings.ENVIRONMENT}")
     logger.info(f"LLM Provider: {settings.LLM_PROVIDER}")
     
+    # 后台预热嵌入模型，不阻塞启动
+    if settings.embedding_warmup:
+        warmup_embedder(settings.embedding_model)
+    
     yield
     
     # 关闭时清理
@@ -56,7 +61,8 @@ async def health_check():
     return {
         "status": "healthy",
         "version": "0.1.0",
-        "environment": settings.ENVIRONMENT
+        "environment": settings.ENVIRONMENT,
+        "embedding_models": embedding_stats()
     }
 
 
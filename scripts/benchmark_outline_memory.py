@@ -0,0 +1,191 @@
+"""
+大纲节点内存基准测试
+
+按"卷 → 章 → 场景"生成超长篇大纲，分别用原数据类表示（下方 _Legacy* 为改造前定义的副本）
+与当前的紧凑表示（backend.core.structure.models）构建节点与伏笔，
+用 tracemalloc 统计每个节点/伏笔的内存占用。
+
+正文类字段（标题、大纲描述）在计时前生成、两种表示共用，统计的是对象本身的开销；
+ID 与关联列表按"从存储加载"的方式每次新建字符串，体现 ID 驻留的效果。
+
+用法：
+    python scripts/benchmark_outline_memory.py --volumes 20 --chapters 100 --scenes 20
+    python scripts/benchmark_outline_memory.py --output outline_memory.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Literal, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.core.structure.models import NodeStatus, NodeType, PlotLoop, PlotNode  # noqa: E402
+
+
+@dataclass
+class _LegacyPlotNode:
+    """改造前的 PlotNode（对照组）"""
+    id: str
+    title: str
+    description: str
+    type: NodeType
+    status: NodeStatus = NodeStatus.DRAFT
+    actual_content_summary: str = ""
+    deviation_score: float = 0.0
+    characters: List[str] = field(default_factory=list)
+    open_loops: List[str] = field(default_factory=list)
+    closed_loops: List[str] = field(default_factory=list)
+    created_at: datetime = field(default_factory=datetime.now)
+    updated_at: datetime = field(default_factory=datetime.now)
+    word_count: int = 0
+    estimated_word_count: int = 0
+    parent_id: Optional[str] = None
+    children_ids: List[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        if not self.id:
+            raise ValueError("节点ID不能为空")
+        if not self.title:
+            raise ValueError("节点标题不能为空")
+        if self.deviation_score < 0 or self.deviation_score > 1:
+            raise ValueError("偏离度必须在0-1之间")
+
+
+@dataclass
+class _LegacyPlotLoop:
+    """改造前的 PlotLoop（对照组）"""
+    id: str
+    description: str
+    created_in_node: str
+    resolved_in_node: Optional[str] = None
+    status: Literal["open", "resolved", "abandoned"] = "open"
+    importance: Literal["minor", "major", "critical"] = "minor"
+    created_at: datetime = field(default_factory=datetime.now)
+    resolved_at: Optional[datetime] = None
+
+
+def _fresh(value: str) -> str:
+    """新建等值字符串（模拟从数据库逐行读取）"""
+    return "".join([value[:1], value[1:]])
+
+
+def generate_outline(volumes: int, chapters: int, scenes: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """生成节点规格（正文字段预先生成，供两种表示共用）"""
+    rng = random.Random(seed)
+    cast = [f"角色{i}" for i in range(200)]
+    specs = []
+
+    def add(node_id, node_type, parent_id, children):
+        specs.append({
+            "id": node_id,
+            "title": f"{node_id} 标题",
+            "description": "大纲描述" * rng.randint(5, 20),
+            "type": node_type,
+            "parent_id": parent_id,
+            "children_ids": children,
+            # 约三分之一的场景标注了出场人物，伏笔只出现在少数节点
+            "characters": rng.sample(cast, 2) if node_type == NodeType.SCENE and rng.random() < 0.3 else [],
+            "open_loops": [f"loop-{node_id}"] if rng.random() < 0.02 else [],
+        })
+
+    for v in range(volumes):
+        volume_id = f"v{v}"
+        add(volume_id, NodeType.VOLUME, None, [f"{volume_id}c{c}" for c in range(chapters)])
+        for c in range(chapters):
+            chapter_id = f"{volume_id}c{c}"
+            add(chapter_id, NodeType.CHAPTER, volume_id, [f"{chapter_id}s{s}" for s in range(scenes)])
+            for s in range(scenes):
+                add(f"{chapter_id}s{s}", NodeType.SCENE, chapter_id, [])
+    return specs
+
+
+def _build_nodes(node_cls: Callable, specs: List[Dict[str, Any]]) -> list:
+    return [
+        node_cls(
+            id=_fresh(spec["id"]),
+            title=spec["title"],
+            description=spec["description"],
+            type=spec["type"],
+            characters=[_fresh(name) for name in spec["characters"]],
+            open_loops=[_fresh(loop_id) for loop_id in spec["open_loops"]],
+            parent_id=_fresh(spec["parent_id"]) if spec["parent_id"] else None,
+            children_ids=[_fresh(child_id) for child_id in spec["children_ids"]],
+        )
+        for spec in specs
+    ]
+
+
+def _build_loops(loop_cls: Callable, specs: List[Dict[str, Any]]) -> list:
+    return [
+        loop_cls(
+            id=_fresh(loop_id),
+            description=spec["description"],
+            created_in_node=_fresh(spec["id"]),
+            importance="major",
+        )
+        for spec in specs
+        for loop_id in spec["open_loops"]
+    ]
+
+
+def measure(build: Callable[[], list]) -> Dict[str, float]:
+    """构建对象并返回 tracemalloc 统计的内存增量"""
+    gc.collect()
+    tracemalloc.start()
+    objects = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(objects)
+    del objects
+    return {"count": count, "bytes": current, "bytes_per_object": round(current / max(count, 1), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大纲节点内存基准测试")
+    parser.add_argument("--volumes", type=int, default=20, help="卷数")
+    parser.add_argument("--chapters", type=int, default=100, help="每卷章数")
+    parser.add_argument("--scenes", type=int, default=20, help="每章场景数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--output", help="JSON 报告路径")
+    args = parser.parse_args()
+
+    specs = generate_outline(args.volumes, args.chapters, args.scenes, args.seed)
+    report = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "nodes": len(specs),
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+        },
+        "nodes": {
+            "before": measure(lambda: _build_nodes(_LegacyPlotNode, specs)),
+            "after": measure(lambda: _build_nodes(PlotNode, specs)),
+        },
+        "loops": {
+            "before": measure(lambda: _build_loops(_LegacyPlotLoop, specs)),
+            "after": measure(lambda: _build_loops(PlotLoop, specs)),
+        },
+    }
+
+    print(f"{len(specs)} nodes (Python {report['meta']['python']})")
+    print(f"{'':8}{'before B/obj':>14}{'after B/obj':>14}{'saved':>9}")
+    for kind in ("nodes", "loops"):
+        before = report[kind]["before"]["bytes_per_object"]
+        after = report[kind]["after"]["bytes_per_object"]
+        saved = 1 - after / before if before else 0.0
+        report[kind]["saved"] = round(saved, 3)
+        print(f"{kind:8}{before:>14.1f}{after:>14.1f}{saved:>9.1%}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+"""
+检索质量与延迟基准测试
+
+生成合成的中文小说设定库（人物、地点、物品）及带标注的查询，
+对各检索模式测量建索引耗时、查询延迟分位数、内存增量与 recall@k，
+结果写入 JSON 报告，可与历史报告对比。
+
+用法：
+    python scripts/benchmark_retrieval.py --scales 1000,10000 --output report.json
+    python scripts/benchmark_retrieval.py --modes bm25,numpy:int8+rerank --baseline old.json
+
+检索模式：
+    bm25                 仅关键词（BM25Index）
+    chroma               VectorStore + chroma 后端
+    numpy[:<dtype>]      VectorStore + NumPy 后端，dtype 为 float32/float16/int8/int8+rerank
+    knowledge            KnowledgeManager 混合检索（BM25 + 向量，RRF 融合）
+
+默认使用确定性的二元组哈希嵌入（无需下载模型），衡量的是索引与检索本身；
+--embedder model 改用 settings.embedding_model 的真实模型。
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+# 添加backend目录到Python路径
+backend_path = Path(__file__).parent.parent / "backend"
+sys.path.insert(0, str(backend_path))
+
+from loguru import logger
+
+from core.memory.retrieval import BM25Index
+
+DEFAULT_MODES = "bm25,numpy:float16,numpy:int8+rerank,knowledge"
+
+# ----------------------------------------------------------------------
+# 合成数据
+# ----------------------------------------------------------------------
+
+SURNAMES = list("李王张刘陈杨赵黄周吴徐孙胡朱高林何郭马罗梁宋郑谢韩唐冯于董萧程曹袁邓许傅沈曾彭吕苏卢蒋蔡贾丁魏薛叶阎余潘杜戴夏钟汪田任姜范方石姚谭")
+GIVEN = list("云风雪月霜星辰华清明玉瑶琴剑书墨竹松梅兰菊若晴天宇轩逸凌寒影青紫白灵秋春冬夏尘岚霄霖泽川海峰岳河溪辰曦暮晓烟雨露虹瑾瑜璃琳思远念安")
+SECTS = ["青云门", "天音寺", "焚香谷", "万毒门", "合欢派", "长生堂", "鬼王宗", "昆仑派", "峨眉派", "逍遥宫"]
+ROLES = ["掌门", "长老", "首席弟子", "外门弟子", "护法", "客卿", "叛徒", "隐士"]
+SKILLS = ["御剑术", "炼丹", "阵法", "符箓", "琴音杀伐", "毒术", "拳掌", "轻功", "傀儡术", "推演天机"]
+TRAITS = ["性情冷傲", "温润如玉", "嫉恶如仇", "贪财好色", "沉默寡言", "心机深沉", "豪爽仗义", "胆小怕事"]
+PLACE_HEADS = list("苍碧赤玄金银幽寒落断望归栖龙凤鹤")
+PLACE_BODIES = list("霞云松石月星风雷雾水")
+PLACE_TAILS = ["山", "谷", "城", "岭", "湖", "崖", "洞", "渊", "镇", "关"]
+REGIONS = ["东海之滨", "西域大漠", "南疆密林", "北地冰原", "中州腹地"]
+FEATURES = ["终年云雾缭绕", "灵气极为充沛", "妖兽横行", "常有商旅往来", "埋藏上古遗迹"]
+ITEM_HEADS = list("诛仙斩天玄冥紫电青霜赤焰寒冰破军镇魂")
+ITEM_KINDS = ["剑", "刀", "镜", "珠", "铃", "印", "扇", "琴", "鼎", "戒"]
+GRADES = ["上古", "灵品", "仙品", "魔道", "凡品"]
+EFFECTS = ["可斩妖除魔", "能摄人心魄", "可护主周全", "能炼化百毒", "可穿梭虚空"]
+
+
+def _compose(index: int, parts: List[List[str]]) -> str:
+    """按混合进制把序号映射为唯一名称（超出容量时追加位）"""
+    name = []
+    for part in parts:
+        index, digit = divmod(index, len(part))
+        name.append(part[digit])
+    while index:
+        index, digit = divmod(index - 1, len(parts[-1]))
+        name.append(parts[-1][digit])
+    return "".join(name)
+
+
+def generate_corpus(size: int, num_queries: int, seed: int = 0) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    生成设定库与带标注的查询
+
+    Returns:
+        (entries, queries): entries 每项含 id、content、category；
+        queries 每项含 text 与 relevant（相关条目ID集合）
+    """
+    rng = random.Random(seed)
+    n_places = max(1, size // 5)
+    n_items = max(1, size // 5)
+    n_characters = max(1, size - n_places - n_items)
+
+    places = [_compose(i, [PLACE_HEADS, PLACE_BODIES, PLACE_TAILS]) for i in range(n_places)]
+    characters = [_compose(i, [SURNAMES, GIVEN, GIVEN]) for i in range(n_characters)]
+    items = [
+        _compose(i // len(ITEM_KINDS), [ITEM_HEADS, ITEM_HEADS]) + ITEM_KINDS[i % len(ITEM_KINDS)]
+        for i in range(n_items)
+    ]
+
+    entries: List[Dict[str, Any]] = []
+    queries: List[Dict[str, Any]] = []
+    facts: Dict[str, Dict[str, str]] = {}
+
+    for name in characters:
+        sect, role, skill, trait, place = (
+            rng.choice(SECTS), rng.choice(ROLES), rng.choice(SKILLS), rng.choice(TRAITS), rng.choice(places)
+        )
+        doc_id = f"character_{len(entries)}"
+        facts[doc_id] = {"name": name, "sect": sect, "skill": skill, "place": place}
+        entries.append({
+            "id": doc_id,
+            "category": "character",
+            "content": f"{name}是{sect}的{role}，{trait}，擅长{skill}，常在{place}一带出没。"
+        })
+    for name in places:
+        doc_id = f"world_{len(entries)}"
+        facts[doc_id] = {"name": name}
+        entries.append({
+            "id": doc_id,
+            "category": "world",
+            "content": f"{name}位于{rng.choice(REGIONS)}，{rng.choice(FEATURES)}，是{rng.choice(SECTS)}的据点。"
+        })
+    for name in items:
+        doc_id = f"detail_{len(entries)}"
+        facts[doc_id] = {"name": name}
+        entries.append({
+            "id": doc_id,
+            "category": "detail",
+            "content": f"{name}是一件{rng.choice(GRADES)}法宝，{rng.choice(EFFECTS)}，如今由{rng.choice(characters)}持有。"
+        })
+
+    templates = {
+        "character": ["{name}擅长什么？", "{name}是哪个门派的人", "介绍一下{name}的性格"],
+        "world": ["{name}在什么地方？", "{name}有什么特点"],
+        "detail": ["{name}有什么用", "{name}现在在谁手里"],
+    }
+    for entry in rng.sample(entries, min(num_queries, len(entries))):
+        fact = facts[entry["id"]]
+        queries.append({
+            "text": rng.choice(templates[entry["category"]]).format(**fact),
+            "relevant": [entry["id"]]
+        })
+    return entries, queries
+
+
+# ----------------------------------------------------------------------
+# 嵌入与存储
+# ----------------------------------------------------------------------
+
+class HashingEmbedder:
+    """确定性的中文二元组哈希嵌入"""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.model_name = f"benchmark-hashing-{dim}"
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for a, b in zip(text, text[1:]):
+                vectors[i, zlib.crc32((a + b).encode("utf-8")) % self.dim] += 1.0
+        return vectors
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return self.encode(input).tolist()
+
+
+class SQLiteDB:
+    """基于 sqlite3 的最小数据库客户端（供 KnowledgeManager 使用）"""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+
+    def execute(self, query, params=None):
+        cursor = self.conn.execute(query, params or ())
+        self.conn.commit()
+        return cursor
+
+    def executemany(self, query, rows):
+        with self.conn:
+            self.conn.executemany(query, rows)
+
+    def fetchall(self, query, params=None):
+        return self.conn.execute(query, params or ()).fetchall()
+
+
+def _rss_mb() -> float:
+    """当前进程常驻内存（MB）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        import resource  # 非 Linux：退化为峰值常驻内存
+        scale = 2 ** 20 if sys.platform == "darwin" else 2 ** 10
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def _vector_store(mode: str, workdir: str, embedder):
+    from database.vector_store import VectorStore
+
+    backend, _, dtype = mode.partition(":")
+    options: Dict[str, Any] = {}
+    if backend == "numpy":
+        dtype = dtype or "float16"
+        options = {"dtype": dtype.replace("+rerank", ""), "rerank": dtype.endswith("+rerank")}
+    return VectorStore(
+        collection_name="benchmark",
+        persist_directory=workdir,
+        embedding_function=embedder,
+        use_embedding_cache=False,
+        backend=backend,
+        backend_options=options
+    )
+
+
+class Runner:
+    """单个检索模式：build 建索引，search 返回条目ID列表"""
+
+    def __init__(self, mode: str, workdir: str, embedder, batch_size: int = 512):
+        self.mode = mode
+        self.workdir = workdir
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.store = None
+        self.index = None
+        self.manager = None
+        self._id_of_content: Dict[str, str] = {}
+
+    async def build(self, entries: List[Dict[str, Any]]):
+        if self.mode == "bm25":
+            self.index = BM25Index()
+            for entry in entries:
+                self.index.add(entry["id"], entry["content"], group=entry["category"])
+            return
+
+        if self.mode == "knowledge":
+            from core.memory.knowledge_manager import KnowledgeManager
+
+            self.store = _vector_store("numpy", self.workdir, self.embedder)
+            db = SQLiteDB(os.path.join(self.workdir, "knowledge.db"))
+            self.manager = KnowledgeManager(self.store, db, None, project_id="benchmark")
+            self._id_of_content = {entry["content"]: entry["id"] for entry in entries}
+            await self.manager.add_knowledge_bulk(
+                [{"content": e["content"], "category": e["category"]} for e in entries],
+                batch_size=self.batch_size
+            )
+            return
+
+        self.store = _vector_store(self.mode, self.workdir, self.embedder)
+        for start in range(0, len(entries), self.batch_size):
+            batch = entries[start:start + self.batch_size]
+            await self.store.add_texts(
+                [e["content"] for e in batch],
+                [{"category": e["category"]} for e in batch],
+                [e["id"] for e in batch]
+            )
+
+    async def search(self, query: str, k: int) -> List[str]:
+        if self.index is not None:
+            return [doc_id for doc_id, _ in self.index.search(query, top_k=k)]
+        if self.manager is not None:
+            contents = await self.manager.retrieve_context(query, top_k=k)
+            return [self._id_of_content.get(content) for content in contents]
+        return [hit["id"] for hit in await self.store.search(query, top_k=k)]
+
+    def reset_caches(self):
+        """清空检索结果缓存，保证计时的每条查询都真正执行检索"""
+        if self.manager is not None:
+            self.manager._retrieval_cache.clear()
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+
+# ----------------------------------------------------------------------
+# 测量
+# ----------------------------------------------------------------------
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    p50, p95, p99 = np.percentile(np.asarray(samples) * 1000, [50, 95, 99])
+    return {"p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3)}
+
+
+async def run_mode(
+    mode: str,
+    entries: List[Dict[str, Any]],
+    queries: List[Dict[str, Any]],
+    ks: List[int],
+    embedder,
+    warmup: int = 5
+) -> Dict[str, Any]:
+    """对单个模式建索引并执行全部查询"""
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    runner = Runner(mode, workdir, embedder)
+    try:
+        gc.collect()
+        rss_before = _rss_mb()
+        start = time.perf_counter()
+        await runner.build(entries)
+        build_seconds = time.perf_counter() - start
+        gc.collect()
+        memory_mb = _rss_mb() - rss_before
+
+        # 预热用设定正文作查询，与计时的问句不重叠，避免命中检索缓存
+        k_max = max(ks)
+        for entry in random.Random(len(entries)).sample(entries, min(warmup, len(entries))):
+            await runner.search(entry["content"], k_max)
+        runner.reset_caches()
+
+        latencies: List[float] = []
+        recall = {k: 0.0 for k in ks}
+        for query in queries:
+            start = time.perf_counter()
+            hits = await runner.search(query["text"], k_max)
+            latencies.append(time.perf_counter() - start)
+
+            relevant: Set[str] = set(query["relevant"])
+            for k in ks:
+                recall[k] += len(relevant.intersection(hits[:k])) / len(relevant)
+
+        return {
+            "mode": mode,
+            "build_seconds": round(build_seconds, 3),
+            "memory_mb": round(memory_mb, 1),
+            "latency_ms": _percentiles(latencies),
+            "recall": {f"@{k}": round(total / len(queries), 4) for k, total in recall.items()}
+        }
+    finally:
+        runner.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=str(backend_path),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]):
+    """打印与基线报告的差异（延迟与内存为比值，召回为差值）"""
+    previous = {(r["size"], r["mode"]): r for r in baseline.get("results", [])}
+    for result in report["results"]:
+        old = previous.get((result["size"], result["mode"]))
+        if old is None:
+            continue
+        p95 = result["latency_ms"]["p95"] / max(old["latency_ms"]["p95"], 1e-9)
+        build = result["build_seconds"] / max(old["build_seconds"], 1e-9)
+        recall = {
+            key: round(value - old["recall"].get(key, 0.0), 4)
+            for key, value in result["recall"].items()
+        }
+        logger.info(
+            f"{result['size']:>8} {result['mode']:<20} p95 ×{p95:.2f}  build ×{build:.2f}  recall Δ {recall}"
+        )
+
+
+async def benchmark(args) -> Dict[str, Any]:
+    if args.embedder == "model":
+        from config.settings import settings
+        from database.embeddings import get_embedder
+
+        embedder = get_embedder(settings.embedding_model)
+    else:
+        embedder = HashingEmbedder(args.dim)
+
+    ks = [int(k) for k in args.k.split(",")]
+    results = []
+    for size in (int(s) for s in args.scales.split(",")):
+        entries, queries = generate_corpus(size, args.queries, seed=args.seed)
+        logger.info(f"规模 {size}: {len(entries)} 条设定, {len(queries)} 条查询")
+        for mode in args.modes.split(","):
+            try:
+                result = await run_mode(mode, entries, queries, ks, embedder)
+            except Exception as e:
+                logger.error(f"❌ {mode} @ {size} 失败: {e}")
+                continue
+            result["size"] = size
+            results.append(result)
+            logger.info(
+                f"{size:>8} {mode:<20} build {result['build_seconds']:.2f}s  "
+                f"p50/p95/p99 {result['latency_ms']['p50']}/{result['latency_ms']['p95']}/"
+                f"{result['latency_ms']['p99']}ms  mem {result['memory_mb']}MB  recall {result['recall']}"
+            )
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "embedder": getattr(embedder, "model_name", args.embedder),
+            "seed": args.seed,
+            "queries": args.queries,
+        },
+        "results": results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检索质量与延迟基准测试")
+    parser.add_argument("--scales", default="1000,10000", help="设定库规模（逗号分隔，如 1000,10000,100000,1000000）")
+    parser.add_argument("--modes", default=DEFAULT_MODES, help="检索模式（逗号分隔）")
+    parser.add_argument("--queries", type=int, default=200, help="每个规模的查询数")
+    parser.add_argument("--k", default="1,5,10", help="recall@k 的 k 值（逗号分隔）")
+    parser.add_argument("--embedder", choices=["hashing", "model"], default="hashing", help="嵌入方式")
+    parser.add_argument("--dim", type=int, default=384, help="哈希嵌入维度")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--output", default="benchmark_retrieval.json", help="JSON 报告路径")
+    parser.add_argument("--baseline", help="对比的历史报告路径")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO", filter=lambda record: record["name"] == "__main__")
+
+    report = asyncio.run(benchmark(args))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logger.info(f"✅ 报告已写入 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+测试中文切块
+"""
+import sys
+import os
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from database.chunker import Chunker, iter_sentences
+
+
+CHAPTER = (
+    "第一章 风起\n"
+    "\n"
+    "他说：“你好。”她笑了笑：“好久不见！”“是啊……”\n"
+    "天色渐暗。远处传来钟声？没有人回答。\n"
+)
+
+
+def test_iter_sentences():
+    sentences = list(iter_sentences(CHAPTER))
+    texts = [text for text, _, _ in sentences]
+    assert texts == [
+        "第一章 风起",
+        "他说：“你好。”",
+        "她笑了笑：“好久不见！”",
+        "“是啊……”",
+        "天色渐暗。",
+        "远处传来钟声？",
+        "没有人回答。",
+    ]
+    # 偏移相对于整章文本，段落序号跳过空行
+    for text, start, _ in sentences:
+        assert CHAPTER[start:start + len(text)] == text
+    assert [paragraph for _, _, paragraph in sentences] == [0, 1, 1, 1, 2, 2, 2]
+
+    # 按行流式输入与整章输入结果一致
+    assert list(iter_sentences(iter(CHAPTER.splitlines(keepends=True)))) == sentences
+
+
+def test_chunker_target_size_and_overlap():
+    chunks = list(Chunker(target_size=20, overlap=8).split(CHAPTER, chapter=1))
+    assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+    assert chunks[0].text == "第一章 风起\n他说：“你好。”"
+    # 相邻块以整句重叠
+    assert chunks[1].text.startswith("他说：“你好。”")
+    for chunk in chunks:
+        assert CHAPTER[chunk.char_start:chunk.char_end].replace("\n", "") == chunk.text.replace("\n", "")
+        assert chunk.metadata()["chapter"] == 1 and "text" not in chunk.metadata()
+    assert chunks[-1].text.endswith("没有人回答。") and chunks[-1].paragraph_end == 2
+
+    # 无重叠时块首尾相接，覆盖全部句子
+    plain = list(Chunker(target_size=20, overlap=0).split(CHAPTER))
+    assert "".join(chunk.text.replace("\n", "") for chunk in plain) == CHAPTER.replace("\n", "")
+
+
+def test_chunker_long_sentence_and_linear_time():
+    chunker = Chunker(target_size=50, overlap=10)
+    long_sentence = "无" * 500 + "。"
+    chunks = list(chunker.split(long_sentence))
+    assert all(len(chunk.text) <= 50 for chunk in chunks)
+    assert "".join(chunk.text for chunk in chunks) == long_sentence
+
+    text = CHAPTER * 20000
+    start = time.perf_counter()
+    count = sum(1 for _ in Chunker().split(text))
+    elapsed = time.perf_counter() - start
+    print(f"Chunked {len(text)} chars into {count} chunks in {elapsed:.2f}s")
+    assert count > 1000 and elapsed < 5
+
+
+if __name__ == "__main__":
+    test_iter_sentences()
+    test_chunker_target_size_and_overlap()
+    test_chunker_long_sentence_and_linear_time()
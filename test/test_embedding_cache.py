@@ -0,0 +1,72 @@
+"""
+测试嵌入模型注册表与持久化嵌入缓存
+"""
+import sys
+import os
+import tempfile
+import shutil
+
+import numpy as np
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from database.embedding_cache import CachedEmbedder, EmbeddingCache, text_digest
+from database.embeddings import embedding_stats, get_embedder
+
+
+class CountingEmbedder:
+    """记录调用次数的确定性嵌入函数"""
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.embedded = 0
+
+    def __call__(self, texts):
+        self.embedded += len(texts)
+        rng = [np.random.RandomState(abs(hash(t)) % (2 ** 32)) for t in texts]
+        return np.stack([r.rand(self.dim) for r in rng]).astype(np.float32)
+
+
+def test_embedder_registry_is_shared_and_lazy():
+    first = get_embedder("registry-test-model")
+    assert get_embedder("registry-test-model") is first
+    assert not first.loaded
+    assert embedding_stats()["registry-test-model"] is None
+
+
+def test_embedding_cache_roundtrip():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        model = CountingEmbedder()
+        cache = EmbeddingCache(temp_dir, "test/model", initial_capacity=4)
+        embedder = CachedEmbedder(model, cache)
+
+        texts = [f"第{i}章 林风踏入剑宗" for i in range(10)]
+        first = embedder.encode(texts + texts[:3])
+        assert model.embedded == 10, "批内重复文本只嵌入一次"
+        assert first.shape == (13, 8) and first.dtype == np.float32
+
+        # 全部命中时不调用模型
+        again = embedder.encode(texts)
+        assert model.embedded == 10
+        np.testing.assert_allclose(again, first[:10], atol=1e-3)
+
+        # 重启后从磁盘恢复（float16 存储）
+        reopened = EmbeddingCache(temp_dir, "test/model")
+        assert len(reopened) == 10 and reopened.dtype == np.float16
+        rows = reopened.lookup([text_digest(texts[5]), text_digest("未出现的文本")])
+        assert rows[0] >= 0 and rows[1] == -1
+        np.testing.assert_allclose(reopened.read(rows[:1])[0], first[5], atol=1e-3)
+
+        # 部分命中时只嵌入新文本
+        restarted = CachedEmbedder(model, reopened)
+        restarted.encode(texts[:5] + ["新增段落"])
+        assert model.embedded == 11 and restarted.hits == 5
+        print("✅ Embedding cache tests passed!")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_embedder_registry_is_shared_and_lazy()
+    test_embedding_cache_roundtrip()
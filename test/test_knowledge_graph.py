@@ -4,14 +4,45 @@
 import sys
 import os
 import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
 
 # Add backend to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
+from core.memory.entity_aliases import AliasTable
+from core.memory.entity_mentions import Mention, MentionIndex
+from core.memory.graph_index import AdjacencyIndex
 from core.memory.knowledge_graph import KnowledgeGraph, Relation
-from core.llm.litellm_client import LiteLLMClient
+
+
+class SQLiteDB:
+    """基于 sqlite3 的最小数据库客户端"""
+    def __init__(self):
+        # KnowledgeGraph 在专用线程中访问连接
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.statements = 0
+
+    def execute(self, query, params=None):
+        self.statements += 1
+        self.conn.execute(query, params or ())
+        self.conn.commit()
+
+    def executemany(self, query, rows):
+        self.statements += 1
+        with self.conn:
+            self.conn.executemany(query, rows)
+
+    def fetchall(self, query, params=None):
+        return self.conn.execute(query, params or ()).fetchall()
+
 
 async def test_knowledge_graph():
+    from core.llm.litellm_client import LiteLLMClient
+
     print("Testing KnowledgeGraph...")
 
     # Mock DB client (in real implementation, this would be a database connection)
@@ -64,5 +95,465 @@ async def test_knowledge_graph():
 
     print("✅ KnowledgeGraph test completed!")
 
+async def run_indexed_relations():
+    db = SQLiteDB()
+    kg = KnowledgeGraph(db)
+
+    await kg.add_relation("李逍遥", "赵灵儿", "夫妻", "仙灵岛结缘")
+    await kg.add_relation("李逍遥", "赵灵儿", "夫妻", "重复三元组")
+    await kg.add_relation("林月如", "李逍遥", "爱慕")
+    await kg.add_relation("李逍遥", "李逍遥", "自省")
+    assert db.fetchall("SELECT COUNT(*) FROM entity_relations")[0][0] == 3
+
+    related = await kg.get_related_entities("李逍遥")
+    assert {(r.source, r.relation, r.target) for r in related} == {
+        ("李逍遥", "夫妻", "赵灵儿"), ("林月如", "爱慕", "李逍遥"), ("李逍遥", "自省", "李逍遥")
+    }
+    related = await kg.get_related_entities("李逍遥", relation_type="爱慕")
+    assert [(r.source, r.target) for r in related] == [("林月如", "李逍遥")]
+
+    # 两侧查询均走索引
+    plan = " ".join(
+        row[-1] for row in db.fetchall(
+            "EXPLAIN QUERY PLAN SELECT source, target, relation, description FROM entity_relations "
+            "WHERE source = ? AND relation = ? UNION "
+            "SELECT source, target, relation, description FROM entity_relations WHERE target = ? AND relation = ?",
+            ("a", "r", "a", "r")
+        )
+    )
+    assert "idx_entity_relations_span" in plan and "idx_entity_relations_target" in plan
+    assert "SCAN entity_relations" not in plan
+
+
+def test_indexed_relations():
+    asyncio.run(run_indexed_relations())
+
+
+async def run_bulk_relations():
+    db = SQLiteDB()
+    kg = KnowledgeGraph(db)
+    await kg.add_relation("A", "B", "knows", "old")
+
+    relations = [Relation(f"角色{i}", f"角色{i + 1}", "师徒") for i in range(500)]
+    relations.append({"source": "A", "target": "B", "relation": "knows", "description": "new"})
+    relations.append(("A", "C", "knows"))
+
+    before = db.statements
+    assert await kg.add_relations_bulk(relations) == 502
+    assert db.statements - before == 1  # 一次 executemany，一个事务
+
+    # 冲突时更新描述，不产生重复行
+    assert await kg.add_relations_bulk(relations[:10]) == 10
+    assert db.fetchall("SELECT COUNT(*) FROM entity_relations")[0][0] == 502
+    assert db.fetchall("SELECT description FROM entity_relations WHERE source = 'A' AND target = 'B'") == [("new",)]
+    assert await kg.add_relations_bulk([]) == 0
+
+    # 数据库调用不在事件循环线程执行
+    loop_thread = threading.get_ident()
+    seen = []
+    original = db.fetchall
+    db.fetchall = lambda *args: seen.append(threading.get_ident()) or original(*args)
+    await kg.get_related_entities("A")
+    assert seen and seen[0] != loop_thread
+    kg.close()
+
+
+def test_bulk_relations():
+    asyncio.run(run_bulk_relations())
+
+
+def test_adjacency_index():
+    index = AdjacencyIndex(rebuild_threshold=2)
+    index.add_many([
+        ("林风", "苏瑶", "师兄妹"),
+        ("苏瑶", "魔尊", "仇敌"),
+        ("魔尊", "血刀", "持有"),
+        ("掌门", "林风", "师徒"),
+        ("林风", "苏瑶", "师兄妹"),
+    ])
+    assert len(index) == 4
+
+    assert index.neighbors("林风", hops=2) == {"苏瑶": 1, "掌门": 1, "魔尊": 2}
+    assert index.neighbors("林风", hops=2, direction="out") == {"苏瑶": 1, "魔尊": 2}
+    assert index.neighbors("林风", hops=3, relations=["师兄妹", "师徒"]) == {"苏瑶": 1, "掌门": 1}
+    assert index.neighbors("无名氏") == {}
+
+    assert index.shortest_path("掌门", "血刀") == ["掌门", "林风", "苏瑶", "魔尊", "血刀"]
+    assert index.shortest_path("血刀", "掌门", direction="out") is None
+    assert index.shortest_path("血刀", "掌门", direction="in") == ["血刀", "魔尊", "苏瑶", "林风", "掌门"]
+    assert index.shortest_path("掌门", "血刀", max_hops=3) is None
+    assert index.shortest_path("掌门", "血刀", relations=["师徒", "师兄妹"]) is None
+
+    # 未合并的新边立即可见；删除后重建
+    index.add("血刀", "掌门", "克制")
+    assert index.shortest_path("掌门", "血刀") == ["掌门", "血刀"]
+    assert index.remove("血刀", "掌门", "克制")
+    assert not index.remove("血刀", "掌门", "克制")
+    assert len(index.shortest_path("掌门", "血刀")) == 5
+
+
+def test_adjacency_index_latency():
+    rng = random.Random(0)
+    index = AdjacencyIndex()
+    index.add_many(
+        (f"e{rng.randrange(20000)}", f"e{rng.randrange(20000)}", f"r{rng.randrange(10)}")
+        for _ in range(200000)
+    )
+    start = time.perf_counter()
+    for i in range(100):
+        index.neighbors(f"e{i}", hops=2)
+        index.shortest_path(f"e{i}", f"e{i + 1000}")
+    elapsed = (time.perf_counter() - start) / 100
+    print(f"2-hop + shortest path on 200k edges: {elapsed * 1e6:.0f}us")
+    assert elapsed < 0.05
+
+
+async def run_graph_traversal():
+    db = SQLiteDB()
+    kg = KnowledgeGraph(db)
+    await kg.add_relations_bulk([
+        ("林风", "苏瑶", "师兄妹"),
+        ("苏瑶", "魔尊", "仇敌"),
+    ])
+
+    # 延迟加载已有关系，之后的写入同步到索引
+    assert await kg.neighborhood("林风") == {"苏瑶": 1, "魔尊": 2}
+    await kg.add_relation("魔尊", "血刀", "持有")
+    assert await kg.find_path("林风", "血刀") == ["林风", "苏瑶", "魔尊", "血刀"]
+    assert await kg.neighborhood("林风", hops=3, relation_types=["师兄妹"]) == {"苏瑶": 1}
+
+    # 新实例从数据库重建索引
+    reloaded = KnowledgeGraph(db)
+    assert await reloaded.find_path("血刀", "林风") == ["血刀", "魔尊", "苏瑶", "林风"]
+    kg.close()
+    reloaded.close()
+
+
+def test_graph_traversal():
+    asyncio.run(run_graph_traversal())
+
+
+def test_unique_index_migrates_duplicate_rows():
+    db = SQLiteDB()
+    db.execute("""
+    CREATE TABLE entity_relations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        source TEXT NOT NULL,
+        target TEXT NOT NULL,
+        relation TEXT NOT NULL,
+        description TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    for description in ("first", "second"):
+        db.execute(
+            "INSERT INTO entity_relations (source, target, relation, description) VALUES (?, ?, ?, ?)",
+            ("A", "B", "knows", description)
+        )
+
+    KnowledgeGraph(db)
+    # 旧表补齐时间段列，原有关系视为全程有效
+    assert db.fetchall("SELECT description, valid_from, valid_to FROM entity_relations") == [("first", 0, None)]
+
+
+async def run_relation_intervals():
+    db = SQLiteDB()
+    kg = KnowledgeGraph(db)
+    await kg.add_relation("林风", "苏瑶", "盟友", "并肩作战", valid_from=10)
+    await kg.add_relation("苏瑶", "魔尊", "仇敌")
+    assert await kg.neighborhood("林风", as_of_chapter=200) == {"苏瑶": 1, "魔尊": 2}
+
+    # 第 300 章反目，第 301 章起为敌
+    assert await kg.end_relation("林风", "苏瑶", "盟友", 300)
+    await kg.add_relation("林风", "苏瑶", "敌人", valid_from=301)
+
+    async def relations(chapter):
+        return {r.relation for r in await kg.get_related_entities("林风", as_of_chapter=chapter)}
+
+    assert await relations(5) == set()
+    assert await relations(300) == {"盟友"}
+    assert await relations(301) == {"敌人"}
+    assert {r.relation for r in await kg.get_related_entities("林风")} == {"盟友", "敌人"}
+
+    # 索引与数据库一致；重新加载后仍按时间段过滤
+    for graph in (kg, KnowledgeGraph(db)):
+        assert await graph.find_path("林风", "魔尊", relation_types=["盟友", "仇敌"], as_of_chapter=300) \
+            == ["林风", "苏瑶", "魔尊"]
+        assert await graph.find_path("林风", "魔尊", relation_types=["盟友", "仇敌"], as_of_chapter=301) is None
+        assert await graph.neighborhood("林风", hops=1, as_of_chapter=5) == {}
+
+    snapshot = await kg.relations_as_of(301)
+    assert {(r.source, r.relation, r.target) for r in snapshot} == {("林风", "敌人", "苏瑶"), ("苏瑶", "仇敌", "魔尊")}
+    assert [r.relation for r in await kg.relations_as_of(300, entities=["魔尊"])] == ["仇敌"]
+    assert all(r.valid_at(301) for r in snapshot)
+
+    # 按实体的章节快照两侧都走实体索引（章节条件在命中行上过滤）
+    for column in ("source", "target"):
+        plan = db.fetchall(
+            f"EXPLAIN QUERY PLAN SELECT {kg._COLUMNS} FROM entity_relations "
+            f"WHERE {column} = ? AND {kg._VALID_AT_SQL}",
+            ("林风", 301, 301)
+        )
+        assert "USING INDEX" in plan[0][-1] and f"({column}=?)" in plan[0][-1]
+
+    # 同一关系可有多个时间段（和好后再次结盟）
+    await kg.add_relations_bulk([("林风", "苏瑶", "盟友", "重归于好", 500)])
+    assert await relations(600) == {"盟友", "敌人"}
+    assert db.fetchall("SELECT COUNT(*) FROM entity_relations WHERE relation = '盟友'")[0][0] == 2
+    kg.close()
+
+
+def test_relation_intervals():
+    asyncio.run(run_relation_intervals())
+
+
+async def run_readd_ended_relation():
+    db = SQLiteDB()
+    kg = KnowledgeGraph(db)
+    await kg.add_relation("林风", "苏瑶", "盟友", "并肩作战", valid_from=10)
+    assert await kg.neighborhood("林风", as_of_chapter=400) == {"苏瑶": 1}  # 加载邻接索引
+    assert await kg.end_relation("林风", "苏瑶", "盟友", 300)
+
+    # 重新写入（如重复抽取）只更新描述，不重新打开已结束的关系
+    await kg.add_relations_bulk([("林风", "苏瑶", "盟友", "生死之交", 10)])
+    await kg.add_relation("林风", "苏瑶", "盟友", "生死之交", valid_from=10)
+    assert db.fetchall("SELECT description, valid_to FROM entity_relations") == [("生死之交", 300)]
+    for graph in (kg, KnowledgeGraph(db)):
+        assert await graph.relations_as_of(400) == []
+        assert await graph.neighborhood("林风", as_of_chapter=400) == {}
+        assert await graph.neighborhood("林风", as_of_chapter=300) == {"苏瑶": 1}
+
+    # 显式给出结束章节时仍会更新
+    await kg.add_relations_bulk([("林风", "苏瑶", "盟友", "生死之交", 10, 350)])
+    assert [r.valid_to for r in await kg.relations_as_of(320)] == [350]
+    assert await kg.neighborhood("林风", as_of_chapter=340) == {"苏瑶": 1}
+    kg.close()
+
+
+def test_readd_ended_relation():
+    asyncio.run(run_readd_ended_relation())
+
+
+def test_alias_table():
+    table = AliasTable({"林风": ["林师兄", "风儿"], "苏瑶": ["瑶儿"]})
+    assert table.canonicalize("林师兄") == "林风"
+    assert table.canonicalize(" “风儿” ") == "林风"
+    assert table.canonicalize("苏瑶师妹") == "苏瑶"  # 已知名字 + 称谓
+    assert table.canonicalize("苏瑶剑") == "苏瑶剑"  # 非称谓后缀不归一
+    assert table.canonicalize("魔尊") == "魔尊"
+    assert sorted(table.aliases_of("林风")) == ["林师兄", "风儿"]
+    assert table.add("林风", ["风儿"]) == []
+    assert "瑶儿" in table and len(table) == 5
+
+
+class FakeLLM:
+    """按文本中出现的人物返回关系，记录并发峰值"""
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.calls = 0
+        self.prompts = []
+
+    async def generate(self, prompt):
+        self.calls += 1
+        self.prompts.append(prompt)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        if "走火入魔" in prompt:
+            return "无法解析"
+        relations = []
+        if "林师兄" in prompt:
+            relations.append({"source": "林师兄", "target": "苏瑶", "relation": "师兄妹", "description": "同门"})
+        if "风儿" in prompt:
+            relations.append({"source": "风儿", "target": "瑶儿", "relation": "师兄妹", "description": "同门学艺多年"})
+            relations.append({"source": "风儿", "target": "林风", "relation": "自己", "description": ""})
+        return "```json\n" + json.dumps(relations, ensure_ascii=False) + "\n```"
+
+
+async def run_chapter_extraction():
+    from database.chunker import Chunker
+
+    db = SQLiteDB()
+    kg = KnowledgeGraph(db)
+    assert await kg.add_aliases("林风", ["林师兄", "风儿"]) == 3
+    await kg.add_aliases("苏瑶", ["瑶儿"])
+
+    paragraphs = ["林师兄与苏瑶在后山练剑。"] * 10 + ["他险些走火入魔。"] + ["风儿，瑶儿一路同行。"] * 10
+    llm = FakeLLM()
+    relations = await kg.extract_chapter_relations(
+        "\n".join(paragraphs), llm, 12, chunker=Chunker(target_size=30, overlap=0), max_concurrency=3
+    )
+    assert llm.calls > 3 and llm.peak == 3
+
+    # 别名归一、重复三元组合并（保留较详细描述）、丢弃自环
+    assert [(r.source, r.relation, r.target, r.description) for r in relations] == [
+        ("林风", "师兄妹", "苏瑶", "同门学艺多年")
+    ]
+    assert db.fetchall("SELECT source, target, description, valid_from FROM entity_relations") == [
+        ("林风", "苏瑶", "同门学艺多年", 12)
+    ]
+
+    # 默认切块不超过提示词截取长度：无标点的长段落也不会被截掉
+    llm = FakeLLM()
+    await kg.extract_chapter_relations("嗡" * 5000 + "。林师兄与苏瑶在后山练剑。", llm, 13)
+    assert sum(prompt.count("嗡") for prompt in llm.prompts) >= 5000
+    assert any("林师兄" in prompt for prompt in llm.prompts)
+
+    # 别名持久化
+    reloaded = KnowledgeGraph(db)
+    assert await reloaded.canonicalize("瑶儿") == "苏瑶"
+    kg.close()
+    reloaded.close()
+
+
+def test_chapter_extraction():
+    asyncio.run(run_chapter_extraction())
+
+
+async def run_reextract_across_chapters():
+    db = SQLiteDB()
+    kg = KnowledgeGraph(db)
+    await kg.add_aliases("林风", ["林师兄"])
+    assert await kg.neighborhood("林风") == {}  # 加载邻接索引
+
+    # 后续章节重复抽取到同一关系：只保留一个未结束的时间段
+    for chapter in (1, 2, 3):
+        await kg.extract_chapter_relations("林师兄与苏瑶在后山练剑。", FakeLLM(), chapter)
+    assert db.fetchall("SELECT valid_from, valid_to FROM entity_relations") == [(1, None)]
+    for graph in (kg, KnowledgeGraph(db)):
+        assert [(r.source, r.target, r.valid_from) for r in await graph.relations_as_of(5)] == [("林风", "苏瑶", 1)]
+        assert len(await graph.get_related_entities("林风")) == 1
+        assert len(await graph.get_related_entities("苏瑶", as_of_chapter=5)) == 1
+
+    # 结束之后再次出现才新开一段
+    assert await kg.end_relation("林风", "苏瑶", "师兄妹", 3)
+    await kg.extract_chapter_relations("林师兄与苏瑶在后山练剑。", FakeLLM(), 6)
+    await kg.extract_chapter_relations("林师兄与苏瑶在后山练剑。", FakeLLM(), 7)
+    assert db.fetchall("SELECT valid_from, valid_to FROM entity_relations ORDER BY valid_from") == [(1, 3), (6, None)]
+    assert await kg.neighborhood("林风", as_of_chapter=5) == {}
+    assert await kg.neighborhood("林风", as_of_chapter=7) == {"苏瑶": 1}
+    assert len(await kg.relations_as_of(8)) == 1
+    kg.close()
+
+
+def test_reextract_across_chapters():
+    asyncio.run(run_reextract_across_chapters())
+
+
+def test_mention_index():
+    index = MentionIndex()
+    index.add("林风", ["林师兄", "风儿", "林"])  # 单字称呼不参与匹配
+    index.add("苏瑶", ["瑶儿"])
+    text = "林师兄，瑶儿来了。林风儿时的玩伴苏瑶笑道：“风儿！”"
+    mentions = index.find(text)
+    assert [(m.entity, m.alias) for m in mentions] == [
+        ("林风", "林师兄"), ("苏瑶", "瑶儿"), ("林风", "林风"), ("苏瑶", "苏瑶"), ("林风", "风儿")
+    ]
+    assert all(text[m.start:m.end] == m.alias for m in mentions)
+    assert index.counts(text) == {"林风": 3, "苏瑶": 2}
+
+    # 新增实体后立即可匹配，包括与已有名称共享前缀/后缀的情况
+    index.add("林风雷", ["风雷"])
+    assert [m.entity for m in index.find("林风雷与林风")] == ["林风雷", "林风"]
+    assert Mention("林风雷", "风雷", 1, 3) in index.find("狂风雷动")
+    assert len(index) == 7
+
+
+def test_mention_index_matches_naive_scan():
+    rng = random.Random(0)
+    alphabet = "林风苏瑶魔尊血刀"
+    names = {"".join(rng.choice(alphabet) for _ in range(rng.randint(2, 4))) for _ in range(40)}
+    index = MentionIndex()
+    for name in names:
+        index.add(name)
+    text = "".join(rng.choice(alphabet) for _ in range(2000))
+    expected = sorted(
+        (i, i + len(name), name) for name in names for i in range(len(text)) if text.startswith(name, i)
+    )
+    assert sorted(index.iter_matches(text)) == expected
+
+
+def test_mention_index_incremental():
+    """新增与扫描交替进行：结果与朴素匹配一致，且不会每次重建整个自动机"""
+    rng = random.Random(1)
+    alphabet = "林风苏瑶魔尊血刀"
+    text = "".join(rng.choice(alphabet) for _ in range(500))
+    index = MentionIndex()
+    index._MIN_RECENT = 4  # 频繁并入主自动机，覆盖两级之间的迁移
+    names: dict = {}
+    for step in range(200):
+        name = "".join(rng.choice(alphabet) for _ in range(rng.randint(2, 4)))
+        entity = f"实体{step % 7}"  # 同名改指其它实体
+        index.add_many([(entity, name)])
+        names[name] = entity
+        expected = sorted(
+            (i, i + len(n), e) for n, e in names.items() for i in range(len(text)) if text.startswith(n, i)
+        )
+        assert sorted(index.iter_matches(text)) == expected
+        ends = [end for _, end, _ in index.iter_matches(text)]
+        assert ends == sorted(ends)
+
+    index = MentionIndex()
+    index.add_many((f"角色{i}", f"角色{i}") for i in range(20_000))
+    index.find("角色1")
+    start = time.perf_counter()
+    for i in range(500):
+        index.add(f"新角色{i}", [f"别名{i}"])
+        assert index.find(f"别名{i}出场")[0].entity == f"新角色{i}"
+    elapsed = time.perf_counter() - start
+    print(f"500 interleaved alias adds + scans over 20k names: {elapsed * 1e3:.1f}ms")
+    assert elapsed < 2.0
+
+
+def test_mention_index_latency():
+    index = MentionIndex()
+    rng = random.Random(0)
+    for i in range(5000):
+        index.add(f"角色{i}", [f"{chr(0x4e00 + rng.randrange(2000))}{chr(0x4e00 + rng.randrange(2000))}{i}"])
+    chapter = "".join(chr(0x4e00 + rng.randrange(2000)) for _ in range(5000)) + "角色42与角色4200相遇。"
+    index.find(chapter)  # 构建失败链接
+    start = time.perf_counter()
+    mentions = index.find(chapter)
+    elapsed = time.perf_counter() - start
+    print(f"Scan 5k chars against 10k names: {elapsed * 1e3:.1f}ms")
+    assert {"角色42", "角色4200"} <= {m.entity for m in mentions}
+    assert elapsed < 0.1
+
+
+async def run_kg_mentions():
+    db = SQLiteDB()
+    kg = KnowledgeGraph(db)
+    await kg.add_relation("林风", "苏瑶", "师兄妹")
+    await kg.add_aliases("林风", ["林师兄"])
+    assert await kg.mention_counts("林师兄望向苏瑶，苏瑶不语。") == {"苏瑶": 2, "林风": 1}
+
+    # 已加载后新增的实体与别名同步进入自动机
+    await kg.add_relations_bulk([("魔尊", "血刀", "持有")])
+    await kg.add_aliases("苏瑶", ["瑶儿"])
+    mentions = await kg.find_mentions("瑶儿拔出血刀，直指魔尊。")
+    assert [(m.entity, m.start) for m in mentions] == [("苏瑶", 0), ("血刀", 4), ("魔尊", 9)]
+    kg.close()
+
+
+def test_kg_mentions():
+    asyncio.run(run_kg_mentions())
+
+
 if __name__ == "__main__":
     asyncio.run(test_knowledge_graph())
+    test_indexed_relations()
+    test_bulk_relations()
+    test_adjacency_index()
+    test_adjacency_index_latency()
+    test_graph_traversal()
+    test_unique_index_migrates_duplicate_rows()
+    test_relation_intervals()
+    test_alias_table()
+    test_chapter_extraction()
+    test_reextract_across_chapters()
+    test_mention_index()
+    test_mention_index_matches_naive_scan()
+    test_mention_index_latency()
+    test_kg_mentions()
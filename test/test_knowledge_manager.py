@@ -0,0 +1,485 @@
+"""
+测试知识管理模块
+"""
+import sys
+import os
+import asyncio
+import shutil
+import sqlite3
+import tempfile
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from core.memory.knowledge_manager import KnowledgeManager, KnowledgeType, KnowledgeCategory
+from core.memory.retrieval import BM25Index, tokenize, reciprocal_rank_fusion
+from core.memory.ephemeral_cache import EphemeralCache, content_hash
+
+
+class SQLiteDB:
+    """基于 sqlite3 的最小数据库客户端"""
+    def __init__(self, path=":memory:"):
+        self.conn = sqlite3.connect(path)
+
+    def execute(self, query, params=None):
+        cursor = self.conn.execute(query, params or ())
+        self.conn.commit()
+        return cursor
+
+    def executemany(self, query, rows):
+        with self.conn:
+            self.conn.executemany(query, rows)
+
+    def fetchall(self, query, params=None):
+        return self.conn.execute(query, params or ()).fetchall()
+
+
+class MockVectorStore:
+    """按插入顺序返回的向量库模拟"""
+    def __init__(self):
+        self.docs = {}
+        self.search_calls = 0
+
+    async def add_texts(self, texts, metadatas, ids):
+        for text, metadata, doc_id in zip(texts, metadatas, ids):
+            self.docs[doc_id] = (text, metadata)
+
+    async def search(self, query, top_k=5, filter=None):
+        self.search_calls += 1
+        allowed = None
+        if filter:
+            category = filter["category"]
+            allowed = set(category["$in"]) if isinstance(category, dict) else {category}
+        matches = [
+            {"content": text, "metadata": metadata, "score": 0.0}
+            for text, metadata in self.docs.values()
+            if allowed is None or metadata["category"] in allowed
+        ]
+        return matches[:top_k]
+
+    async def delete(self, ids):
+        for doc_id in ids:
+            self.docs.pop(doc_id, None)
+
+
+class FakeRedis:
+    """支持 pipeline 的最小 Redis 模拟（同步接口）"""
+    def __init__(self):
+        self.store = {}
+        self.ttls = {}
+        self.down = False
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def set(self, key, value, ex=None):
+        self.ops.append(("set", key, value, ex))
+
+    def get(self, key):
+        self.ops.append(("get", key))
+
+    def incr(self, key):
+        self.ops.append(("incr", key))
+
+    def pttl(self, key):
+        self.ops.append(("pttl", key))
+
+    def execute(self):
+        if self.redis.down:
+            raise ConnectionError("redis down")
+        replies = []
+        for op in self.ops:
+            if op[0] == "set":
+                self.redis.store[op[1]] = op[2].encode("utf-8")
+                self.redis.ttls[op[1]] = op[3]
+                replies.append(True)
+            elif op[0] == "get":
+                replies.append(self.redis.store.get(op[1]))
+            elif op[0] == "incr":
+                value = int(self.redis.store.get(op[1], b"0")) + 1
+                self.redis.store[op[1]] = str(value).encode("utf-8")
+                replies.append(value)
+            else:
+                replies.append(self.redis.ttls.get(op[1], -2) * 1000)
+        return replies
+
+
+def test_tokenize():
+    assert tokenize("林风") == ["林风"]
+    assert tokenize("剑宗弟子") == ["剑宗", "宗弟", "弟子"]
+    assert tokenize("剑") == ["剑"]
+    assert tokenize("Alice 拔剑") == ["拔剑", "alice"]
+
+
+def test_bm25_and_rrf():
+    index = BM25Index()
+    index.add(1, "林风是剑宗弟子")
+    index.add(2, "苏雨是丹宗长老")
+    index.add(3, "剑宗位于青云山")
+
+    results = index.search("剑宗", top_k=5)
+    assert {doc_id for doc_id, _ in results} == {1, 3}
+
+    index.remove(3)
+    assert [doc_id for doc_id, _ in index.search("剑宗")] == [1]
+
+    fused = reciprocal_rank_fusion([[1, 2], [2, 3]])
+    assert fused[0][0] == 2
+
+
+async def run_knowledge_manager_checks():
+    print("Testing KnowledgeManager...")
+
+    db = SQLiteDB()
+    km = KnowledgeManager(MockVectorStore(), db, cache=None)
+
+    lin = await km.add_knowledge("林风是剑宗弟子，性格坚毅", KnowledgeType.CORE, KnowledgeCategory.CHARACTER)
+    await km.add_knowledge("剑宗位于青云山之巅", KnowledgeType.CORE, KnowledgeCategory.WORLD)
+    locked = await km.add_knowledge("林风不会使用法术", KnowledgeType.CORE, KnowledgeCategory.CHARACTER, locked=True)
+    await km.add_knowledge("苏雨是丹宗长老", KnowledgeType.CORE, KnowledgeCategory.CHARACTER)
+
+    results = await km.retrieve_context("林风", top_k=3)
+    assert results[0] == locked.content, "锁定信息应置顶"
+    assert lin.content in results
+
+    world_only = await km.retrieve_context("剑宗", categories=[KnowledgeCategory.WORLD])
+    assert world_only == ["剑宗位于青云山之巅"]
+
+    await km.update_knowledge(lin.id, content="林风是剑宗首席弟子")
+    assert "林风是剑宗首席弟子" in await km.retrieve_context("首席")
+
+    await km.delete_knowledge(lin.id)
+    assert "林风是剑宗首席弟子" not in await km.retrieve_context("首席")
+    assert len(await km.get_by_category(KnowledgeCategory.CHARACTER)) == 2
+
+    # 重启后从数据库恢复索引
+    reloaded = KnowledgeManager(MockVectorStore(), db, cache=None)
+    assert await reloaded.retrieve_context("苏雨") == ["苏雨是丹宗长老"]
+
+    print("✅ KnowledgeManager tests passed!")
+
+
+def test_knowledge_manager():
+    asyncio.run(run_knowledge_manager_checks())
+
+
+async def run_ephemeral_cache_checks():
+    assert content_hash("林风") == content_hash("林风")
+    assert len(content_hash("林风")) == 32
+
+    redis = FakeRedis()
+    worker_a = EphemeralCache(redis, ttl=604800)
+    worker_b = EphemeralCache(redis, ttl=604800)
+
+    await worker_a.set_many({"k1": "场景一", "k2": "场景二"})
+    assert redis.ttls["k1"] == 604800
+
+    # 另一个 Worker 经 Redis 回源后命中本地
+    assert await worker_b.get_many(["k1", "k2", "k3"]) == {"k1": "场景一", "k2": "场景二", "k3": None}
+    redis.store.clear()
+    assert await worker_b.get("k1") == "场景一"
+
+    # Redis 故障时降级为本地缓存
+    redis.down = True
+    await worker_a.set("k4", "场景四")
+    assert await worker_a.get("k4") == "场景四"
+    assert not worker_a.redis_available
+
+    # 本地 LRU 容量限制
+    small = EphemeralCache(None, ttl=60, max_local_items=2)
+    await small.set_many({"a": "1", "b": "2", "c": "3"})
+    assert await small.get("a") is None and await small.get("c") == "3"
+
+    km = KnowledgeManager(MockVectorStore(), SQLiteDB(), cache=FakeRedis())
+    scene = await km.add_knowledge("雨夜，青云山下的破庙", KnowledgeType.EPHEMERAL, KnowledgeCategory.SCENE)
+    assert scene.cache_key == km.ephemeral_key(KnowledgeCategory.SCENE, scene.content)
+    loaded = await km.get_ephemeral([scene.cache_key, "ephemeral:scene:missing"])
+    assert loaded[0].content == scene.content and loaded[1] is None
+
+
+def test_ephemeral_cache():
+    asyncio.run(run_ephemeral_cache_checks())
+
+
+async def run_bulk_import_checks():
+    db = SQLiteDB()
+    store = MockVectorStore()
+    km = KnowledgeManager(store, db, cache=None)
+    existing = await km.add_knowledge("林风是剑宗弟子", KnowledgeType.CORE, KnowledgeCategory.CHARACTER)
+
+    entries = [
+        {"content": f"第{i}号地点：青云山第{i}峰", "category": "world", "tags": ["地点"]}
+        for i in range(20_000)
+    ]
+    entries.append({"content": "林风是剑宗弟子", "category": KnowledgeCategory.CHARACTER})
+    entries.append({"content": "第0号地点：青云山第0峰", "category": "world"})
+
+    start = time.perf_counter()
+    ids = await km.add_knowledge_bulk(entries, batch_size=1000)
+    print(f"批量导入 {len(entries)} 条耗时: {time.perf_counter() - start:.2f} s")
+
+    assert len(ids) == len(entries)
+    assert ids[-2] == existing.id and ids[-1] == ids[0]
+    assert len(set(ids)) == 20_001
+    assert db.fetchall("SELECT COUNT(*) FROM knowledge_items")[0][0] == 20_001
+    assert len(store.docs) == 20_001
+    assert (await km.retrieve_context("第123峰", top_k=1))[0] == "第123号地点：青云山第123峰"
+
+
+def test_bulk_import():
+    asyncio.run(run_bulk_import_checks())
+
+
+async def run_near_duplicate_checks():
+    km = KnowledgeManager(MockVectorStore(), SQLiteDB(), cache=None)
+    original = await km.add_knowledge("林风是剑宗弟子", KnowledgeType.CORE, KnowledgeCategory.CHARACTER, tags=["主角"])
+
+    flagged = await km.add_knowledge("林风，剑宗弟子", KnowledgeType.CORE, KnowledgeCategory.CHARACTER)
+    assert flagged.duplicate_of == original.id and flagged.id != original.id
+
+    merged = await km.add_knowledge(
+        "林风是剑宗弟子。", KnowledgeType.CORE, KnowledgeCategory.CHARACTER,
+        tags=["剑修"], near_duplicate="merge"
+    )
+    assert merged.id == original.id and merged.tags == ["主角", "剑修"]
+
+    other_category = await km.add_knowledge("林风是剑宗弟子", KnowledgeType.CORE, KnowledgeCategory.PLOT)
+    assert other_category.duplicate_of is None
+
+    unrelated = await km.add_knowledge("苏雨是丹宗长老", KnowledgeType.CORE, KnowledgeCategory.CHARACTER)
+    assert unrelated.duplicate_of is None
+
+    clusters = await km.deduplicate_knowledge(merge=True)
+    assert clusters == [[original.id, flagged.id]]
+    remaining = {k.content for k in await km.get_by_category(KnowledgeCategory.CHARACTER)}
+    assert remaining == {"林风是剑宗弟子", "苏雨是丹宗长老"}
+
+
+def test_near_duplicates():
+    asyncio.run(run_near_duplicate_checks())
+
+
+class FailingDB(SQLiteDB):
+    """前 allowed 条 INSERT 语句成功、之后的写入全部失败的数据库"""
+    def __init__(self, allowed=0):
+        super().__init__()
+        self.allowed = allowed
+
+    def execute(self, query, params=None):
+        if query.lstrip().startswith(("INSERT", "UPDATE", "DELETE")):
+            if self.allowed <= 0:
+                raise sqlite3.OperationalError("database is locked")
+            self.allowed -= 1
+        return super().execute(query, params)
+
+
+async def run_bulk_near_duplicate_checks():
+    km = KnowledgeManager(MockVectorStore(), SQLiteDB(), cache=None)
+    original = await km.add_knowledge("林风是剑宗弟子", KnowledgeType.CORE, KnowledgeCategory.CHARACTER, tags=["主角"])
+
+    # 与已有知识、批内条目之间的近似重复都会被标记
+    ids = await km.add_knowledge_bulk([
+        {"content": "林风，剑宗弟子", "category": "character"},
+        {"content": "苏雨是丹宗长老", "category": "character"},
+        {"content": "苏雨，丹宗长老", "category": "character"},
+    ])
+    assert km._items[ids[0]].duplicate_of == original.id
+    assert km._items[ids[1]].duplicate_of is None
+    assert km._items[ids[2]].duplicate_of == ids[1]
+
+    ids = await km.add_knowledge_bulk([
+        {"content": "林风是剑宗弟子。", "category": "character", "tags": ["剑修"]},
+        {"content": "叶尘是天机阁阁主", "category": "character", "tags": ["阁主"]},
+        {"content": "叶尘，天机阁阁主", "category": "character", "tags": ["反派"], "locked": True},
+    ], near_duplicate="merge")
+    assert ids[0] == original.id and km._items[original.id].tags == ["主角", "剑修"]
+    assert ids[2] == ids[1]
+    assert km._items[ids[1]].tags == ["阁主", "反派"] and km._items[ids[1]].locked
+
+    # 数据库写入失败：抛出异常，内存索引不受影响
+    failing = KnowledgeManager(MockVectorStore(), FailingDB(), cache=None)
+    try:
+        await failing.add_knowledge_bulk([{"content": "青云山终年积雪", "category": "world"}])
+    except sqlite3.OperationalError:
+        pass
+    else:
+        raise AssertionError("批量写入失败时应抛出异常")
+    assert failing._items == {}
+    assert await failing.retrieve_context("青云山") == []
+
+
+def test_bulk_near_duplicates():
+    asyncio.run(run_bulk_near_duplicate_checks())
+
+
+async def run_shared_database_checks():
+    path = os.path.join(tempfile.mkdtemp(), "knowledge.db")
+    try:
+        # 两个进程（如两个 API worker）共用同一数据库：ID 由数据库分配，不会冲突
+        first = KnowledgeManager(MockVectorStore(), SQLiteDB(path), cache=None)
+        second = KnowledgeManager(MockVectorStore(), SQLiteDB(path), cache=None)
+        lin = await first.add_knowledge("林风是剑宗弟子", KnowledgeType.CORE, KnowledgeCategory.CHARACTER)
+        su = await second.add_knowledge("苏雨是丹宗长老", KnowledgeType.CORE, KnowledgeCategory.CHARACTER)
+        ids = await second.add_knowledge_bulk([
+            {"content": f"第{i}号地点：青云山第{i}峰", "category": "world"} for i in range(1200)
+        ])
+        ye = await first.add_knowledge("叶尘是天机阁阁主", KnowledgeType.CORE, KnowledgeCategory.CHARACTER)
+        assert len({lin.id, su.id, ye.id, *ids}) == 1203
+
+        reloaded = KnowledgeManager(MockVectorStore(), SQLiteDB(path), cache=None)
+        assert reloaded._items[su.id].content == "苏雨是丹宗长老"
+        assert reloaded._items[ids[700]].content == "第700号地点：青云山第700峰"
+        assert reloaded._items[ye.id].content == "叶尘是天机阁阁主"
+    finally:
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+    # 写入失败：抛出异常，内存索引与向量库都不留下该条目
+    store = MockVectorStore()
+    km = KnowledgeManager(store, FailingDB(allowed=1), cache=None)
+    kept = await km.add_knowledge("林风是剑宗弟子", KnowledgeType.CORE, KnowledgeCategory.CHARACTER)
+    try:
+        await km.add_knowledge("苏雨是丹宗长老", KnowledgeType.CORE, KnowledgeCategory.CHARACTER)
+    except sqlite3.OperationalError:
+        pass
+    else:
+        raise AssertionError("写入失败时应抛出异常")
+    assert list(km._items) == [kept.id] and len(store.docs) == 1
+    assert "苏雨是丹宗长老" not in await km.retrieve_context("苏雨")
+
+    # 更新、删除失败时内存状态不变
+    for operation in (km.update_knowledge(kept.id, content="林风是剑宗首席弟子"), km.delete_knowledge(kept.id)):
+        try:
+            await operation
+        except sqlite3.OperationalError:
+            pass
+        else:
+            raise AssertionError("写入失败时应抛出异常")
+    assert km._items[kept.id].content == "林风是剑宗弟子"
+
+    # 批量导入中途失败：已写入的批次与数据库一致地进入内存，之后的不写入
+    km = KnowledgeManager(MockVectorStore(), FailingDB(allowed=1), cache=None)
+    entries = [{"content": f"第{i}号地点：青云山第{i}峰", "category": "world"} for i in range(800)]
+    try:
+        await km.add_knowledge_bulk(entries, near_duplicate="off")
+    except sqlite3.OperationalError:
+        pass
+    else:
+        raise AssertionError("写入失败时应抛出异常")
+    stored = {row[0] for row in km.db.fetchall("SELECT id FROM knowledge_items")}
+    assert set(km._items) == stored and len(stored) == km._INSERT_CHUNK
+
+
+def test_shared_database():
+    asyncio.run(run_shared_database_checks())
+
+
+async def run_retrieval_cache_checks():
+    store = MockVectorStore()
+    km = KnowledgeManager(store, SQLiteDB(), cache=None, project_id="novel_1")
+    lin = await km.add_knowledge("林风是剑宗弟子", KnowledgeType.CORE, KnowledgeCategory.CHARACTER)
+    await km.add_knowledge("剑宗位于青云山", KnowledgeType.CORE, KnowledgeCategory.WORLD)
+
+    first = await km.retrieve_context("林风", categories=[KnowledgeCategory.CHARACTER])
+    calls = store.search_calls
+    # 归一化后相同的查询直接命中缓存，不再访问向量库
+    assert await km.retrieve_context("  林风 ", categories=[KnowledgeCategory.CHARACTER]) == first
+    assert store.search_calls == calls
+
+    # 其它分类的写入不影响该缓存
+    await km.add_knowledge("青云山终年积雪", KnowledgeType.CORE, KnowledgeCategory.WORLD)
+    await km.retrieve_context("林风", categories=[KnowledgeCategory.CHARACTER])
+    assert store.search_calls == calls
+
+    # 相关分类的增、改、删均使缓存失效
+    await km.update_knowledge(lin.id, content="林风是剑宗首席弟子")
+    assert await km.retrieve_context("林风", categories=[KnowledgeCategory.CHARACTER]) == ["林风是剑宗首席弟子"]
+    await km.delete_knowledge(lin.id)
+    assert await km.retrieve_context("林风", categories=[KnowledgeCategory.CHARACTER]) == []
+
+    # 检索本身也使用归一化查询：全角写法与缓存中的半角写法结果一致
+    keyword_only = KnowledgeManager(None, SQLiteDB(), cache=None)  # 无向量库，只走关键词检索
+    await keyword_only.add_knowledge("LinFeng 是剑宗弟子", KnowledgeType.CORE, KnowledgeCategory.CHARACTER)
+    await keyword_only.add_knowledge("苏雨是丹宗长老", KnowledgeType.CORE, KnowledgeCategory.CHARACTER)
+    assert await keyword_only.retrieve_context("ＬｉｎＦｅｎｇ") == ["LinFeng 是剑宗弟子"]
+    assert await keyword_only.retrieve_context("linfeng") == ["LinFeng 是剑宗弟子"]
+
+
+def test_retrieval_cache():
+    asyncio.run(run_retrieval_cache_checks())
+
+
+async def run_shared_retrieval_cache_checks():
+    path = os.path.join(tempfile.mkdtemp(), "knowledge.db")
+    try:
+        redis = FakeRedis()
+        first = KnowledgeManager(None, SQLiteDB(path), cache=redis, project_id="novel_1")
+        second = KnowledgeManager(None, SQLiteDB(path), cache=redis, project_id="novel_1")
+        lin = await first.add_knowledge("林风是剑宗弟子", KnowledgeType.CORE, KnowledgeCategory.CHARACTER)
+        # 启动加载之后其它 worker 的写入：首次检索时按分类指纹重载
+        assert await second.retrieve_context("林风") == ["林风是剑宗弟子"]
+        await first.add_knowledge("林风的师父是剑宗长老", KnowledgeType.CORE, KnowledgeCategory.CHARACTER)
+        assert await first.retrieve_context("林风", top_k=1) == ["林风是剑宗弟子"]
+        assert await first.retrieve_context("林风", top_k=1) == ["林风是剑宗弟子"]  # 缓存命中
+
+        # 另一个 worker 的写入使共享版本号变化：先重载该分类，不会命中旧缓存
+        await second.update_knowledge(lin.id, content="林风叛出剑宗")
+        assert await first.retrieve_context("林风叛出", top_k=1) == ["林风叛出剑宗"]
+        assert "林风是剑宗弟子" not in await first.retrieve_context("林风")
+        await second.delete_knowledge(lin.id)
+        assert "林风叛出剑宗" not in await first.retrieve_context("林风")
+        assert sorted(await second.retrieve_context("林风")) == sorted(await first.retrieve_context("林风"))
+
+        # Redis 不可用时退化为本进程版本号
+        redis.down = True
+        await first.add_knowledge("林风拜入天机阁", KnowledgeType.CORE, KnowledgeCategory.CHARACTER)
+        assert "林风拜入天机阁" in await first.retrieve_context("林风")
+    finally:
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
+def test_shared_retrieval_cache():
+    asyncio.run(run_shared_retrieval_cache_checks())
+
+
+def test_bm25_latency():
+    """10万条知识的关键词检索耗时"""
+    index = BM25Index()
+    surnames = "林苏叶萧秦楚韩赵云沈"
+    sects = ["剑宗", "丹宗", "天机阁", "万兽山", "青云门"]
+    for i in range(100_000):
+        index.add(i, f"{surnames[i % 10]}{i}是{sects[i % 5]}的弟子，擅长第{i % 97}式剑法")
+
+    start = time.perf_counter()
+    for _ in range(20):
+        hits = index.search("林风是剑宗的弟子", top_k=30)
+    elapsed_ms = (time.perf_counter() - start) / 20 * 1000
+    print(f"BM25 检索平均耗时: {elapsed_ms:.2f} ms")
+
+    # 命中的都是剑宗弟子（序号为 5 的倍数）；耗时上限宽松，只防止退化为逐条打分
+    assert len(hits) == 30 and all(doc_id % 5 == 0 for doc_id, _ in hits)
+    assert elapsed_ms < 250
+
+
+if __name__ == "__main__":
+    test_tokenize()
+    test_bm25_and_rrf()
+    test_knowledge_manager()
+    test_ephemeral_cache()
+    test_bulk_import()
+    test_near_duplicates()
+    test_bulk_near_duplicates()
+    test_shared_database()
+    test_retrieval_cache()
+    test_shared_retrieval_cache()
+    test_bm25_latency()
@@ -78,6 +78,321 @@ def test_basic_imports():
         traceback.print_exc()
         return False
 
+def _node(node_id, node_type=None, **kwargs):
+    from backend.core.structure.models import PlotNode, NodeType
+    kwargs.setdefault("description", "")
+    return PlotNode(id=node_id, title=node_id, type=node_type or NodeType.CHAPTER, **kwargs)
+
+
+def _build_outline(volumes=3, chapters=4):
+    """卷在前、章在后的乱序列表（只用 parent_id 表示树结构）"""
+    from backend.core.structure.models import NodeType
+    nodes = [_node(f"v{v}", NodeType.VOLUME) for v in range(volumes)]
+    for c in reversed(range(chapters)):
+        for v in range(volumes):
+            nodes.append(_node(f"v{v}c{c}", parent_id=f"v{v}", word_count=100 * (c + 1)))
+    return nodes
+
+
+def _assert_index_consistent(project):
+    """索引与按节点关系从头重建的结果一致"""
+    from backend.core.structure.models import NovelProject
+    rebuilt = NovelProject(id="check", title="check", outline_tree=list(project.outline_tree))
+    assert [n.id for n in rebuilt.outline_tree] == [n.id for n in project.outline_tree]
+    total = 0
+    for i, node in enumerate(project.outline_tree):
+        assert project.get_node_by_id(node.id) is node
+        assert project.position_of(node.id) == i
+        assert project.word_count_before(node.id) == total
+        total += node.word_count
+        if node.parent_id:
+            assert node.id in project.get_node_by_id(node.parent_id).children_ids
+
+
+def test_outline_tree_index():
+    from backend.core.structure.models import NovelProject
+
+    project = NovelProject(id="p", title="测试", outline_tree=_build_outline())
+    # 列表重排为先序，子节点顺序按原列表顺序补齐
+    assert [n.id for n in project.outline_tree[:3]] == ["v0", "v0c3", "v0c2"]
+    assert [n.id for n in project.get_children("v1")] == ["v1c3", "v1c2", "v1c1", "v1c0"]
+    assert project.get_parent("v2c0").id == "v2"
+    assert project.get_node_by_id("missing") is None
+    assert [n.id for n in project.nodes_after("v0c0", limit=2)] == ["v1", "v1c3"]
+    assert project.nodes_after("v2c0") == []
+    assert project.word_count_before("v1") == 1000
+    _assert_index_consistent(project)
+
+    # 插入、移动、删除后索引保持一致
+    project.add_node(_node("v0c9", word_count=50), parent_id="v0", index=1)
+    assert [n.id for n in project.nodes_after("v0c3", limit=1)] == ["v0c9"]
+    project.add_node(_node("epilogue"))
+    assert project.outline_tree[-1].id == "epilogue"
+    project.move_node("v2", parent_id=None, index=0)
+    assert project.outline_tree[0].id == "v2" and project.position_of("v0") == 5
+    project.move_node("v1c0", parent_id="v0", index=0)
+    assert project.get_parent("v1c0").id == "v0"
+    assert project.word_count_before("v0c3") == project.word_count_before("v1c0") + 100
+    project.update_word_count("v2c3", 1)
+    project.current_node_id = "v1c1"
+    removed = project.remove_node("v1")
+    assert [n.id for n in removed] == ["v1", "v1c3", "v1c2", "v1c1"]
+    assert project.current_node_id is None and project.get_node_by_id("v1c2") is None
+    _assert_index_consistent(project)
+
+    try:
+        project.move_node("v0", parent_id="v0c3")
+        assert False, "不应允许移动到自己的子树下"
+    except ValueError:
+        pass
+
+    # 直接追加到列表的节点在下次查询时纳入索引
+    project.outline_tree.append(_node("appendix"))
+    assert project.position_of("appendix") == len(project.outline_tree) - 1
+
+
+def test_outline_tree_index_scale():
+    import time
+    from backend.core.structure.models import NovelProject, NodeType
+    from backend.core.structure.pacer import PacingAnalyzer
+    from backend.core.structure.guardian import OutlineGuardian
+
+    nodes = []
+    for v in range(30):
+        nodes.append(_node(f"v{v}", NodeType.VOLUME))
+        nodes.extend(_node(f"v{v}c{c}", parent_id=f"v{v}") for c in range(100))
+    project = NovelProject(id="p", title="长篇", outline_tree=nodes)
+    pacer = PacingAnalyzer.__new__(PacingAnalyzer)
+    guardian = OutlineGuardian.__new__(OutlineGuardian)
+
+    start = time.perf_counter()
+    for node in project.outline_tree:
+        pacer._calculate_current_progress(project, node)
+        project.nodes_after(node.id, limit=5)
+    elapsed = time.perf_counter() - start
+    print(f"Progress + lookahead over {len(nodes)} nodes: {elapsed * 1e3:.1f}ms")
+    assert elapsed < 0.5
+    assert pacer._calculate_current_progress(project, project.outline_tree[-1]) == 1.0
+    assert len(guardian._get_subsequent_nodes(project, "v29c97")) == 2
+
+
+def _assert_aggregates_consistent(project):
+    """增量计数与全量统计一致"""
+    from backend.core.structure.models import NodeStatus, NodeType
+    nodes = project.outline_tree
+    assert project.finished_node_count == sum(n.status == NodeStatus.FINISHED for n in nodes)
+    assert project.outline_word_count == sum(n.word_count for n in nodes)
+    assert project.estimated_word_count == sum(n.estimated_word_count for n in nodes)
+    for volume in (n for n in nodes if n.type == NodeType.VOLUME):
+        members = project.outline_tree[project.position_of(volume.id):project._subtree_end(volume.id)]
+        stats = project.volume_stats(volume.id)[volume.id]
+        assert (stats.node_count, stats.word_count) == (len(members), sum(n.word_count for n in members))
+        assert stats.finished_count == sum(n.status == NodeStatus.FINISHED for n in members)
+    for status, key in (("open", "open_by_importance"), ("resolved", "resolved_by_importance")):
+        loops = [l for l in project.open_loops + project.resolved_loops if l.status == status]
+        expected = {level: sum(l.importance == level for l in loops) for level in ("critical", "major", "minor")}
+        assert project.loop_stats()[key] == expected
+
+
+def test_incremental_aggregates():
+    import asyncio
+    from backend.core.structure.models import NovelProject, NodeStatus, PlotLoop
+    from backend.core.structure.loop_tracker import LoopTracker
+
+    project = NovelProject(id="p", title="测试", outline_tree=_build_outline())
+    assert project.outline_word_count == 3000 and project.volume_stats("v1")["v1"].word_count == 1000
+
+    project.set_node_status("v0c0", NodeStatus.FINISHED)
+    project.set_node_status("v1c0", NodeStatus.FINISHED)
+    project.set_node_status("v1c0", NodeStatus.FINISHED)
+    assert project.finished_node_count == 2 and project.completion_percentage == 2 / 15
+    project.update_word_count("v0c0", 250)
+    assert project.total_word_count == 150
+    project.set_estimated_word_count("v2c1", 3000)
+    project.move_node("v1c0", parent_id="v2")
+    assert project.volume_stats("v2")["v2"].finished_count == 1
+    project.remove_node("v0")
+    assert "v0" not in project.volume_stats()
+    _assert_aggregates_consistent(project)
+
+    for i, importance in enumerate(["critical"] * 4 + ["major"] * 2 + ["minor"]):
+        project.add_loop(PlotLoop(id=f"l{i}", description="", created_in_node="v1c1", importance=importance))
+    project.resolve_loop("l0", node_id="v2c0")
+    project.abandon_loop("l1")
+    project.set_loop_importance("l6", "major")
+    assert project.get_open_loops_count() == 5
+    assert project.get_loop("l0") in project.resolved_loops and project.get_loop("l0").resolved_in_node == "v2c0"
+    try:
+        project.resolve_loop("l1")
+        assert False, "已废弃的伏笔不能回收"
+    except ValueError:
+        pass
+    _assert_aggregates_consistent(project)
+
+    tracker = LoopTracker.__new__(LoopTracker)
+    report = asyncio.run(tracker.generate_loops_report(project))
+    assert report["summary"]["total_open"] == 5 and report["summary"]["total_resolved"] == 1
+    assert report["open_by_importance"] == {"critical": 2, "major": 3, "minor": 0}
+    assert report["critical_issues"] == []
+
+    # 直接修改列表的伏笔在下次读取时重新统计
+    project.open_loops.append(PlotLoop(id="extra", description="", created_in_node="v1c1", importance="critical"))
+    assert project.loop_stats()["open_by_importance"]["critical"] == 3
+
+
+def test_project_store_roundtrip(tmp_path):
+    from backend.core.structure.models import NovelProject, NodeStatus, PlotLoop, NodeType
+    from backend.core.structure.store import ProjectStore
+
+    store = ProjectStore(str(tmp_path / "projects.db"))
+    project = NovelProject(id="p", title="测试", outline_tree=_build_outline())
+    project.get_node_by_id("v0c1").characters.append("林风")
+    project.add_loop(PlotLoop(id="ring", description="神秘戒指", created_in_node="v0c1", importance="critical"))
+    assert store.save(project) == 16  # 新项目全部写入
+    assert store.save(project) == 0
+
+    # 每次编辑只写入变更行
+    project.set_node_status("v1c2", NodeStatus.FINISHED)
+    assert store.save(project) == 1
+    project.add_node(_node("v0c9"), parent_id="v0", index=0)  # 后续兄弟序号变化
+    assert store.save(project) == 5
+    project.move_node("v2", index=0)
+    project.remove_node("v1c0")
+    project.resolve_loop("ring", "v2c3")
+    project.get_node_by_id("v2c3").title = "大结局"
+    project.mark_node_dirty("v2c3")
+    project.current_node_id = "v2c3"
+    store.save(project)
+
+    loaded = store.load("p")
+    assert loaded.outline_tree == project.outline_tree  # 含微秒级时间戳
+    assert loaded.open_loops + loaded.resolved_loops == project.open_loops + project.resolved_loops
+    assert (loaded.current_node_id, loaded.total_word_count, loaded.created_at) == \
+        (project.current_node_id, project.total_word_count, project.created_at)
+    assert loaded.finished_node_count == 1 and loaded.get_loop("ring").status == "resolved"
+    assert not loaded.pending_changes()
+    assert store.load("missing") is None
+
+    # 按卷加载：卷节点与所选卷的内容
+    partial = ProjectStore(str(tmp_path / "projects.db")).load("p", volume_ids=["v2"])
+    assert [n.id for n in partial.outline_tree] == ["v2", "v2c3", "v2c2", "v2c1", "v2c0", "v0", "v1"]
+    assert [n.type for n in partial.outline_tree[-2:]] == [NodeType.VOLUME] * 2
+
+    # 未加载卷的结构不可修改；统计覆盖整个项目
+    for edit in (
+        lambda: partial.add_node(_node("v0c10"), parent_id="v0"),
+        lambda: partial.move_node("v2c3", parent_id="v1"),
+    ):
+        try:
+            edit()
+            raise AssertionError("未加载卷的结构不应可修改")
+        except ValueError:
+            pass
+    assert partial.outline_word_count == loaded.outline_word_count
+    assert partial.volume_stats("v0") == loaded.volume_stats("v0")
+    partial.move_node("v1", index=0)  # 未加载的卷可整体移动
+    partial.set_node_status("v2c2", NodeStatus.FINISHED)
+    partial_store = ProjectStore(str(tmp_path / "projects.db"))
+    partial_store.save(partial)
+    reloaded = partial_store.load("p")
+    assert reloaded.finished_node_count == 2
+    assert reloaded.completion_percentage == 2 / 15
+    assert [n.id for n in reloaded.outline_tree if n.parent_id is None] == ["v1", "v2", "v0"]
+    partial_store.close()
+
+    store.delete("p")
+    assert store.load("p") is None
+    store.close()
+
+
+def test_project_store_incremental_save_latency(tmp_path):
+    import time
+    from backend.core.structure.models import NovelProject, NodeType, NodeStatus
+    from backend.core.structure.store import ProjectStore
+
+    nodes = []
+    for v in range(50):
+        nodes.append(_node(f"v{v}", NodeType.VOLUME))
+        nodes.extend(_node(f"v{v}c{c}", parent_id=f"v{v}", description="大纲" * 50) for c in range(400))
+    project = NovelProject(id="huge", title="超长篇", outline_tree=nodes)
+    store = ProjectStore(str(tmp_path / "huge.db"))
+    store.save(project)
+
+    timings = []
+    for i in range(50):
+        project.update_word_count(f"v{i}c{i}", 3000 + i)
+        project.set_node_status(f"v{i}c{i}", NodeStatus.WRITING)
+        start = time.perf_counter()
+        assert store.save(project) == 1
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"Incremental save on {len(nodes)} nodes: p50 {timings[25] * 1e6:.0f}us")
+    assert timings[25] < 0.001
+
+    # 在卷首插入章节：其后 400 个兄弟节点的序号都要改写
+    project.add_node(_node("v3c-1"), parent_id="v3", index=0)
+    start = time.perf_counter()
+    assert store.save(project) == 401
+    elapsed = time.perf_counter() - start
+    print(f"Save after inserting at the head of a volume: {elapsed * 1e3:.1f}ms")
+    assert elapsed < 0.05
+
+    start = time.perf_counter()
+    volume = store.load("huge", volume_ids=["v7"])
+    print(f"Load one volume: {(time.perf_counter() - start) * 1e3:.1f}ms")
+    assert len(volume.outline_tree) == 450 and volume.get_node_by_id("v7c7").word_count == 3007
+    store.close()
+
+
+def test_compact_plot_node():
+    import tracemalloc
+    from datetime import datetime, timezone
+    from backend.core.structure.models import PlotNode, PlotLoop, NodeType
+
+    created = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    node = _node("".join(["s", "1"]), NodeType.SCENE, parent_id="".join(["c", "1"]), created_at=created)
+    assert not hasattr(node, "__dict__")
+    assert node.id is sys.intern("s1") and node.parent_id is sys.intern("c1")  # ID 驻留
+    assert node.created_at == created and node.updated_at == created
+    assert node._characters == () and node._characters is node._children_ids  # 空列表共用空元组
+
+    # 公开属性语义不变：列表可原地修改，时间可赋值
+    node.characters.append("林风")
+    assert node.characters == ["林风"] and node.to_dict()["characters"] == ["林风"]
+    node.updated_at = datetime(2024, 5, 2, tzinfo=timezone.utc)
+    assert node.updated_at == datetime(2024, 5, 2, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    assert node == _node("s1", NodeType.SCENE, parent_id="c1", created_at=created,
+                         updated_at=node.updated_at, characters=["林风"])
+    assert "characters=['林风']" in repr(node)
+    for kwargs in ({"title": ""}, {"deviation_score": 1.5}):
+        try:
+            PlotNode(**{"id": "x", "title": "x", "description": "", "type": NodeType.SCENE, **kwargs})
+            assert False, "应校验失败"
+        except ValueError:
+            pass
+
+    loop = PlotLoop(id="l1", description="戒指", created_in_node="s1")
+    assert not hasattr(loop, "__dict__") and loop.resolved_at is None
+    loop.resolved_at = created
+    assert loop.resolved_at == created
+
+    # 空字段场景节点的对象开销
+    tracemalloc.start()
+    nodes = [_node(f"scene{i}", NodeType.SCENE, parent_id="chapter") for i in range(10000)]
+    per_node = tracemalloc.get_traced_memory()[0] / len(nodes)
+    tracemalloc.stop()
+    print(f"Compact scene node: {per_node:.0f} bytes")
+    assert per_node < 300
+
+
 if __name__ == "__main__":
+    import pathlib
+    import tempfile
     success = test_basic_imports()
+    test_outline_tree_index()
+    test_outline_tree_index_scale()
+    test_incremental_aggregates()
+    test_compact_plot_node()
+    test_project_store_roundtrip(pathlib.Path(tempfile.mkdtemp()))
+    test_project_store_incremental_save_latency(pathlib.Path(tempfile.mkdtemp()))
     sys.exit(0 if success else 1)
\ No newline at end of file
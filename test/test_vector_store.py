@@ -6,52 +6,397 @@ import os
 import asyncio
 import tempfile
 import shutil
+import zlib
+
+import numpy as np
 
 # Add backend to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
+from database.chunker import Chunker
 from database.vector_store import VectorStore
 
-async def test_vector_store():
-    print("Testing VectorStore...")
+
+class HashingEmbedder:
+    """确定性的词袋哈希嵌入（无需下载模型）"""
+    model_name = "test-hashing-256"
+
+    def encode(self, texts):
+        vectors = np.zeros((len(texts), 256), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().replace(".", " ").replace(",", " ").split():
+                vectors[i, zlib.crc32(word.encode("utf-8")) % 256] += 1.0
+        return vectors
+
+    def __call__(self, input):
+        return self.encode(input).tolist()
+
+
+async def check_vector_store(store):
+    # Test adding texts
+    texts = [
+        "Alice is a brave adventurer who loves exploring ancient ruins.",
+        "Bob is Alice's loyal companion, a skilled archer.",
+        "The ancient sword grants magical powers to its wielder."
+    ]
+    metadatas = [
+        {"type": "character", "name": "Alice"},
+        {"type": "character", "name": "Bob"},
+        {"type": "item", "name": "sword"}
+    ]
+    ids = ["alice_desc", "bob_desc", "sword_desc"]
+
+    await store.add_texts(texts, metadatas, ids)
+    print("✅ Added texts successfully")
+
+    # Test searching
+    results = await store.search("brave adventurer", top_k=2)
+    print(f"Search results: {len(results)} found")
+    for result in results:
+        print(f"  - {result['content'][:50]}... (score: {result['score']:.3f})")
+    assert len(results) == 2
+
+    # Test filtered search
+    filtered_results = await store.search("sword", filter={"type": "item"})
+    print(f"Filtered search results: {len(filtered_results)} found")
+    assert [r["metadata"]["name"] for r in filtered_results] == ["sword"]
+
+    # Test batched multi-query search
+    per_query = await store.search_many(["Alice", "Bob", "sword"], top_k=2)
+    assert len(per_query) == 3
+    deduped = await store.search_many(["Alice", "Bob", "sword"], top_k=2, dedup=True)
+    deduped_ids = [hit["id"] for hits in deduped for hit in hits]
+    assert len(deduped_ids) == len(set(deduped_ids))
+    merged = await store.search_merged(["Alice", "Bob"], top_k=3)
+    assert len({hit["id"] for hit in merged}) == len(merged) <= 3
+    print(f"Batched search results: {[len(hits) for hits in per_query]}")
+
+    # Test delete
+    await store.delete(["bob_desc"])
+    assert await store.count() == 2
+
+
+async def run_vector_store(backend, **kwargs):
+    print(f"Testing VectorStore ({backend})...")
 
     # Create temporary directory for testing
     temp_dir = tempfile.mkdtemp()
     try:
         # Initialize vector store
-        store = VectorStore(collection_name="test_collection", persist_directory=temp_dir)
-
-        # Test adding texts
-        texts = [
-            "Alice is a brave adventurer who loves exploring ancient ruins.",
-            "Bob is Alice's loyal companion, a skilled archer.",
-            "The ancient sword grants magical powers to its wielder."
-        ]
-        metadatas = [
-            {"type": "character", "name": "Alice"},
-            {"type": "character", "name": "Bob"},
-            {"type": "item", "name": "sword"}
-        ]
-        ids = ["alice_desc", "bob_desc", "sword_desc"]
-
-        await store.add_texts(texts, metadatas, ids)
-        print("✅ Added texts successfully")
-
-        # Test searching
-        results = await store.search("brave adventurer", top_k=2)
-        print(f"Search results: {len(results)} found")
-        for result in results:
-            print(f"  - {result['content'][:50]}... (score: {result['score']:.3f})")
-
-        # Test filtered search
-        filtered_results = await store.search("sword", filter={"type": "item"})
-        print(f"Filtered search results: {len(filtered_results)} found")
-
+        store = VectorStore(collection_name="test_collection", persist_directory=temp_dir, backend=backend, **kwargs)
+        await check_vector_store(store)
+        store.close()
         print("✅ VectorStore tests passed!")
-
     finally:
         # Clean up
         shutil.rmtree(temp_dir, ignore_errors=True)
 
+
+def test_vector_store():
+    asyncio.run(run_vector_store("chroma"))
+
+
+def test_numpy_vector_store():
+    asyncio.run(run_vector_store("numpy", embedding_function=HashingEmbedder()))
+
+
+class CountingEmbedder(HashingEmbedder):
+    """记录嵌入文本数（不设 model_name，不走磁盘缓存）"""
+    model_name = None
+
+    def __init__(self):
+        self.embedded = 0
+
+    def encode(self, texts):
+        self.embedded += len(texts)
+        return super().encode(texts)
+
+
+async def run_reindex_document():
+    temp_dir = tempfile.mkdtemp()
+    embedder = CountingEmbedder()
+    try:
+        store = VectorStore(
+            persist_directory=temp_dir,
+            backend="numpy",
+            embedding_function=embedder,
+            chunker=Chunker(target_size=16, overlap=0)
+        )
+        chapter = "Alice enters the ruins.\nBob waits outside.\nThe sword glows."
+        stats = await store.reindex_document("chapter_1", chapter, {"kind": "chapter"})
+        assert stats["added"] == 3 and embedder.embedded == 3
+
+        # 内容不变：幂等，不再嵌入
+        stats = await store.reindex_document("chapter_1", chapter, {"kind": "chapter"})
+        assert stats == {"added": 0, "removed": 0, "updated": 0, "unchanged": 3}
+        assert embedder.embedded == 3
+
+        # 插入一段、删除一段：只嵌入新段，位置变化的段仅更新元数据
+        edited = "A storm begins.\nAlice enters the ruins.\nThe sword glows."
+        stats = await store.reindex_document("chapter_1", edited, {"kind": "chapter"})
+        assert stats == {"added": 1, "removed": 1, "updated": 2, "unchanged": 0}
+        assert embedder.embedded == 4 and await store.count() == 3
+
+        hits = await store.search("sword glows", top_k=1, filter={"doc_id": "chapter_1"})
+        assert hits[0]["content"] == "The sword glows." and hits[0]["metadata"]["chunk_index"] == 2
+        assert hits[0]["metadata"]["char_start"] == edited.index("The sword")
+
+        # upsert 按 ID 覆盖
+        await store.upsert_texts(["Bob returns."], [{"kind": "note"}], ["note_1"])
+        await store.upsert_texts(["Bob leaves again."], [{"kind": "note"}], ["note_1"])
+        notes = await store.search("Bob", top_k=5, filter={"kind": "note"})
+        assert [hit["content"] for hit in notes] == ["Bob leaves again."]
+        store.close()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_reindex_document():
+    asyncio.run(run_reindex_document())
+
+
+async def run_sharded_vector_store():
+    from database.shard_router import VectorStoreRouter
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        router = VectorStoreRouter(
+            temp_dir,
+            max_open_shards=2,
+            shard_by_category=True,
+            backend="numpy",
+            embedding_function=HashingEmbedder()
+        )
+        alpha, beta, gamma = router.project("alpha"), router.project("beta"), router.project("gamma")
+
+        await alpha.add_texts(
+            ["Alice the swordswoman.", "The northern capital."],
+            [{"category": "character"}, {"category": "world"}],
+            ["a1", "a2"]
+        )
+        await beta.add_texts(["Alice the thief."], [{"category": "character"}], ["b1"])
+        await gamma.add_texts(["Gamma notes."], [{}], ["g1"])
+
+        # 项目隔离：检索只返回本项目的数据
+        hits = await beta.search("Alice", top_k=5)
+        assert [hit["id"] for hit in hits] == ["b1"]
+        assert await alpha.count() == 2
+
+        # 按分类过滤只打开对应分片
+        hits = await alpha.search("Alice", top_k=5, filter={"category": {"$in": ["character"]}})
+        assert [hit["id"] for hit in hits] == ["a1"]
+        hits = await alpha.search("capital", top_k=5)
+        assert hits[0]["id"] == "a2" and len(hits) == 2
+
+        # 打开的分片数受上限约束，关闭的分片可重新打开
+        assert len(router.open_shards) <= 2
+        assert router.shard_names("alpha") == ["novel_knowledge_character", "novel_knowledge_world"]
+
+        router.drop_project("alpha")
+        assert router.shard_names("alpha") == [] and await alpha.count() == 0
+        assert await beta.count() == 1
+        router.close()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_sharded_vector_store():
+    asyncio.run(run_sharded_vector_store())
+
+
+async def run_shard_project_names():
+    from database.shard_router import VectorStoreRouter
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        root = os.path.join(temp_dir, "vectors")
+        router = VectorStoreRouter(root, backend="numpy", embedding_function=HashingEmbedder())
+
+        # 中文及仅分隔符不同的项目ID各用独立目录
+        ids = ["小说一", "小说二", "novel 1", "novel_1", "novel-1"]
+        paths = {router._project_path(project_id) for project_id in ids}
+        assert len(paths) == len(ids)
+        assert all(os.path.dirname(path) == root for path in paths)
+
+        for i, project_id in enumerate(ids):
+            await router.project(project_id).add_texts([f"Note {i}."], [{}], [f"n{i}"])
+        router.drop_project("小说一")
+        assert await router.project("小说一").count() == 0
+        assert [await router.project(project_id).count() for project_id in ids[1:]] == [1] * 4
+
+        # 路径穿越与空ID被拒绝，且不会删除任何目录
+        for project_id in ["", ".", "..", "novel/1", "../vectors", "a\\b"]:
+            try:
+                router.drop_project(project_id)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"应拒绝项目ID: {project_id!r}")
+        assert all(os.path.isdir(router._project_path(project_id)) for project_id in ids[1:])
+        router.close()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_shard_project_names():
+    asyncio.run(run_shard_project_names())
+
+
+class OtherHashingEmbedder(HashingEmbedder):
+    """同维度的另一个“模型”"""
+    model_name = "test-hashing-256-v2"
+
+
+async def run_embedding_model_check():
+    from config.settings import settings
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        # 未指定模型时使用配置中的模型（不触发加载）
+        store = VectorStore(persist_directory=temp_dir, backend="numpy", use_embedding_cache=False)
+        assert store.embedding_fn.model_name == settings.embedding_model
+        store.close()
+
+        store = VectorStore(collection_name="notes", persist_directory=temp_dir, backend="numpy",
+                            embedding_function=HashingEmbedder())
+        await store.add_texts(["Alice draws the sword."], [{"kind": "scene"}], ["s1"])
+        store.close()
+
+        # 维度相同但模型不同：拒绝打开，需重建索引
+        try:
+            VectorStore(collection_name="notes", persist_directory=temp_dir, backend="numpy",
+                        embedding_function=OtherHashingEmbedder())
+            assert False, "模型不一致时应拒绝打开集合"
+        except ValueError as e:
+            assert "test-hashing-256" in str(e)
+
+        store = VectorStore(collection_name="notes", persist_directory=temp_dir, backend="numpy",
+                            embedding_function=HashingEmbedder())
+        assert await store.count() == 1
+        store.close()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_embedding_model_check():
+    asyncio.run(run_embedding_model_check())
+
+
+def test_numpy_backend_persistence_and_compaction():
+    from database.backends.numpy_memmap import NumpyBackend
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        backend = NumpyBackend("novel", temp_dir, segment_rows=8, compact_min_rows=4)
+        rng = np.random.RandomState(0)
+        vectors = rng.rand(20, 16).astype(np.float32)
+        ids = [f"chunk_{i}" for i in range(20)]
+        metadatas = [{"chapter": i % 4, "kind": "even" if i % 2 == 0 else "odd"} for i in range(20)]
+        backend.add(ids, vectors, [f"doc {i}" for i in range(20)], metadatas)
+        assert len(backend._segments) == 3
+
+        try:
+            backend.add(["chunk_0"], vectors[:1], ["dup"], [{}])
+            raise AssertionError("重复ID应报错")
+        except ValueError:
+            pass
+
+        hit = backend.query(vectors[5:6], n_results=1)
+        assert hit["ids"][0] == ["chunk_5"] and hit["distances"][0][0] < 1e-3
+
+        filtered = backend.query(vectors[5:6], n_results=20, where={"$and": [{"kind": "odd"}, {"chapter": {"$gte": 2}}]})
+        assert {m["kind"] for m in filtered["metadatas"][0]} == {"odd"}
+        assert all(m["chapter"] >= 2 for m in filtered["metadatas"][0])
+        in_filter = backend.query(vectors[:1], n_results=20, where={"chapter": {"$in": [0, 1]}})
+        assert len(in_filter["ids"][0]) == 10
+
+        # 删除过半触发压缩，重启后状态一致
+        backend.delete(ids[:12])
+        assert backend.generation == 1 and backend.count() == 8
+        backend.update_metadata(["chunk_15"], [{"chapter": 9, "kind": "odd"}])
+        backend.close()
+
+        reopened = NumpyBackend("novel", temp_dir)
+        assert reopened.count() == 8 and reopened._size == 8
+        assert reopened.get({"chapter": 9})["ids"] == ["chunk_15"]
+        hit = reopened.query(vectors[15:16], n_results=1)
+        assert hit["ids"][0] == ["chunk_15"]
+        reopened.close()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_numpy_backend_quantization():
+    from database.backends.numpy_memmap import NumpyBackend, quantization_recall
+
+    rng = np.random.RandomState(0)
+    centers = rng.randn(50, 64)
+    vectors = (centers[rng.randint(0, 50, 2000)] + 0.5 * rng.randn(2000, 64)).astype(np.float32)
+    queries = (vectors[rng.randint(0, 2000, 50)] + 0.1 * rng.randn(50, 64)).astype(np.float32)
+
+    report = quantization_recall(vectors, queries, k=10)
+    print(f"Recall@10 vs float32: {report}")
+    assert report["float16"] >= 0.98
+    assert report["int8+rerank"] >= report["int8"] and report["int8+rerank"] >= 0.98
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        backend = NumpyBackend("quantized", temp_dir, dtype="int8", rerank=True, segment_rows=512)
+        backend.add([str(i) for i in range(2000)], vectors, [""] * 2000, [None] * 2000)
+        assert backend._segments[0].dtype == np.int8
+        backend.close()
+
+        # 精度与重排配置随集合持久化
+        reopened = NumpyBackend("quantized", temp_dir)
+        assert reopened.quantized and reopened.rerank
+        hit = reopened.query(vectors[42:43], n_results=1)
+        assert hit["ids"][0] == ["42"] and abs(hit["distances"][0][0]) < 1e-5
+        reopened.close()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_numpy_backend_query_memory():
+    import tracemalloc
+    from database.backends.numpy_memmap import NumpyBackend
+
+    rng = np.random.RandomState(0)
+    vectors = rng.randn(30000, 256).astype(np.float32)
+    float16_bytes = vectors.size * 2
+    temp_dir = tempfile.mkdtemp()
+    try:
+        hits = {}
+        for dtype in ("float32", "float16"):
+            backend = NumpyBackend(dtype, temp_dir, dtype=dtype)
+            backend.add([str(i) for i in range(len(vectors))], vectors, [""] * len(vectors), [None] * len(vectors))
+            hits[dtype] = backend.query(vectors[:20], n_results=10)["ids"]
+
+            # float16 分段逐块解码：检索期间的分配远小于 float16 存储本身，检索后不保留解码副本
+            tracemalloc.start()
+            backend.query(vectors[:1], n_results=10)
+            retained, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{dtype} query: peak {peak / 1e6:.1f}MB, retained {retained / 1e6:.2f}MB")
+            assert peak < float16_bytes / 4 and retained < 1 << 20
+
+            backend.add(["new"], vectors[:1] * -1, [""], [None])
+            assert backend.query(vectors[:1] * -1, n_results=1)["ids"][0] == ["new"]
+            backend.close()
+
+        assert [row[0] for row in hits["float16"]] == [str(i) for i in range(20)]
+        overlap = sum(len(set(a) & set(b)) for a, b in zip(hits["float16"], hits["float32"]))
+        assert overlap >= 0.95 * 20 * 10
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
 if __name__ == "__main__":
-    asyncio.run(test_vector_store())
+    test_vector_store()
+    test_numpy_vector_store()
+    test_reindex_document()
+    test_sharded_vector_store()
+    test_shard_project_names()
+    test_embedding_model_check()
+    test_numpy_backend_persistence_and_compaction()
+    test_numpy_backend_quantization()
+    test_numpy_backend_query_memory()